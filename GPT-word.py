@@ -1,10 +1,48 @@
 import os
-import hashlib
+from contextlib import ExitStack
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from docx import Document
 from docx.shared import Inches
 
+import docx_stream
+from path_planner import dedupe_names, create_folders
+from table_text_index import TableTextIndex
+from atomic_files import AtomicFileWriter
+from image_hash import PartHashCache
+from image_probe import ImageFilter, probe_dimensions, probe_member
+from spooled_input import SpooledDocument, SPOOL_MEMORY_LIMIT
+from document_cache import DocumentCache, load_text_index
+from fname_suggest import suggest_fname_cells, describe_candidate
+from table_splitter import TableSplitter
+
+# 上下文信息中表格前后各保留的正文元素数
+CONTEXT_ELEMENTS = 5
+
+# 坐标选择表格的可见行数，以及每次滚动到底部时追加的行数
+PICKER_VISIBLE_ROWS = 15
+PICKER_CHUNK_ROWS = 200
+
+# 图片去重哈希："blake2b"（摘要长度 IMAGE_HASH_DIGEST_SIZE 字节）、"sha1" 或 "md5"
+IMAGE_HASH_ALGORITHM = "blake2b"
+IMAGE_HASH_DIGEST_SIZE = 16
+# 大于 0 时，较大的图片在该数量的线程中并行计算哈希（仅普通模式，图片已在内存中）
+IMAGE_HASH_WORKERS = 0
+
+# 跳过徽标、图标等装饰性小图片：小于 MIN_IMAGE_BYTES 字节，或宽/高小于 MIN_IMAGE_WIDTH/MIN_IMAGE_HEIGHT 像素
+# 尺寸只读取图片文件头（EMF 等无法识别的格式使用 wp:extent）；均为 0 时不过滤
+MIN_IMAGE_BYTES = 0
+MIN_IMAGE_WIDTH = 0
+MIN_IMAGE_HEIGHT = 0
+IMAGE_FILTER = ImageFilter(MIN_IMAGE_BYTES, MIN_IMAGE_WIDTH, MIN_IMAGE_HEIGHT)
+
+# 解析结果（表格文本索引）的持久缓存：同一文档再次打开时不再解析，超过上限时删除最久未使用的条目
+DOCUMENT_CACHE_ENABLED = True
+DOCUMENT_CACHE_MAX_MB = 512
+
+A_BLIP = '{http://schemas.openxmlformats.org/drawingml/2006/main}blip'
+R_EMBED = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
+
 
 def select_word_file():
     """
@@ -27,129 +65,123 @@ def select_output_dir():
     return folder_path
 
 
-def save_table_as_text(table, output_path):
+def table_rows_text(text_index, table_index):
+    """
+    第 table_index 个表格每个单元格的文本（已去除首尾空白），按行返回
+    文本来自加载文档时建立的 TableTextIndex
+    """
+    return [[text.strip() for text in row] for row in text_index.rows(table_index)]
+
+
+def save_table_as_text(text_index, table_index, output_path, files):
     """
-    将表格内容保存为文本文件
+    将表格内容保存为文本文件（通过 files 先写临时文件再改名）
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for row in table.rows:
-            row_data = []
-            for cell in row.cells:
-                row_data.append(cell.text.strip())
+    with files.open(output_path, 'w', encoding='utf-8') as f:
+        for row_data in table_rows_text(text_index, table_index):
             f.write('\t'.join(row_data) + '\n')
 
 
-def save_table_as_docx(table, output_path):
+def save_table_as_docx(splitter, table_element, output_path, files):
     """
-    将表格内容保存为新的Word文档
+    将表格保存为新的Word文档：由 TableSplitter 直接复制原表格的 XML 和它引用的图片，
+    格式、合并单元格和图片都与原文档一致
     """
-    new_doc = Document()
-    new_table = new_doc.add_table(rows=len(table.rows), cols=len(table.columns))
-    
-    # 复制表格内容
-    for i, row in enumerate(table.rows):
-        for j, cell in enumerate(row.cells):
-            new_table.cell(i, j).text = cell.text.strip()
-    
-    new_doc.save(output_path)
-
-
-def extract_context_around_table(doc, table_index, output_path):
+    with files.open(output_path) as f:
+        splitter.write_table(table_element, f)
+
+
+def write_table_context(output_path, table_index, before_items, current_rows, after_items, files):
     """
-    提取表格周围的上下文信息（包括前后表格和文本段落）
+    写出表格的上下文信息文件
+    before_items / after_items 为 ("p", 段落文本) 或 ("tbl", 表格序号, 各行文本) 的列表
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
+    with files.open(output_path, 'w', encoding='utf-8') as f:
         f.write(f"=== 表格 {table_index + 1} 的上下文信息 ===\n\n")
-        
-        # 获取文档中的所有元素
-        all_elements = []
-        for element in doc.element.body:
-            all_elements.append(element)
-        
-        # 找到表格在文档中的位置
-        table_element = doc.tables[table_index]._element
-        table_position = -1
-        for i, element in enumerate(all_elements):
-            if element is table_element:
-                table_position = i
-                break
-        
-        if table_position == -1:
-            f.write("无法定位表格在文档中的位置。\n")
-            return
-        
-        # 提取表格前的内容（最多5个元素）
+
         f.write("【表格前的内容】\n")
-        start_pos = max(0, table_position - 5)
-        for i in range(start_pos, table_position):
-            element = all_elements[i]
-            if element.tag.endswith('tbl'):  # 表格
-                # 尝试找到对应的python-docx表格对象
-                for j, table in enumerate(doc.tables):
-                    if table._element is element:
-                        f.write(f"[前表格 {j+1}]\n")
-                        for row in table.rows:
-                            row_data = [cell.text.strip() for cell in row.cells]
-                            f.write('\t'.join(row_data) + '\n')
-                        f.write('\n')
-                        break
-            elif element.tag.endswith('p'):  # 段落
-                paragraph_text = element.text.strip() if element.text else ""
-                if paragraph_text:
-                    f.write(f"[前段落] {paragraph_text}\n")
+        _write_context_items(f, before_items, "前")
         f.write("\n")
-        
-        # 提取当前表格
+
         f.write("【当前表格内容】\n")
-        current_table = doc.tables[table_index]
-        for row in current_table.rows:
-            row_data = [cell.text.strip() for cell in row.cells]
+        for row_data in current_rows:
             f.write('\t'.join(row_data) + '\n')
         f.write("\n")
-        
-        # 提取表格后的内容（最多5个元素）
+
         f.write("【表格后的内容】\n")
-        end_pos = min(len(all_elements), table_position + 6)  # +6 because range is exclusive
-        for i in range(table_position + 1, end_pos):
-            element = all_elements[i]
-            if element.tag.endswith('tbl'):  # 表格
-                # 尝试找到对应的python-docx表格对象
-                for j, table in enumerate(doc.tables):
-                    if table._element is element:
-                        f.write(f"[后表格 {j+1}]\n")
-                        for row in table.rows:
-                            row_data = [cell.text.strip() for cell in row.cells]
-                            f.write('\t'.join(row_data) + '\n')
-                        f.write('\n')
-                        break
-            elif element.tag.endswith('p'):  # 段落
-                paragraph_text = element.text.strip() if element.text else ""
-                if paragraph_text:
-                    f.write(f"[后段落] {paragraph_text}\n")
-
-
-def extract_images_from_cell(cell, output_folder, fname_base, image_counter, seen_hashes):
+        _write_context_items(f, after_items, "后")
+
+
+def _write_context_items(f, items, label):
+    for item in items:
+        if item[0] == "tbl":
+            f.write(f"[{label}表格 {item[1] + 1}]\n")
+            for row_data in item[2]:
+                f.write('\t'.join(row_data) + '\n')
+            f.write('\n')
+        else:
+            paragraph_text = item[1].strip()
+            if paragraph_text:
+                f.write(f"[{label}段落] {paragraph_text}\n")
+
+
+def extract_context_around_table(text_index, table_index, output_path, files):
+    """
+    提取表格周围的上下文信息（包括前后表格和文本段落）
+    表格在正文中的位置和前后元素直接从 TableTextIndex 中按偏移读取
+    """
+    def context_item(item):
+        if item[0] == "tbl":
+            return ("tbl", item[1], table_rows_text(text_index, item[1]))
+        return item
+
+    # 表格前、后的内容（各最多 CONTEXT_ELEMENTS 个元素）
+    before_items, after_items = text_index.context(table_index, CONTEXT_ELEMENTS)
+    write_table_context(
+        output_path, table_index,
+        [context_item(item) for item in before_items],
+        table_rows_text(text_index, table_index),
+        [context_item(item) for item in after_items],
+        files,
+    )
+
+
+def prefetch_table_image_hashes(table, image_hashes):
+    """把表格引用的图片提前交给哈希线程池，之后逐个单元格提取时直接取结果"""
+    parts = []
+    for blip in table._element.iter(A_BLIP):
+        rid = blip.get(R_EMBED)
+        image_part = table.part.related_parts.get(rid) if rid else None
+        if image_part is not None:
+            parts.append((str(image_part.partname), image_part.blob))
+    image_hashes.prefetch(parts)
+
+
+def extract_images_from_cell(cell, output_folder, fname_base, image_counter, seen_hashes, files, image_hashes):
     """
     提取单元格中的图片（兼容旧版 python-docx，无 namespaces 参数）
-    返回提取的图片数量
+    哈希按图片部件缓存在 image_hashes 中，同一张图片被多次引用时只计算一次
+    返回 (发现的图片数量, 去重后提取的图片数量)；按大小/尺寸跳过的图片不计入
     """
+    found = 0
     count = 0
     for paragraph in cell.paragraphs:
         for run in paragraph.runs:
             # 查找所有 blip 节点（嵌入图片）
-            inline_shapes = run.element.findall(
-                './/{http://schemas.openxmlformats.org/drawingml/2006/main}blip'
-            )
+            inline_shapes = run.element.findall('.//' + A_BLIP)
             for blip in inline_shapes:
-                rid = blip.get(
-                    '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed'
-                )
+                rid = blip.get(R_EMBED)
                 if rid:
                     image_part = run.part.related_parts[rid]
                     img_bytes = image_part.blob
+
+                    # 过小的装饰性图片不参与去重，也不写出
+                    if IMAGE_FILTER.check(len(img_bytes), lambda: probe_dimensions(img_bytes) or docx_stream.blip_extent(blip)):
+                        continue
+                    found += 1
                     
                     # 计算图片的哈希值用于去重
-                    img_hash = hashlib.md5(img_bytes).hexdigest()
+                    img_hash = image_hashes.digest(str(image_part.partname), img_bytes)
                     
                     # 如果图片已经处理过，则跳过
                     if img_hash in seen_hashes:
@@ -161,9 +193,45 @@ def extract_images_from_cell(cell, output_folder, fname_base, image_counter, see
                     # 修改图片命名方式，使用横杠分隔
                     img_filename = f"{fname_base}-{image_counter + count}.png"
                     img_path = os.path.join(output_folder, img_filename)
-                    with open(img_path, "wb") as f:
-                        f.write(img_bytes)
-    return count
+                    files.write_bytes(img_path, img_bytes)
+    return found, count
+
+
+def extract_images_from_record(zf, rels, table, output_folder, fname_base, seen_hashes, files, image_hashes):
+    """
+    低内存模式下提取流式解析得到的表格（TableRecord）中的图片
+    哈希和写出都按块从 zip 读取，不把整张图片读入内存；命名和去重规则与 extract_images_from_cell 相同
+    返回 (发现的图片数量, 去重后提取的图片数量)
+    """
+    found = 0
+    count = 0
+    for _, _, rid, _, extent in table.blips:
+        member_name = rels.get(rid)
+        if not member_name:
+            continue
+        # 字节数取自 zip 中央目录，尺寸只读文件头
+        if IMAGE_FILTER.check(zf.getinfo(member_name).file_size, lambda: probe_member(zf, member_name) or extent):
+            continue
+        found += 1
+        img_hash = image_hashes.digest_member(zf, member_name)
+        if img_hash in seen_hashes:
+            continue
+        seen_hashes.add(img_hash)
+        count += 1
+        img_path = os.path.join(output_folder, f"{fname_base}-{count}.png")
+        with files.open(img_path) as f:
+            docx_stream.copy_member(zf, member_name, f)
+    return found, count
+
+
+def fname_for_table(get_cell_text, idx):
+    """
+    第 idx 个表格（从 1 开始）的文件夹名称，单元格为空或不存在时使用“未命名文件夹{idx}”
+    """
+    try:
+        return get_cell_text().strip() or f"未命名文件夹{idx}"
+    except Exception:
+        return f"未命名文件夹{idx}"
 
 
 class WordImageExtractorGUI:
@@ -175,8 +243,25 @@ class WordImageExtractorGUI:
         self.output_dir = ""
         self.doc = None
         self.tables = []
+        self.table_count = 0
+        self.image_hashes = None  # 当前文档的图片哈希缓存（部件名 -> 哈希值）
+        self.spool = None  # 顺序读入的当前文档（SpooledDocument），未勾选时为 None
+        self.text_index = None  # 所有表格的单元格文本（TableTextIndex），供选择坐标、命名和保存表格内容
+        self.grid_tree = None  # 坐标选择用的表格控件
+        self.grid_loaded_rows = 0
         self.coord = None  # 修改为None，表示尚未选择
         self.fname_first = ""
+        # 低内存模式：不加载 Document，逐个表格流式解析，图片按块复制
+        self.low_memory = tk.BooleanVar(value=False)
+
+        tk.Checkbutton(
+            root, text="低内存模式（大型照片文档，内存占用与图片数量无关）", variable=self.low_memory
+        ).pack(pady=2)
+        # 网络共享上的文档：先整体顺序读入内存或本地临时文件，之后不再逐个部件访问网络
+        self.spool_input = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            root, text="网络共享文档（先顺序读入本地再处理）", variable=self.spool_input
+        ).pack(pady=2)
 
         # 按钮选择文件和目录（按顺序）
         self.file_btn = tk.Button(root, text="1. 选择Word文档", command=self.load_word_file)
@@ -209,13 +294,32 @@ class WordImageExtractorGUI:
             return
         
         try:
-            self.doc = Document(self.word_file)
-            self.tables = self.doc.tables
-            if not self.tables:
+            # 每个文档使用新的图片哈希缓存
+            if self.image_hashes is not None:
+                self.image_hashes.close()
+            self.image_hashes = PartHashCache(
+                IMAGE_HASH_ALGORITHM, IMAGE_HASH_DIGEST_SIZE,
+                workers=0 if self.low_memory.get() else IMAGE_HASH_WORKERS,
+            )
+            if self.spool is not None:
+                self.spool.close()
+                self.spool = None
+            if self.spool_input.get():
+                # 低内存模式下不占用内存，写入本地临时文件并映射
+                memory_limit = 0 if self.low_memory.get() else SPOOL_MEMORY_LIMIT
+                self.spool = SpooledDocument(self.word_file, memory_limit)
+            # 只建立文本索引（或从缓存读取），python-docx 的 Document 在普通模式开始处理时才加载
+            self.doc = None
+            self.tables = []
+            from_cache = self.load_text_index()
+            self.table_count = self.text_index.table_count
+            if not self.table_count:
                 messagebox.showerror("错误", "文档中没有表格")
                 return
             
-            messagebox.showinfo("提示", f"已加载 {len(self.tables)} 个表格")
+            note = "（来自解析缓存）" if from_cache else ""
+            image_refs = len(self.text_index.image_ids)
+            messagebox.showinfo("提示", f"已加载 {self.table_count} 个表格，{image_refs} 处图片引用{note}")
             # 启用输出目录选择按钮
             self.dir_btn.config(state="normal")
             self.coord_label.config(text="2. 请选择输出目录，然后选择Fname坐标")
@@ -223,6 +327,28 @@ class WordImageExtractorGUI:
             messagebox.showerror("错误", f"加载文档失败: {str(e)}")
             return
 
+    def load_text_index(self):
+        """
+        流式扫描一遍正文建立文本索引（不含图片数据）；启用解析缓存时先查缓存，返回是否命中
+        """
+        if not DOCUMENT_CACHE_ENABLED:
+            self.text_index = TableTextIndex.build(self.input_source())
+            return False
+        self.text_index, from_cache = load_text_index(
+            self.word_file, self.spool, DocumentCache(max_bytes=DOCUMENT_CACHE_MAX_MB * 1024 * 1024)
+        )
+        return from_cache
+
+    def ensure_document(self):
+        """普通模式处理前加载 python-docx 的 Document"""
+        if self.doc is None:
+            self.doc = Document(self.spool.stream() if self.spool is not None else self.word_file)
+            self.tables = self.doc.tables
+
+    def input_source(self):
+        """读取文档时使用的来源：顺序读入的 SpooledDocument，或原文件路径"""
+        return self.spool if self.spool is not None else self.word_file
+
     def load_output_dir(self):
         """
         选择输出目录
@@ -240,7 +366,9 @@ class WordImageExtractorGUI:
 
     def display_first_table(self):
         """
-        显示第一个表格的每个单元格按钮供选择
+        用表格控件显示第一个表格供选择坐标：
+        只按需插入可见范围附近的行（滚动到底部时再追加），单元格文本来自加载时缓存的文本，
+        任意大小的表格都能立即打开
         """
         # 只有当文档和输出目录都选择了才显示表格
         if not self.word_file or not self.output_dir:
@@ -249,19 +377,84 @@ class WordImageExtractorGUI:
         for widget in self.table_frame.winfo_children():
             widget.destroy()
 
-        first_table = self.tables[0]
-        tk.Label(self.table_frame, text="请选择作为Fname的单元格:").pack()
-        for r, row in enumerate(first_table.rows):
-            row_frame = tk.Frame(self.table_frame)
-            row_frame.pack()
-            for c, cell in enumerate(row.cells):
-                text_show = cell.text.strip()[:15] or "[空]"
-                btn = tk.Button(
-                    row_frame,
-                    text=text_show,
-                    command=lambda rr=r, cc=c: self.set_coord(rr, cc)
-                )
-                btn.pack(side="left", padx=2, pady=2)
+        text_index = self.text_index
+        col_count = max((len(text_index.row(0, r)) for r in range(text_index.row_count(0))), default=0)
+        columns = [f"c{c}" for c in range(col_count)]
+
+        tk.Label(self.table_frame, text="请点击作为Fname的单元格:").pack()
+
+        # 根据所有表格的统计给出建议坐标（填写率、唯一性、能否作文件名）
+        suggestions = suggest_fname_cells(text_index, top=3)
+        if suggestions:
+            suggest_frame = tk.Frame(self.table_frame)
+            suggest_frame.pack(fill="x")
+            tk.Label(
+                suggest_frame, justify="left",
+                text="建议坐标:\n" + "\n".join(describe_candidate(x) for x in suggestions),
+            ).pack(side="left")
+            best = suggestions[0]
+            tk.Button(
+                suggest_frame, text=f"使用建议坐标 ({best.row},{best.col})",
+                command=lambda: self.set_coord(best.row, best.col),
+            ).pack(side="left", padx=10)
+
+        grid_frame = tk.Frame(self.table_frame)
+        grid_frame.pack(fill="both", expand=True)
+
+        tree = ttk.Treeview(grid_frame, columns=columns, show="tree headings",
+                            height=PICKER_VISIBLE_ROWS, selectmode="none")
+        tree.heading("#0", text="行")
+        tree.column("#0", width=50, stretch=False)
+        for c, column in enumerate(columns):
+            tree.heading(column, text=f"列{c}")
+            tree.column(column, width=120, stretch=False)
+
+        y_scroll = ttk.Scrollbar(grid_frame, orient="vertical", command=tree.yview)
+        x_scroll = ttk.Scrollbar(grid_frame, orient="horizontal", command=tree.xview)
+
+        def on_y_scroll(first, last):
+            y_scroll.set(first, last)
+            # 接近底部时追加下一批行
+            if float(last) > 0.9:
+                self.load_more_grid_rows()
+
+        tree.configure(yscrollcommand=on_y_scroll, xscrollcommand=x_scroll.set)
+        tree.grid(row=0, column=0, sticky="nsew")
+        y_scroll.grid(row=0, column=1, sticky="ns")
+        x_scroll.grid(row=1, column=0, sticky="ew")
+        grid_frame.rowconfigure(0, weight=1)
+        grid_frame.columnconfigure(0, weight=1)
+        tree.bind("<ButtonRelease-1>", self.on_grid_click)
+
+        self.grid_tree = tree
+        self.grid_loaded_rows = 0
+        self.load_more_grid_rows()
+
+    def load_more_grid_rows(self):
+        """向表格控件追加下一批（PICKER_CHUNK_ROWS 行）单元格文本"""
+        row_count = self.text_index.row_count(0)
+        start = self.grid_loaded_rows
+        if self.grid_tree is None or start >= row_count:
+            return
+        end = min(row_count, start + PICKER_CHUNK_ROWS)
+        for r in range(start, end):
+            values = [text.strip().replace("\n", " ")[:30] or "[空]" for text in self.text_index.row(0, r)]
+            self.grid_tree.insert("", "end", iid=str(r), text=str(r), values=values)
+        self.grid_loaded_rows = end
+
+    def on_grid_click(self, event):
+        """点击单元格时设置 Fname 坐标"""
+        tree = self.grid_tree
+        if tree.identify_region(event.x, event.y) != "cell":
+            return
+        row_id = tree.identify_row(event.y)
+        column_id = tree.identify_column(event.x)  # "#0" 为行号列，"#1" 对应第 0 列
+        if not row_id or column_id in ("", "#0"):
+            return
+        r = int(row_id)
+        c = int(column_id[1:]) - 1
+        if c < len(self.text_index.row(0, r)):
+            self.set_coord(r, c)
 
     def set_coord(self, r, c):
         """
@@ -272,7 +465,7 @@ class WordImageExtractorGUI:
             return
             
         self.coord = (r, c)
-        self.fname_first = self.tables[0].cell(r, c).text.strip() or "未命名文件夹1"
+        self.fname_first = fname_for_table(lambda: self.text_index.cell(0, r, c), 1)
         messagebox.showinfo("选择坐标", f"已选择坐标: ({r},{c})\nFname: {self.fname_first}")
         # 启用开始处理按钮
         self.process_btn.config(state="normal")
@@ -292,6 +485,11 @@ class WordImageExtractorGUI:
             messagebox.showerror("错误", "请先选择Fname坐标")
             return
 
+        if self.low_memory.get():
+            self.process_tables_low_memory()
+            return
+
+        self.ensure_document()
         row_idx, col_idx = self.coord
         total_tables = len(self.tables)
         total_images = 0  # 总图片计数
@@ -301,57 +499,133 @@ class WordImageExtractorGUI:
         self.progress["value"] = 0
         self.root.update_idletasks()
 
-        for idx, table in enumerate(self.tables, start=1):
-            # 确定文件夹名称
-            try:
-                fname_current = table.cell(row_idx, col_idx).text.strip() or f"未命名文件夹{idx}"
-            except Exception:
-                fname_current = f"未命名文件夹{idx}"
-
-            item_folder = os.path.join(self.output_dir, fname_current)
-            os.makedirs(item_folder, exist_ok=True)
-
-            # 为每个表格创建独立的哈希集合，确保同一表格内的重复图片不会被提取
-            seen_hashes = set()
+        # 规划阶段：先确定所有表格的文件夹名称（重名依次加 (2)、(3)…），再批量创建文件夹
+        fnames = dedupe_names([
+            fname_for_table(lambda: self.text_index.cell(idx - 1, row_idx, col_idx), idx)
+            for idx in range(1, total_tables + 1)
+        ])
+        folders, failed_folders = create_folders(self.output_dir, fnames)
+
+        # 图片和表格内容文件先写临时文件，每个文件夹写完后统一 fsync 并改名
+        # 拆分表格用的 zip 和骨架在遇到第一个未命名表格时才准备
+        splitter = None
+        with AtomicFileWriter() as files, ExitStack() as stack:
+            for idx, table in enumerate(self.tables, start=1):
+                fname_current = fnames[idx - 1]
+                item_folder = folders.get(fname_current)
+                if item_folder is None:
+                    print(f"[表格 {idx}] 创建文件夹失败 ({fname_current}): {failed_folders.get(fname_current)}")
+                    continue
+
+                # 为每个表格创建独立的哈希集合，确保同一表格内的重复图片不会被提取
+                seen_hashes = set()
             
-            # 提取图片，使用全局计数器确保唯一性
-            image_count = 0
-            unique_image_count = 0
-            table_image_counter = 0  # 每个表格的图片计数器
-            for row in table.rows:
-                for cell in row.cells:
-                    # 传递当前表格的图片计数器和哈希集合
-                    extracted = extract_images_from_cell(cell, item_folder, fname_current, table_image_counter, seen_hashes)
-                    image_count += extracted
-                    table_image_counter += extracted
-                    unique_image_count += extracted
-
-            total_images += image_count
-            total_unique_images += unique_image_count
+                # 提取图片，使用全局计数器确保唯一性
+                image_count = 0
+                unique_image_count = 0
+                table_image_counter = 0  # 每个表格的图片计数器
+                if IMAGE_HASH_WORKERS:
+                    prefetch_table_image_hashes(table, self.image_hashes)
+                for row in table.rows:
+                    for cell in row.cells:
+                        # 传递当前表格的图片计数器和哈希集合
+                        found, extracted = extract_images_from_cell(cell, item_folder, fname_current, table_image_counter, seen_hashes, files, self.image_hashes)
+                        image_count += found
+                        table_image_counter += extracted
+                        unique_image_count += extracted
+
+                total_images += image_count
+                total_unique_images += unique_image_count
             
-            # 如果文件夹名称是"未命名文件夹"开头，保存表格内容和上下文信息以便核对
-            if fname_current.startswith("未命名文件夹"):
-                # 保存为文本文件
-                txt_path = os.path.join(item_folder, f"{fname_current}_表格内容.txt")
-                save_table_as_text(table, txt_path)
+                # 如果文件夹名称是"未命名文件夹"开头，保存表格内容和上下文信息以便核对
+                if fname_current.startswith("未命名文件夹"):
+                    # 保存为文本文件
+                    txt_path = os.path.join(item_folder, f"{fname_current}_表格内容.txt")
+                    save_table_as_text(self.text_index, idx - 1, txt_path, files)
                 
-                # 保存为Word文档
-                docx_path = os.path.join(item_folder, f"{fname_current}_表格内容.docx")
-                save_table_as_docx(table, docx_path)
+                    # 保存为Word文档
+                    docx_path = os.path.join(item_folder, f"{fname_current}_表格内容.docx")
+                    if splitter is None:
+                        splitter = TableSplitter(stack.enter_context(docx_stream.open_docx(self.input_source())))
+                    save_table_as_docx(splitter, table._tbl, docx_path, files)
                 
-                # 保存上下文信息
-                context_path = os.path.join(item_folder, f"{fname_current}_上下文信息.txt")
-                extract_context_around_table(self.doc, idx-1, context_path)
+                    # 保存上下文信息
+                    context_path = os.path.join(item_folder, f"{fname_current}_上下文信息.txt")
+                    extract_context_around_table(self.text_index, idx - 1, context_path, files)
                 
-                print(f"[表格 {idx}] 提取图片 {unique_image_count} 张（共发现 {image_count} 张，去重后 {unique_image_count} 张），保存到 {item_folder}")
-                print(f"        已保存表格内容到 {txt_path} 和 {docx_path}")
-                print(f"        已保存上下文信息到 {context_path}")
-            else:
-                print(f"[表格 {idx}] 提取图片 {unique_image_count} 张（共发现 {image_count} 张，去重后 {unique_image_count} 张），保存到 {item_folder}")
-
-            # 更新进度条
-            self.progress["value"] = idx
-            self.root.update_idletasks()
+                    print(f"[表格 {idx}] 提取图片 {unique_image_count} 张（共发现 {image_count} 张，去重后 {unique_image_count} 张），保存到 {item_folder}")
+                    print(f"        已保存表格内容到 {txt_path} 和 {docx_path}")
+                    print(f"        已保存上下文信息到 {context_path}")
+                else:
+                    print(f"[表格 {idx}] 提取图片 {unique_image_count} 张（共发现 {image_count} 张，去重后 {unique_image_count} 张），保存到 {item_folder}")
+
+                # 更新进度条
+                self.progress["value"] = idx
+                self.root.update_idletasks()
+
+        messagebox.showinfo("处理完成", f"总计处理 {total_tables} 个表格，发现 {total_images} 张图片，去重后提取 {total_unique_images} 张唯一图片！")
+
+    def process_tables_low_memory(self):
+        """
+        低内存模式下的处理：不保留 Document，逐个表格流式解析并立即释放，
+        文件夹名称、表格内容和上下文信息都从加载时建立的文本索引读取
+        """
+        # 开始提取后不再持有任何 python-docx 对象
+        self.doc = None
+        self.tables = []
+
+        row_idx, col_idx = self.coord
+        total_tables = self.table_count
+        total_images = 0
+        total_unique_images = 0
+
+        self.progress["maximum"] = total_tables
+        self.progress["value"] = 0
+        self.root.update_idletasks()
+
+        # 规划阶段：文件夹名称直接从文本索引读取，重名依次加 (2)、(3)…，再批量创建文件夹
+        fnames = dedupe_names([
+            fname_for_table(lambda: self.text_index.cell(idx - 1, row_idx, col_idx), idx)
+            for idx in range(1, total_tables + 1)
+        ])
+        folders, failed_folders = create_folders(self.output_dir, fnames)
+
+        # 图片和表格内容文件先写临时文件，每个文件夹写完后统一 fsync 并改名
+        with AtomicFileWriter() as files:
+            with docx_stream.open_docx(self.input_source()) as zf:
+                rels = docx_stream.read_part_rels(zf)
+                splitter = None
+
+                for table in docx_stream.iter_tables(zf):
+                    idx = table.index + 1
+                    fname_current = fnames[table.index]
+                    item_folder = folders.get(fname_current)
+                    if item_folder is None:
+                        print(f"[表格 {idx}] 创建文件夹失败 ({fname_current}): {failed_folders.get(fname_current)}")
+                        continue
+
+                    seen_hashes = set()
+                    image_count, unique_image_count = extract_images_from_record(
+                        zf, rels, table, item_folder, fname_current, seen_hashes, files, self.image_hashes
+                    )
+                    total_images += image_count
+                    total_unique_images += unique_image_count
+
+                    print(f"[表格 {idx}] 提取图片 {unique_image_count} 张（共发现 {image_count} 张，去重后 {unique_image_count} 张），保存到 {item_folder}")
+                    if fname_current.startswith("未命名文件夹"):
+                        txt_path = os.path.join(item_folder, f"{fname_current}_表格内容.txt")
+                        save_table_as_text(self.text_index, table.index, txt_path, files)
+                        docx_path = os.path.join(item_folder, f"{fname_current}_表格内容.docx")
+                        if splitter is None:
+                            splitter = TableSplitter(zf)
+                        save_table_as_docx(splitter, table.element, docx_path, files)
+                        context_path = os.path.join(item_folder, f"{fname_current}_上下文信息.txt")
+                        extract_context_around_table(self.text_index, table.index, context_path, files)
+                        print(f"        已保存表格内容到 {txt_path} 和 {docx_path}")
+                        print(f"        已保存上下文信息到 {context_path}")
+
+                    self.progress["value"] = idx
+                    self.root.update_idletasks()
 
         messagebox.showinfo("处理完成", f"总计处理 {total_tables} 个表格，发现 {total_images} 张图片，去重后提取 {total_unique_images} 张唯一图片！")
 
@@ -1,10 +1,29 @@
 import os
 import re
+import glob
+import json
+import time
+import argparse
+import platform
+import multiprocessing
 import tkinter as tk
 from tkinter import filedialog
 from docx import Document
 from datetime import datetime
 from lxml.etree import QName # 用于兼容地处理 XML 命名空间
+from concurrent.futures import ProcessPoolExecutor
+import docx_stream
+from table_text_index import TableTextIndex
+from atomic_files import DEFAULT_FSYNC, parse_fsync_policy, write_text_atomic
+from output_writers import FolderImageWriter, ARCHIVE_FORMATS, archive_path_for, open_archive_writer, prepare_folders
+from output_writers import WriteScheduler, WRITE_BATCH_BYTES, write_image_then, image_output_path
+from path_planner import dedupe_names, create_folders, sanitize_filename
+from image_hash import PartHashCache
+from image_catalog import ImageCatalog, catalog_row, image_dimensions
+from image_probe import ImageFilter, parse_min_size, probe_dimensions, probe_member
+from run_history import record_run, recorded_throughput, estimate_seconds
+from spooled_input import SpooledDocument
+from fname_suggest import suggest_fname_cells, describe_candidate
 
 # --- 1. 配置 & 日志变量 ---
 
@@ -12,10 +31,41 @@ from lxml.etree import QName # 用于兼容地处理 XML 命名空间
 ERROR_LOGS = []
 MAX_LOG_ENTRIES = 500
 
+# 多进程分片时每个进程平均分到的分片数（分片越多，各进程的负载越均衡）
+SHARDS_PER_WORKER = 4
+
+# 图片和日志的 fsync 组提交策略（"folder"、"off" 或每 N 个文件），见 atomic_files
+FSYNC_POLICY = DEFAULT_FSYNC
+
+# 按字节数和像素尺寸跳过装饰性小图片（默认不过滤），见 image_probe
+IMAGE_FILTER = ImageFilter()
+
+# --spool 时已顺序读入内存/本地临时文件的输入文档（SpooledDocument），为 None 时直接读取原文件
+INPUT_SPOOL = None
+
+# 提取结果目录（ImageCatalog），为 None 时不记录
+CATALOG = None
+
+# --tables 选择的表格范围 (起, 止)，从 0 开始、不含止，止为 None 表示到最后一个表格；None 表示全部
+TABLE_RANGE = None
+# --shard 选择的分片 (序号, 分片数)，序号从 0 开始；None 表示不分片
+SHARD = None
+
+# --max-mbps / --max-files-per-sec / --write-batch 时的写出调度参数 (MB/s, 个/秒, 每批 MB)，
+# 见 output_writers.WriteScheduler；None 表示图片直接写出
+WRITE_LIMITS = None
+# 本次处理所有写出调度器的指标合计（见 WriteScheduler.metrics），未使用写出调度时为 None
+WRITE_METRICS = None
+
+# 各分片的统计报告文件名前缀（分片报告_<范围>.json），--merge-shards 时按它查找
+SHARD_REPORT_PREFIX = "shard_report_"
+
 # 统计变量
 TOTAL_TABLES = 0
 PROCESSED_FOLDERS = 0
 TOTAL_IMAGES = 0
+TOTAL_BYTES = 0
+SKIPPED_IMAGES = 0
 
 # --- 2. 辅助函数 ---
 
@@ -28,14 +78,6 @@ def log_error(message):
     ERROR_LOGS.append(log_entry)
     print(f"[错误记录]: {message}")
 
-def sanitize_filename(name):
-    """清理文件名，去除Windows文件名中的非法字符"""
-    if not name:
-        return "Untitled"
-    name = re.sub(r'[\\/*?:"<>|]', '-', name)
-    name = name.strip()
-    return name if name else "Untitled"
-
 def parse_cell_index(user_input):
     """
     解析用户输入的单元格编号，格式如 "0,0" (row_index,col_index)
@@ -52,18 +94,213 @@ def parse_cell_index(user_input):
     except ValueError:
         return None # 无法转换为整数
 
+def parse_table_range(text):
+    """解析 --tables：START-END（从 1 开始，包含两端）或 START-（到最后一个表格），返回 (起, 止)"""
+    match = re.fullmatch(r"\s*(\d+)\s*-\s*(\d*)\s*", text or "")
+    if not match:
+        raise argparse.ArgumentTypeError("格式应为 START-END，例如 1-500 或 501-")
+    start = int(match.group(1))
+    stop = int(match.group(2)) if match.group(2) else None
+    if start < 1 or (stop is not None and stop < start):
+        raise argparse.ArgumentTypeError("表格序号从 1 开始，且 END 不能小于 START")
+    return start - 1, stop
+
+def parse_shard(text):
+    """解析 --shard：i/N（第 i 个分片，共 N 个，i 从 1 开始），返回 (i-1, N)"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", text or "")
+    if not match:
+        raise argparse.ArgumentTypeError("格式应为 i/N，例如 2/4")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("分片序号应在 1 到 N 之间")
+    return index - 1, count
+
+def selected_tables(total):
+    """
+    本次处理的表格范围 [start, stop)：先取 --tables 的范围，再按 --shard 把它按正文顺序均分后取其中一段
+    只取决于表格总数和参数，每台机器算出的范围相同、互不重叠
+    """
+    start, stop = 0, total
+    if TABLE_RANGE is not None:
+        start = min(TABLE_RANGE[0], total)
+        stop = total if TABLE_RANGE[1] is None else min(TABLE_RANGE[1], total)
+    if SHARD is not None:
+        index, count = SHARD
+        ranges = split_ranges(stop - start, count)
+        # 表格比分片少时只有前面的分片分到表格，其余分片为空
+        sub_start, sub_stop = ranges[index] if index < len(ranges) else (stop - start, stop - start)
+        start, stop = start + sub_start, start + sub_stop
+    return start, stop
+
+def selection_label():
+    """--tables/--shard 的标签，用于分片报告、错误日志和归档的文件名；未选择时为 None"""
+    parts = []
+    if TABLE_RANGE is not None:
+        start, stop = TABLE_RANGE
+        parts.append(f"tables_{start + 1}-{stop if stop is not None else 'end'}")
+    if SHARD is not None:
+        parts.append(f"shard_{SHARD[0] + 1}-of-{SHARD[1]}")
+    return "_".join(parts) or None
+
+def reset_statistics():
+    """重置统计变量和错误日志（同一进程内连续处理多个文档时使用）"""
+    global TOTAL_TABLES, PROCESSED_FOLDERS, TOTAL_IMAGES, TOTAL_BYTES, SKIPPED_IMAGES, WRITE_METRICS
+    TOTAL_TABLES = 0
+    PROCESSED_FOLDERS = 0
+    TOTAL_IMAGES = 0
+    TOTAL_BYTES = 0
+    SKIPPED_IMAGES = 0
+    WRITE_METRICS = None
+    ERROR_LOGS.clear()
+
+def save_error_log(output_dir, file_name="error_log.txt"):
+    """将错误日志保存到输出目录下的 error_log.txt（分片时为各分片自己的文件名），返回日志文件路径"""
+    log_file_path = os.path.join(output_dir, file_name)
+    lines = [
+        "--- 错误和警告日志记录 ---\n",
+        f"文件处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n",
+        "\n".join(ERROR_LOGS) if ERROR_LOGS else "未记录到任何错误或警告。\n",
+    ]
+    write_text_atomic(log_file_path, "".join(lines), FSYNC_POLICY)
+    return log_file_path
+
+def resolve_fname(get_cell_text, i, target_cell):
+    """
+    从目标单元格获取第 i 个表格（从 0 开始）的 Fname
+    单元格不存在或读取失败时记录错误并返回 None，调用方跳过此表格
+    """
+    row_idx, col_idx = target_cell
+    try:
+        # 尝试获取用户指定的单元格内容作为Fname
+        fname_raw = get_cell_text()
+        Fname = sanitize_filename(fname_raw)
+        
+        if not Fname:
+            Fname = f"Item_{i+1}_Untitled"
+            log_error(f"表格 {i+1}: 目标单元格 ({row_idx},{col_idx}) 内容为空或仅含非法字符，使用默认命名。")
+        print(f"  单元格 ({row_idx},{col_idx}) Fname: '{Fname}'")
+        return Fname
+        
+    except IndexError:
+        log_error(f"表格 {i+1}: 目标单元格 ({row_idx},{col_idx}) 不存在，跳过此表格。")
+        print(f"  目标单元格 ({row_idx},{col_idx}) 不存在，跳过。")
+        return None
+    except Exception as e:
+        log_error(f"表格 {i+1}: 获取 Fname 时发生未知错误: {e}")
+        return None
+
+def plan_fnames(text_index, target_cell):
+    """
+    规划阶段：从文本索引读取每个表格的 Fname，重名依次加 (2)、(3)…
+    目标单元格不存在的表格为 None
+    """
+    row_idx, col_idx = target_cell
+    return dedupe_names([
+        resolve_fname(lambda: text_index.cell(i, row_idx, col_idx), i, target_cell)
+        for i in range(text_index.table_count)
+    ])
+
+def skip_reason(byte_size, get_dimensions):
+    """
+    按 IMAGE_FILTER 判断是否跳过一张图片（在读取、写出图片之前调用），跳过时计数并返回原因
+    get_dimensions 只读取图片文件头或 wp:extent，只有按尺寸过滤时才会调用
+    """
+    global SKIPPED_IMAGES
+    if not IMAGE_FILTER.active:
+        return None
+    reason = IMAGE_FILTER.check(byte_size, get_dimensions)
+    if reason:
+        SKIPPED_IMAGES += 1
+    return reason
+
+def input_source(doc_path):
+    """读取输入文档时使用的来源：--spool 时为已顺序读入的 SpooledDocument，否则为原路径"""
+    return INPUT_SPOOL if INPUT_SPOOL is not None else doc_path
+
+def open_word_document(doc_path):
+    if INPUT_SPOOL is not None:
+        return Document(INPUT_SPOOL.stream())
+    return Document(doc_path)
+
+def begin_catalog(doc_path, start=0, stop=None, forget=True):
+    """
+    开启提取结果目录时：删除该文档 [start, stop) 范围内表格的旧记录，返回 (文档绝对路径, 图片哈希缓存)；
+    未开启时返回 (None, None)。forget 为 False 时不删除旧记录（多进程分片的工作进程，由主进程统一删除）
+    """
+    if CATALOG is None:
+        return None, None
+    document = os.path.abspath(doc_path)
+    if forget:
+        CATALOG.forget_document(document, start, stop)
+    return document, PartHashCache()
+
+def schedule_writes(writer, write_limits):
+    """
+    write_limits 为 (MB/s, 个/秒, 每批 MB) 时用 WriteScheduler 包装写出器，为 None 时原样返回
+    排队的图片在之后成批写出，写出失败记入错误日志
+    """
+    if write_limits is None:
+        return writer
+    max_mbps, max_files, batch_mb = write_limits
+    return WriteScheduler(
+        writer, max_mbps, max_files, int(batch_mb * 1024 * 1024) if batch_mb else WRITE_BATCH_BYTES,
+        on_error=lambda path, e: log_error(f"保存图片失败 ({path}): {e}"),
+    )
+
+def add_write_metrics(metrics):
+    """把一个写出调度器的指标计入 WRITE_METRICS：最大队列深度取最大值，其余累加"""
+    global WRITE_METRICS
+    if WRITE_METRICS is None:
+        WRITE_METRICS = dict(metrics)
+        return
+    for key, value in metrics.items():
+        WRITE_METRICS[key] = max(WRITE_METRICS[key], value) if key.startswith("max_") else WRITE_METRICS[key] + value
+
+def close_writer(writer):
+    """关闭写出器；经过写出调度时把它的指标计入 WRITE_METRICS"""
+    try:
+        writer.close()
+    finally:
+        if isinstance(writer, WriteScheduler):
+            add_write_metrics(writer.metrics())
+
+def image_written(byte_size, row=None):
+    """
+    返回一张图片写出成功后的回调：计入图片数、字节数和提取结果目录
+    经过写出调度时图片在排队之后才写出，写出失败的图片不会被统计或记入目录
+    """
+    def on_written():
+        global TOTAL_IMAGES, TOTAL_BYTES
+        TOTAL_IMAGES += 1
+        TOTAL_BYTES += byte_size
+        if row is not None:
+            CATALOG.add(row)
+    return on_written
+
 # --- 3. 核心处理函数 ---
 
-def process_document(doc_path, output_dir, target_cell):
+def process_document(doc_path, output_dir, target_cell, writer=None, low_memory=False):
     """
     主处理逻辑：自动根据target_cell从每个表格中提取Fname
+    writer 决定图片写到哪里（见 output_writers），默认按 Fname 文件夹写到 output_dir
+    low_memory 为 True 时不构建 python-docx 的 Document，见 process_document_low_memory
     """
-    global PROCESSED_FOLDERS, TOTAL_IMAGES, TOTAL_TABLES
+    global PROCESSED_FOLDERS, TOTAL_TABLES
     
+    if writer is None:
+        # 自己创建的写出器由自己负责关闭
+        writer = schedule_writes(FolderImageWriter(output_dir, FSYNC_POLICY), WRITE_LIMITS)
+        try:
+            return process_document(doc_path, output_dir, target_cell, writer, low_memory)
+        finally:
+            close_writer(writer)
+    if low_memory:
+        return process_document_low_memory(doc_path, target_cell, writer)
+
     print(f"--- 开始处理文件: {doc_path} ---")
     
     try:
-        document = Document(doc_path)
+        document = open_word_document(doc_path)
         tables = document.tables
         TOTAL_TABLES = len(tables)
         
@@ -72,52 +309,42 @@ def process_document(doc_path, output_dir, target_cell):
             return
 
         print(f"文档中总计 {TOTAL_TABLES} 个表格 (item)。")
+        start, stop = selected_tables(TOTAL_TABLES)
+        if (start, stop) != (0, TOTAL_TABLES):
+            print(f"本次只处理第 {start + 1}-{stop} 个表格。")
+        catalog_document, image_hashes = begin_catalog(doc_path, start, stop)
 
         # 定义需要查找的 XML 元素的完全限定名，解决 BaseOxmlElement.xpath() 错误
         r_embed_qname = QName("http://schemas.openxmlformats.org/officeDocument/2006/relationships", 'embed')
         a_blip_qname = QName("http://schemas.openxmlformats.org/drawingml/2006/main", 'blip')
 
-        row_idx, col_idx = target_cell # 固定的目标单元格索引
+        # --- 规划阶段：先确定所有表格的 Fname（重名依次加 (2)、(3)…），再批量创建文件夹 ---
+        print("正在规划输出路径...")
+        # Fname 总是按全部表格规划，每个分片得到的文件夹名称都与整体处理时相同
+        fnames = plan_fnames(TableTextIndex.build(input_source(doc_path)), target_cell)
+        folders, failed_folders = prepare_folders(writer, fnames[start:stop])
 
-        # 遍历所有表格 (item)
-        for i, table in enumerate(tables):
+        # 遍历所选范围内的表格 (item)
+        for i, table in enumerate(tables[start:stop], start):
             print(f"\n--- 正在处理表格 {i + 1}/{TOTAL_TABLES} ---")
             
-            # --- 自动获取 Fname (统一单元格逻辑) ---
-            Fname = f"Item_{i+1}_Untitled"
-            try:
-                # 尝试获取用户指定的单元格内容作为Fname
-                fname_raw = table.cell(row_idx, col_idx).text
-                Fname = sanitize_filename(fname_raw)
-                
-                if not Fname:
-                    Fname = f"Item_{i+1}_Untitled"
-                    log_error(f"表格 {i+1}: 目标单元格 ({row_idx},{col_idx}) 内容为空或仅含非法字符，使用默认命名。")
-                print(f"  单元格 ({row_idx},{col_idx}) Fname: '{Fname}'")
-                
-            except IndexError:
-                log_error(f"表格 {i+1}: 目标单元格 ({row_idx},{col_idx}) 不存在，跳过此表格。")
-                print(f"  目标单元格 ({row_idx},{col_idx}) 不存在，跳过。")
-                continue
-            except Exception as e:
-                log_error(f"表格 {i+1}: 获取 Fname 时发生未知错误: {e}")
-                continue
+            Fname = fnames[i]
+            if Fname is None:
+                continue  # 目标单元格不存在，规划阶段已记录
 
-            # --- 创建文件夹 ---
-            target_folder_path = os.path.join(output_dir, Fname)
-            try:
-                os.makedirs(target_folder_path, exist_ok=True)
-                PROCESSED_FOLDERS += 1
-                print(f"  已创建/确认文件夹: {target_folder_path}")
-            except Exception as e:
-                log_error(f"表格 {i+1}: 创建文件夹失败 ({target_folder_path}): {e}")
+            # --- 文件夹已在规划阶段创建 ---
+            target_folder_path = folders.get(Fname)
+            if target_folder_path is None:
+                log_error(f"表格 {i+1}: 创建文件夹失败 ({Fname}): {failed_folders.get(Fname)}")
                 continue
+            PROCESSED_FOLDERS += 1
+            print(f"  Fname: '{Fname}'，输出到: {target_folder_path}")
 
             # --- 提取图片 ---
             image_counter = 0
             
-            for row in table.rows:
-                for cell in row.cells:
+            for r_idx, row in enumerate(table.rows):
+                for c_idx, cell in enumerate(row.cells):
                     for para in cell.paragraphs:
                         for run in para.runs:
                             try:
@@ -132,16 +359,32 @@ def process_document(doc_path, output_dir, target_cell):
                                         # 通过 rId 从文档中获取图片部件
                                         image_part = document.part.related_parts[rId]
                                         image_blob = image_part.blob
-                                        image_ext = image_part.default_part_name.split('.')[-1]
+                                        image_ext = image_part.partname.ext
+
+                                        reason = skip_reason(
+                                            len(image_blob),
+                                            lambda: probe_dimensions(image_blob) or docx_stream.blip_extent(blip_list[0]),
+                                        )
+                                        if reason:
+                                            print(f"  跳过图片 {image_part.partname}（{reason}）")
+                                            continue
 
                                         # 定义图片文件名 (Fname + 数字序号)
                                         image_counter += 1
-                                        TOTAL_IMAGES += 1
                                         image_name = f"{Fname}_{image_counter}.{image_ext}"
-                                        image_save_path = os.path.join(target_folder_path, image_name)
-                                        
-                                        with open(image_save_path, 'wb') as f:
-                                            f.write(image_blob)
+                                        row = None
+                                        if image_hashes is not None:
+                                            part_name = str(image_part.partname).lstrip('/')
+                                            row = catalog_row(
+                                                catalog_document, i, r_idx, c_idx, Fname,
+                                                image_output_path(writer, target_folder_path, image_name), part_name,
+                                                image_hashes.digest(part_name, image_blob), len(image_blob),
+                                                *image_dimensions(image_blob),
+                                            )
+                                        write_image_then(
+                                            writer, target_folder_path, image_name, image_blob,
+                                            image_written(len(image_blob), row),
+                                        )
                             except Exception as e:
                                 # 记录提取图片时的任何错误
                                 log_error(f"表格 {i+1}, Fname '{Fname}': 提取或保存图片时出错: {e}")
@@ -157,61 +400,640 @@ def process_document(doc_path, output_dir, target_cell):
         print(f"\n--- 发生致命错误 ---")
         print(f"处理文件失败: {e}")
 
+def extract_record_images(zf, rels, table, Fname, target_folder_path, folder_error, writer, image_hashes=None,
+                          catalog_document=None):
+    """
+    提取流式解析得到的一个表格（TableRecord）中的图片，图片从 zip 按块复制给写出器
+    Fname 为 None 表示目标单元格不存在（规划阶段已记录）；target_folder_path 为 None 表示文件夹创建失败
+    提供 image_hashes 时同时把每张图片记入提取结果目录，来源文档记为 catalog_document
+    """
+    global PROCESSED_FOLDERS
+
+    i = table.index
+    print(f"\n--- 正在处理表格 {i + 1}/{TOTAL_TABLES} ---")
+    if Fname is None:
+        return
+    if target_folder_path is None:
+        log_error(f"表格 {i+1}: 创建文件夹失败 ({Fname}): {folder_error}")
+        return
+    PROCESSED_FOLDERS += 1
+    print(f"  Fname: '{Fname}'，输出到: {target_folder_path}")
+
+    image_counter = 0
+    for r_idx, c_idx, rId, k, extent in table.blips:
+        if k > 0:
+            continue  # 与普通模式一致，每个 run 只取第一张图片
+        try:
+            member_name = rels[rId]
+            image_ext = member_name.rsplit('.', 1)[-1]
+
+            # 字节数取自 zip 中央目录，尺寸只读文件头，被跳过的图片不会被读取或写出
+            reason = skip_reason(
+                zf.getinfo(member_name).file_size,
+                lambda: probe_member(zf, member_name) or extent,
+            )
+            if reason:
+                print(f"  跳过图片 {member_name}（{reason}）")
+                continue
+            image_counter += 1
+            image_name = f"{Fname}_{image_counter}.{image_ext}"
+            byte_size = zf.getinfo(member_name).file_size
+            # 目录记录在 zip 仍打开时生成，写出成功后才记入（写出调度可能在文档关闭后才写出）
+            row = None
+            if image_hashes is not None:
+                with zf.open(member_name) as src:
+                    dimensions = image_dimensions(src)
+                row = catalog_row(
+                    catalog_document, i, r_idx, c_idx, Fname,
+                    image_output_path(writer, target_folder_path, image_name), member_name,
+                    image_hashes.digest_member(zf, member_name), byte_size, *dimensions,
+                )
+            docx_stream.stream_member_to(
+                writer, target_folder_path, image_name, zf, member_name, image_written(byte_size, row)
+            )
+        except Exception as e:
+            log_error(f"表格 {i+1}, Fname '{Fname}': 提取或保存图片时出错: {e}")
+
+    if image_counter == 0:
+        print(f"  在 '{Fname}' 的表格中未找到图片。")
+    else:
+        print(f"  成功提取 {image_counter} 张图片。")
+
+def process_document_low_memory(doc_path, target_cell, writer):
+    """
+    低内存模式（内存上限模式）：
+    - 不构建 python-docx 的 Document（它会把全部图片读入内存）
+    - 逐个表格增量解析 word/document.xml，处理完的表格元素立即释放
+    - 图片从 zip 按块复制到输出，不整体读入内存
+    峰值内存约为“最大的单个表格 XML + 1 MB 复制缓冲区”，与图片数量和大小无关。
+    输出的文件夹和图片命名与普通模式相同。
+    """
+    global TOTAL_TABLES
+
+    print(f"--- 开始处理文件（低内存模式）: {doc_path} ---")
+
+    try:
+        with docx_stream.open_docx(input_source(doc_path)) as zf:
+            rels = docx_stream.read_part_rels(zf)
+
+            # 规划阶段：流式扫描一遍正文建立文本索引，确定最终名称并批量创建文件夹
+            print("正在规划输出路径...")
+            fnames = plan_fnames(TableTextIndex.from_zip(zf), target_cell)
+            TOTAL_TABLES = len(fnames)
+            start, stop = selected_tables(TOTAL_TABLES)
+            if (start, stop) != (0, TOTAL_TABLES):
+                print(f"本次只处理第 {start + 1}-{stop} 个表格。")
+            folders, failed_folders = prepare_folders(writer, fnames[start:stop])
+            catalog_document, image_hashes = begin_catalog(doc_path, start, stop)
+
+            for table in docx_stream.iter_tables(zf, start=start, stop=stop):
+                Fname = fnames[table.index]
+                extract_record_images(
+                    zf, rels, table, Fname, folders.get(Fname), failed_folders.get(Fname), writer, image_hashes,
+                    catalog_document,
+                )
+
+            if TOTAL_TABLES == 0:
+                print("警告: 在此文档中未找到任何表格。")
+
+    except Exception as e:
+        log_error(f"处理文档时发生致命错误: {e}")
+        print(f"\n--- 发生致命错误 ---")
+        print(f"处理文件失败: {e}")
+
+def split_ranges(total, parts):
+    """把 0..total-1 按顺序切成最多 parts 段连续的 [start, stop) 范围，各段长度最多相差 1"""
+    parts = max(1, min(parts, total))
+    size, extra = divmod(total, parts)
+    ranges = []
+    start = 0
+    for k in range(parts):
+        stop = start + size + (1 if k < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def _init_worker():
+    # Ctrl+C 由主进程处理，工作进程忽略
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def extract_shard(doc_path, output_dir, total_tables, start, stop, assignments, fsync_policy=DEFAULT_FSYNC,
+                  catalog_path=None, image_filter=None, input_path=None, write_limits=None):
+    """
+    工作进程入口：独立打开文档，只提取第 start..stop-1 个表格的图片
+    assignments 为主进程规划好的 [(Fname, 文件夹路径, 文件夹创建错误)]，与这些表格一一对应
+    catalog_path 为提取结果目录的数据库时，本进程打开它并按批直接插入自己的记录，记录不传回主进程
+    input_path 为 --spool 时主进程读入的本地副本，提供时从它读取，不再访问原文件
+    write_limits 为该进程分得的写出调度参数（见 schedule_writes）
+    返回 (图片数, 字节数, 跳过的图片数, 文件夹数, 错误日志, 写出调度指标)
+    """
+    global TOTAL_TABLES, CATALOG, IMAGE_FILTER
+    reset_statistics()
+    TOTAL_TABLES = total_tables
+    IMAGE_FILTER = image_filter or ImageFilter()
+    CATALOG = ImageCatalog(catalog_path) if catalog_path else None
+    catalog_document, image_hashes = begin_catalog(doc_path, forget=False)
+    writer = schedule_writes(FolderImageWriter(output_dir, fsync_policy), write_limits)
+    try:
+        with docx_stream.open_docx(input_path or doc_path) as zf:
+            rels = docx_stream.read_part_rels(zf)
+            for table in docx_stream.iter_tables(zf, start=start, stop=stop):
+                Fname, target_folder_path, folder_error = assignments[table.index - start]
+                extract_record_images(
+                    zf, rels, table, Fname, target_folder_path, folder_error, writer, image_hashes,
+                    catalog_document,
+                )
+    except Exception as e:
+        log_error(f"表格 {start+1}-{stop}: 处理分片时发生致命错误: {e}")
+    finally:
+        try:
+            close_writer(writer)
+        finally:
+            # 写出调度在关闭时才写出最后一批，目录记录在它之后关闭
+            if CATALOG is not None:
+                CATALOG.close()
+                CATALOG = None
+    return TOTAL_IMAGES, TOTAL_BYTES, SKIPPED_IMAGES, PROCESSED_FOLDERS, list(ERROR_LOGS), WRITE_METRICS
+
+def process_document_sharded(doc_path, output_dir, target_cell, workers):
+    """
+    多进程分片模式（用于表格数量极多的单个文档）：
+    1. 主进程建立文本索引，统一规划所有表格的 Fname 并批量创建文件夹
+    2. 按正文顺序把表格切成连续的分片，每个工作进程独立打开 zip，只提取自己分片的图片
+    3. 按分片顺序合并统计和错误日志；提取结果目录的记录由各工作进程直接按批写入数据库（WAL 模式）
+    每个表格的文件夹和图片序号在规划阶段已经确定，输出与单进程处理完全相同。
+    """
+    global PROCESSED_FOLDERS, TOTAL_IMAGES, TOTAL_BYTES, TOTAL_TABLES, SKIPPED_IMAGES
+
+    print(f"--- 开始处理文件（多进程分片，{workers} 个进程）: {doc_path} ---")
+
+    try:
+        print("正在规划输出路径...")
+        fnames = plan_fnames(TableTextIndex.build(input_source(doc_path)), target_cell)
+        TOTAL_TABLES = len(fnames)
+        if TOTAL_TABLES == 0:
+            print("警告: 在此文档中未找到任何表格。")
+            return
+        start, stop = selected_tables(TOTAL_TABLES)
+        folders, failed_folders = create_folders(output_dir, fnames[start:stop])
+
+        begin_catalog(doc_path, start, stop)
+        # 限速是所有进程合计的上限，每个进程分得 1/workers
+        write_limits = None
+        if WRITE_LIMITS is not None:
+            max_mbps, max_files, batch_mb = WRITE_LIMITS
+            write_limits = (max_mbps / workers, max_files / workers, batch_mb)
+        shards = [(start + a, start + b) for a, b in split_ranges(stop - start, workers * SHARDS_PER_WORKER)]
+        print(f"文档中总计 {TOTAL_TABLES} 个表格 (item)，第 {start + 1}-{stop} 个分为 {len(shards)} 个分片。")
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [
+                executor.submit(
+                    extract_shard, doc_path, output_dir, TOTAL_TABLES, start, stop,
+                    [(Fname, folders.get(Fname), failed_folders.get(Fname)) for Fname in fnames[start:stop]],
+                    FSYNC_POLICY, os.path.abspath(CATALOG.db_path) if CATALOG is not None else None, IMAGE_FILTER,
+                    INPUT_SPOOL.local_path if INPUT_SPOOL is not None else None, write_limits,
+                )
+                for start, stop in shards
+            ]
+            # 按分片顺序合并，错误日志的顺序与单进程处理一致
+            for future in futures:
+                images, byte_count, skipped, processed, logs, write_metrics = future.result()
+                TOTAL_IMAGES += images
+                TOTAL_BYTES += byte_count
+                SKIPPED_IMAGES += skipped
+                PROCESSED_FOLDERS += processed
+                if write_metrics is not None:
+                    add_write_metrics(write_metrics)
+                for entry in logs:
+                    if len(ERROR_LOGS) >= MAX_LOG_ENTRIES:
+                        ERROR_LOGS.pop(0)
+                    ERROR_LOGS.append(entry)
+
+    except Exception as e:
+        log_error(f"处理文档时发生致命错误: {e}")
+        print(f"\n--- 发生致命错误 ---")
+        print(f"处理文件失败: {e}")
+
+def shard_file_stem(doc_path):
+    """分片报告和分片错误日志的文件名主干：文档名 + --tables/--shard 标签"""
+    return f"{os.path.splitext(os.path.basename(doc_path))[0]}_{selection_label()}"
+
+def save_shard_report(doc_path, output_dir, seconds):
+    """
+    --tables/--shard 时把本分片的范围、统计和错误日志保存为 shard_report_<文档>_<标签>.json，
+    多台机器写入同一个输出目录后用 --merge-shards 合并；返回报告路径
+    """
+    start, stop = selected_tables(TOTAL_TABLES)
+    report = {
+        "document": os.path.basename(doc_path),
+        "label": selection_label(),
+        "total_tables": TOTAL_TABLES,
+        "start": start,
+        "stop": stop,
+        "host": platform.node(),
+        "finished_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(seconds, 3),
+        "folders": PROCESSED_FOLDERS,
+        "images": TOTAL_IMAGES,
+        "bytes": TOTAL_BYTES,
+        "skipped": SKIPPED_IMAGES,
+        "errors": list(ERROR_LOGS),
+    }
+    path = os.path.join(output_dir, f"{SHARD_REPORT_PREFIX}{shard_file_stem(doc_path)}.json")
+    write_text_atomic(path, json.dumps(report, ensure_ascii=False, indent=2), FSYNC_POLICY)
+    return path
+
+def check_shard_coverage(reports):
+    """按表格范围排好序的同一文档的分片报告中，遗漏或重叠的表格范围说明"""
+    problems = []
+    total = reports[0]["total_tables"]
+    covered = 0
+    for report in reports:
+        if report["total_tables"] != total:
+            problems.append(f"{report['label']} 记录的表格总数为 {report['total_tables']}，与其他分片（{total}）不同")
+        if report["start"] > covered:
+            problems.append(f"第 {covered + 1}-{report['start']} 个表格没有分片处理")
+        elif report["start"] < covered and report["stop"] > report["start"]:
+            problems.append(f"第 {report['start'] + 1}-{min(covered, report['stop'])} 个表格被多个分片重复处理")
+        covered = max(covered, report["stop"])
+    if covered < total:
+        problems.append(f"第 {covered + 1}-{total} 个表格没有分片处理")
+    return problems
+
+def merge_shard_reports(output_dir):
+    """
+    合并输出目录中各分片的报告：按文档分组、按表格顺序排列，检查遗漏或重叠的表格范围，
+    汇总统计并把各分片的错误日志按表格顺序合并为 error_log.txt；返回合并的文档数
+    """
+    grouped = {}
+    pattern = os.path.join(glob.escape(output_dir), f"{SHARD_REPORT_PREFIX}*.json")
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[注意]: 无法读取分片报告 {path}: {e}")
+            continue
+        grouped.setdefault(report["document"], []).append(report)
+    if not grouped:
+        print(f"输出目录中没有找到分片报告（{SHARD_REPORT_PREFIX}*.json）。")
+        return 0
+
+    lines = [
+        "--- 错误和警告日志记录（合并各分片） ---\n",
+        f"合并时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+    ]
+    for document, reports in sorted(grouped.items()):
+        reports.sort(key=lambda r: (r["start"], r["stop"]))
+        problems = check_shard_coverage(reports)
+        images = sum(r["images"] for r in reports)
+        byte_count = sum(r["bytes"] for r in reports)
+
+        print("\n" + "="*50)
+        print(f"--- 合并统计: {document}（{len(reports)} 个分片） ---")
+        for r in reports:
+            print(f"  {r['label']}: 第 {r['start'] + 1}-{r['stop']} 个表格，{r['images']} 张图片，"
+                  f"{len(r['errors'])} 条错误，{r['host']}，{format_duration(r['seconds'])}")
+        print(f"总计检测到表格数量: {reports[0]['total_tables']}")
+        print(f"成功创建的文件夹数量: {sum(r['folders'] for r in reports)}")
+        print(f"提取的图片总数量: {images}（{format_size(byte_count)}）")
+        skipped = sum(r["skipped"] for r in reports)
+        if skipped:
+            print(f"按大小/尺寸跳过的图片数量: {skipped}")
+        print(f"错误日志条数: {sum(len(r['errors']) for r in reports)}")
+        for problem in problems:
+            print(f"[注意]: {problem}")
+
+        lines.append(f"\n=== {document}（{len(reports)} 个分片） ===\n")
+        for problem in problems:
+            lines.append(f"[分片检查] {problem}\n")
+        for r in reports:
+            lines.append(f"\n--- {r['label']}：第 {r['start'] + 1}-{r['stop']} 个表格（{r['host']}，{r['finished_at']}） ---\n")
+            lines.append("\n".join(r["errors"]) + "\n" if r["errors"] else "未记录到任何错误或警告。\n")
+
+    log_file_path = os.path.join(output_dir, "error_log.txt")
+    write_text_atomic(log_file_path, "".join(lines), FSYNC_POLICY)
+    print(f"\n[日志]: 合并后的错误日志已保存到: {log_file_path}")
+    return len(grouped)
+
+def format_size(byte_count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if byte_count < 1024 or unit == "GB":
+            return f"{byte_count:.0f} {unit}" if unit == "B" else f"{byte_count:.1f} {unit}"
+        byte_count /= 1024
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分 {seconds} 秒"
+    if minutes:
+        return f"{minutes} 分 {seconds} 秒"
+    return f"{seconds} 秒"
+
+def suggest_cells_for(doc_path, top=3):
+    """对文档所有表格做列统计，返回建议的 Fname 坐标；文档无法读取时返回空列表"""
+    try:
+        return suggest_fname_cells(TableTextIndex.build(doc_path), top=top)
+    except Exception as e:
+        print(f"无法分析表格以建议坐标: {e}")
+        return []
+
+def run_mode(args):
+    """处理方式的名称，速度记录按处理方式分别统计"""
+    if args.archive:
+        return f"archive-{args.archive}"
+    if args.workers > 1:
+        return f"workers-{args.workers}"
+    return "low-memory" if args.low_memory else "normal"
+
+def dry_run_document(doc_path, output_dir, target_cell, mode):
+    """
+    预演：只流式解析 word/document.xml 并读取 zip 中央目录（图片大小和 CRC），
+    不读取任何图片数据，也不创建或写入任何文件。
+    打印规划的文件夹/文件列表、缺少 Fname 的表格、总计和按历史速度估算的耗时。
+    不同图片按 (CRC, 大小) 判断；按尺寸过滤只能使用 wp:extent，实际运行时以图片文件头为准。
+    """
+    row_idx, col_idx = target_cell
+    print(f"--- 预演（不写入任何文件）: {doc_path} ---")
+
+    names = []
+    table_images = []  # 每个表格将写出的 [(部件名, 字节数, CRC)]
+    missing = []  # [(表格序号, 说明)]
+    table_skipped = []  # 每个表格按大小/尺寸跳过的图片数
+    table_unresolved = []  # 每个表格找不到部件的图片引用数
+    with docx_stream.open_docx(doc_path) as zf:
+        rels = docx_stream.read_part_rels(zf)
+        for table in docx_stream.iter_tables(zf):
+            i = table.index
+            try:
+                raw = table.cell_text(row_idx, col_idx)
+                if not raw.strip():
+                    missing.append((i, "目标单元格为空"))
+                names.append(sanitize_filename(raw))
+            except IndexError:
+                missing.append((i, "目标单元格不存在，将跳过"))
+                names.append(None)
+
+            images = []
+            skipped = unresolved = 0
+            for _, _, rId, k, extent in table.blips:
+                if k > 0:
+                    continue  # 与实际提取一致，每个 run 只取第一张图片
+                member_name = rels.get(rId)
+                info = zf.NameToInfo.get(member_name) if member_name else None
+                if info is None:
+                    unresolved += 1
+                    continue
+                if IMAGE_FILTER.check(info.file_size, lambda: extent):
+                    skipped += 1
+                    continue
+                images.append((member_name, info.file_size, info.CRC))
+            table_images.append(images)
+            table_skipped.append(skipped)
+            table_unresolved.append(unresolved)
+
+    fnames = dedupe_names(names)
+    # --tables/--shard：名称按全部表格规划，只列出所选范围
+    start, stop = selected_tables(len(fnames))
+    missing = [(i, reason) for i, reason in missing if start <= i < stop]
+    skipped = sum(table_skipped[start:stop])
+    unresolved = sum(table_unresolved[start:stop])
+
+    print("\n规划的输出:")
+    unique = {}
+    total_images = 0
+    total_bytes = 0
+    folders = 0
+    for Fname, images in zip(fnames[start:stop], table_images[start:stop]):
+        if Fname is None:
+            continue
+        folders += 1
+        folder_bytes = sum(size for _, size, _ in images)
+        print(f"  {os.path.join(output_dir, Fname)}{os.sep}  ({len(images)} 张, {format_size(folder_bytes)})")
+        for n, (member_name, size, crc) in enumerate(images, 1):
+            image_ext = member_name.rsplit('.', 1)[-1]
+            print(f"    {Fname}_{n}.{image_ext}  {format_size(size)}")
+            unique[(crc, size)] = size
+        total_images += len(images)
+        total_bytes += folder_bytes
+
+    if missing:
+        print(f"\n缺少 Fname 的表格（{len(missing)} 个）:")
+        for i, reason in missing:
+            print(f"  表格 {i+1}: {reason}")
+
+    print("\n" + "="*50)
+    print("--- 预演统计 ---")
+    print(f"表格数量: {len(fnames)}")
+    if (start, stop) != (0, len(fnames)):
+        print(f"本次处理的表格: 第 {start + 1}-{stop} 个（{stop - start} 个）")
+    print(f"将创建的文件夹数量: {folders}")
+    print(f"将写出的图片数量: {total_images}（{format_size(total_bytes)}）")
+    print(f"不同图片数量: {len(unique)}（{format_size(sum(unique.values()))}）")
+    print(f"缺少 Fname 的表格数量: {len(missing)}")
+    if IMAGE_FILTER.active:
+        print(f"按大小/尺寸跳过的图片数量: {skipped}")
+    if unresolved:
+        print(f"找不到图片部件的引用数量: {unresolved}")
+
+    throughput = recorded_throughput(mode)
+    if throughput is None:
+        print("预计耗时: 尚无处理速度记录，完成一次实际提取后即可估算")
+    else:
+        bytes_per_second, images_per_second, runs = throughput
+        seconds = estimate_seconds(mode, total_bytes, total_images)
+        print(f"预计耗时: 约 {format_duration(seconds)}"
+              f"（按最近 {runs} 次记录: {format_size(bytes_per_second)}/秒, {images_per_second:.0f} 张/秒）")
+    print("========================")
+
 # --- 4. 主程序入口 ---
-def main():
-    global PROCESSED_FOLDERS, TOTAL_IMAGES
+def parse_args(argv=None):
+    """命令行参数；未提供的参数仍按原来的方式交互式询问"""
+    parser = argparse.ArgumentParser(description="按固定单元格坐标自动提取Word表格中的图片")
+    parser.add_argument("--cell", help="Fname 单元格坐标 (row_index,col_index)，例如 0,0")
+    parser.add_argument("--doc", help="要处理的 Word 文档 (.docx)")
+    parser.add_argument("--output", help="图片输出目录")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS,
+                        help="不逐个创建文件夹和文件，而是把 Fname/Fname_N.ext 直接写入一个 zip 或 tar 归档")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="低内存模式：不加载整个文档，逐个表格解析并按块复制图片，峰值内存与图片数量无关")
+    parser.add_argument("--fsync", type=parse_fsync_policy, default=DEFAULT_FSYNC,
+                        help="图片先写临时文件再改名；fsync 组提交策略: folder（每个文件夹一次，默认）、"
+                             "正整数 N（每 N 个文件一次）或 off（不 fsync）")
+    parser.add_argument("--min-bytes", type=int, default=0,
+                        help="跳过小于该字节数的图片（徽标、图标等），按 zip 中记录的大小判断，不读取图片")
+    parser.add_argument("--min-size", type=parse_min_size, default=(0, 0), metavar="宽x高",
+                        help="跳过宽或高小于该像素数的图片，如 120x80；尺寸只从图片文件头或 wp:extent 读取")
+    parser.add_argument("--catalog", metavar="DB",
+                        help="把每张提取的图片（来源文档、表格、单元格、Fname、输出路径、哈希、尺寸等）记入该 SQLite 数据库")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="大于 1 时把文档的表格按顺序分片，由多个进程并行提取（工作进程均按低内存方式读取）")
+    parser.add_argument("--spool", action="store_true",
+                        help="先按大块顺序把整个文档读入内存或本地临时文件再处理，适用于网络共享上的文档"
+                             "（网络延迟每个文档只影响一次，而不是每个部件一次）")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="预演：只读取文档结构和 zip 目录，列出将创建的文件夹和图片、统计并估算耗时，不写入任何文件")
+    parser.add_argument("--tables", type=parse_table_range, metavar="START-END",
+                        help="只处理第 START 到 END 个表格（从 1 开始，含两端；END 省略表示到最后），"
+                             "Fname 仍按全部表格规划，文件夹名称和图片序号与整体处理时相同")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="按正文顺序把（--tables 范围内的）表格均分为 N 段，只处理第 i 段；"
+                             "多台机器分别处理不同的分片到同一个输出目录，最后用 --merge-shards 合并")
+    parser.add_argument("--merge-shards", action="store_true",
+                        help="合并 --output 目录中各分片的统计报告和错误日志，检查是否有遗漏或重复的表格，不处理文档")
+    parser.add_argument("--max-mbps", type=float, default=0, metavar="MB/s",
+                        help="写出图片的速度上限（MB/秒，多进程时为合计），多份程序共用一台文件服务器时使用；默认不限")
+    parser.add_argument("--max-files-per-sec", type=float, default=0, metavar="N",
+                        help="每秒最多写出的图片文件数（多进程时为合计）；默认不限")
+    parser.add_argument("--write-batch", type=float, default=0, metavar="MB",
+                        help="图片先按目标文件夹排队，累积到该大小（或 256 个文件）后按文件夹成批写出；"
+                             f"使用限速时默认为 {WRITE_BATCH_BYTES // (1024 * 1024)} MB")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global PROCESSED_FOLDERS, TOTAL_IMAGES, FSYNC_POLICY, CATALOG, IMAGE_FILTER, INPUT_SPOOL, TABLE_RANGE, SHARD
+    global WRITE_LIMITS
+    args = parse_args(argv)
+    FSYNC_POLICY = args.fsync
+    IMAGE_FILTER = ImageFilter(args.min_bytes, *args.min_size)
+    TABLE_RANGE = args.tables
+    SHARD = args.shard
+    if args.max_mbps or args.max_files_per_sec or args.write_batch:
+        WRITE_LIMITS = (args.max_mbps, args.max_files_per_sec, args.write_batch)
+
+    if args.merge_shards:
+        if not args.output:
+            print("--merge-shards 需要用 --output 指定各分片共同的输出目录。")
+            return
+        merge_shard_reports(args.output)
+        return
+    interactive = not (args.cell and args.doc and args.output)
     
-    # 隐藏Tkinter主窗口
-    root = tk.Tk()
-    root.withdraw() 
+    # 隐藏Tkinter主窗口（仅在需要弹出选择窗口时创建）
+    if not (args.doc and args.output):
+        root = tk.Tk()
+        root.withdraw() 
     
-    # --- 步骤 1: 获取单元格编号 ---
-    target_cell = None
+    # --- 步骤 1: 选择文件和目录 ---
+    doc_path = args.doc
+    if not doc_path:
+        print("\n请在弹出的窗口中，选择您要处理的 Word 文档 (.docx)...")
+        doc_path = filedialog.askopenfilename(
+            title="请选择一个 Word 文档",
+            filetypes=[("Word Documents", "*.docx")]
+        )
+    if not doc_path:
+        print("用户取消了文件选择。程序退出。")
+        return
+
+    output_dir = args.output
+    if not output_dir:
+        print("请在弹出的窗口中，选择图片要导出到的目标文件夹...")
+        output_dir = filedialog.askdirectory(
+            title="请选择一个输出文件夹"
+        )
+    if not output_dir:
+        print("用户取消了输出目录选择。程序退出。")
+        return
+
+    # --- 步骤 2: 获取单元格编号（先选择文档，才能根据所有表格给出建议坐标） ---
+    target_cell = parse_cell_index(args.cell) if args.cell else None
+    if args.cell and target_cell is None:
+        print("--cell 格式错误或索引无效。")
+    suggestions = suggest_cells_for(doc_path) if target_cell is None else []
     while target_cell is None:
         print("\n" + "="*50)
         print("请定义所有表格用于命名的单元格编号 (例如: 0,0 代表第一行第一列):")
-        cell_input = input("输入行,列编号 (row_index,col_index): ")
+        if suggestions:
+            print("根据所有表格的统计，建议的坐标:")
+            for candidate in suggestions:
+                print(f"  {describe_candidate(candidate)}")
+            best = suggestions[0]
+            cell_input = input(f"输入行,列编号 (row_index,col_index)，直接回车使用 {best.row},{best.col}: ")
+            if not cell_input.strip():
+                cell_input = f"{best.row},{best.col}"
+        else:
+            cell_input = input("输入行,列编号 (row_index,col_index): ")
         target_cell = parse_cell_index(cell_input)
         if target_cell is None:
             print("输入格式错误或索引无效。请重新输入。")
 
-    # --- 步骤 2: 选择文件和目录 ---
-    print("\n请在弹出的窗口中，选择您要处理的 Word 文档 (.docx)...")
-    doc_path = filedialog.askopenfilename(
-        title="请选择一个 Word 文档",
-        filetypes=[("Word Documents", "*.docx")]
-    )
-    if not doc_path:
-        print("用户取消了文件选择。程序退出。")
-        return
-
-    print("请在弹出的窗口中，选择图片要导出到的目标文件夹...")
-    output_dir = filedialog.askdirectory(
-        title="请选择一个输出文件夹"
-    )
-    if not output_dir:
-        print("用户取消了输出目录选择。程序退出。")
+    if args.dry_run:
+        try:
+            dry_run_document(doc_path, output_dir, target_cell, run_mode(args))
+        except Exception as e:
+            print(f"预演失败: {e}")
+        if interactive:
+            print("\n预演完成。按 Enter 键退出...")
+            input()
         return
+    os.makedirs(output_dir, exist_ok=True)
         
     print(f"\n[配置]: 目标单元格为：第 {target_cell[0]+1} 行，第 {target_cell[1]+1} 列。")
     print(f"[注意]: 程序将全自动运行。")
 
     # --- 步骤 3: 调用核心处理函数 ---
-    process_document(doc_path, output_dir, target_cell)
+    started = time.perf_counter()
+    if args.catalog:
+        CATALOG = ImageCatalog(args.catalog)
+        print(f"[目录]: 提取结果将记入 {args.catalog}")
+    try:
+        if args.spool:
+            # 多进程时工作进程需要重新打开文档，只能使用本地临时文件
+            sharded = args.workers > 1 and not args.archive
+            try:
+                INPUT_SPOOL = SpooledDocument(doc_path, memory_limit=0) if sharded else SpooledDocument(doc_path)
+                where = INPUT_SPOOL.local_path or "内存"
+                print(f"[输入]: 已顺序读入文档（{format_size(INPUT_SPOOL.size)}）到 {where}")
+            except OSError as e:
+                print(f"[注意]: 无法顺序读入文档（{e}），改为直接读取。")
+        if args.archive:
+            if args.workers > 1:
+                print("[注意]: 归档文件只能由一个进程顺序写入，忽略 --workers。")
+            archive_path = archive_path_for(doc_path, output_dir, args.archive)
+            if selection_label():
+                # 每个分片写自己的归档文件，多台机器输出到同一目录时互不覆盖
+                stem, ext = os.path.splitext(archive_path)
+                archive_path = f"{stem}_{selection_label()}{ext}"
+            print(f"[输出]: 图片将写入归档文件 {archive_path}")
+            writer = schedule_writes(open_archive_writer(archive_path, args.archive), WRITE_LIMITS)
+            try:
+                process_document(doc_path, output_dir, target_cell, writer, low_memory=args.low_memory)
+            finally:
+                close_writer(writer)
+        elif args.workers > 1:
+            process_document_sharded(doc_path, output_dir, target_cell, args.workers)
+        else:
+            process_document(doc_path, output_dir, target_cell, low_memory=args.low_memory)
+    finally:
+        if CATALOG is not None:
+            CATALOG.close()
+            CATALOG = None
+        if INPUT_SPOOL is not None:
+            INPUT_SPOOL.close()
+            INPUT_SPOOL = None
+
+    # 记录本次处理速度，供以后 --dry-run 估算耗时
+    elapsed = time.perf_counter() - started
+    try:
+        record_run(run_mode(args), TOTAL_BYTES, TOTAL_IMAGES, elapsed)
+    except OSError as e:
+        print(f"[注意]: 无法保存处理速度记录: {e}")
     
     # --- 步骤 4: 结果输出 ---
     
-    # 保存日志
-    log_file_path = os.path.join(output_dir, "error_log.txt")
+    # 保存日志（分片时每个分片写自己的日志和统计报告，由 --merge-shards 合并）
     try:
-        with open(log_file_path, 'w', encoding='utf-8') as f:
-            f.write("--- 错误和警告日志记录 ---\n")
-            f.write(f"文件处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            if ERROR_LOGS:
-                f.write("\n".join(ERROR_LOGS))
-            else:
-                f.write("未记录到任何错误或警告。\n")
-        print(f"\n[日志]: 错误日志已保存到: {log_file_path}")
+        if selection_label():
+            log_file_path = save_error_log(output_dir, f"error_log_{shard_file_stem(doc_path)}.txt")
+            report_path = save_shard_report(doc_path, output_dir, elapsed)
+            print(f"\n[日志]: 错误日志已保存到: {log_file_path}，分片报告: {report_path}")
+        else:
+            log_file_path = save_error_log(output_dir)
+            print(f"\n[日志]: 错误日志已保存到: {log_file_path}")
     except Exception as e:
         print(f"[日志错误]: 无法保存日志文件: {e}")
     
@@ -219,16 +1041,26 @@ def main():
     print("\n" + "="*50)
     print("--- 最终统计结果 ---")
     print(f"总计检测到表格数量: {TOTAL_TABLES}")
+    if selection_label():
+        start, stop = selected_tables(TOTAL_TABLES)
+        print(f"本分片处理的表格: 第 {start + 1}-{stop} 个（{selection_label()}）")
     print(f"成功创建的文件夹数量: {PROCESSED_FOLDERS}")
-    print(f"提取的图片总数量: {TOTAL_IMAGES}")
+    print(f"提取的图片总数量: {TOTAL_IMAGES}（{format_size(TOTAL_BYTES)}）")
+    if IMAGE_FILTER.active:
+        print(f"按大小/尺寸跳过的图片数量: {SKIPPED_IMAGES}")
+    if WRITE_METRICS is not None:
+        print(f"写出调度: {WRITE_METRICS['batches']} 批，最大队列 {WRITE_METRICS['max_queue_files']} 个文件"
+              f"（{format_size(WRITE_METRICS['max_queue_bytes'])}），限速等待 {WRITE_METRICS['throttle_seconds']:.1f} 秒")
     print(f"错误日志条数: {len(ERROR_LOGS)} / {MAX_LOG_ENTRIES}")
     print("========================")
     
     # 防止exe窗口闪退
-    print("\n处理完成。按 Enter 键退出...")
-    input()
+    if interactive:
+        print("\n处理完成。按 Enter 键退出...")
+        input()
 
 # ---------------------------------
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 后多进程需要
     main()
 # ---------------------------------
\ No newline at end of file
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+崩溃安全的文件写出
+功能：图片和附带的文本文件（_表格内容.txt、_上下文信息.txt、error_log.txt 等）
+先写到同目录下的临时文件（原文件名 + ".part"），写完后再原子地改名为最终文件名。
+程序中途被结束时，输出目录里只会留下 .part 临时文件，不会出现名字正常、内容却被截断的图片。
+
+持久化（fsync）采用组提交：不是每个文件写完都等待磁盘，而是攒一批再统一处理：
+    "folder"  一个文件夹的文件写完（开始写另一个文件夹）时提交一次（默认）
+    N（整数） 每 N 个文件提交一次
+    "off"     不调用 fsync，写完立即改名（仍然是原子改名，只是断电时不保证已落盘）
+每个临时文件在关闭之前就通过写出时的句柄 fsync，不再为 fsync 重新打开一次；
+提交时逐个改名，最后每个目录 fsync 一次，因此带最终文件名的文件一定已经完整写入磁盘。
+"""
+
+import os
+from contextlib import contextmanager
+
+TEMP_SUFFIX = ".part"
+
+FSYNC_FOLDER = "folder"
+FSYNC_OFF = "off"
+DEFAULT_FSYNC = FSYNC_FOLDER
+
+
+def parse_fsync_policy(text):
+    """解析 "folder"、"off" 或正整数 N，格式错误时抛出 ValueError"""
+    value = str(text).strip().lower()
+    if value in (FSYNC_FOLDER, FSYNC_OFF):
+        return value
+    every = int(value)
+    if every <= 0:
+        raise ValueError(f"fsync 间隔必须为正整数: {text}")
+    return every
+
+
+def _fsync_file(path):
+    # 只用于句柄已经关闭、尚未 fsync 的文件；Windows 上 fsync 需要可写的文件句柄
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path):
+    """fsync 目录以保证改名本身落盘；Windows 不支持打开目录，跳过"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AtomicFileWriter:
+    """
+    按组提交策略写文件：open / write_bytes / write_text 写到临时文件，
+    提交时才出现最终文件名；结束时必须调用 close()（或作为 with 语句使用）提交剩余文件
+    """
+
+    def __init__(self, fsync_policy=DEFAULT_FSYNC):
+        self.fsync_policy = fsync_policy
+        self.pending = []  # [(临时路径, 最终路径, 是否已 fsync)]
+        self.pending_folder = None
+
+    @contextmanager
+    def open(self, path, mode="wb", encoding=None):
+        folder = os.path.dirname(path)
+        if self.fsync_policy == FSYNC_FOLDER and self.pending and folder != self.pending_folder:
+            self.commit()
+
+        tmp_path = path + TEMP_SUFFIX
+        synced = False
+        try:
+            with open(tmp_path, mode, encoding=encoding) as f:
+                yield f
+                if self.fsync_policy != FSYNC_OFF and not f.closed:
+                    # 趁句柄还开着 fsync，提交时不必重新打开；调用方自己关闭了句柄时留到提交时处理
+                    f.flush()
+                    os.fsync(f.fileno())
+                    synced = True
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if self.fsync_policy == FSYNC_OFF:
+            os.replace(tmp_path, path)
+            return
+        self.pending.append((tmp_path, path, synced))
+        self.pending_folder = folder
+        if isinstance(self.fsync_policy, int) and len(self.pending) >= self.fsync_policy:
+            self.commit()
+
+    def write_bytes(self, path, data):
+        with self.open(path, "wb") as f:
+            f.write(data)
+
+    def write_text(self, path, text):
+        with self.open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def commit(self):
+        """组提交：这一批临时文件确认都已 fsync 后再改名，最后每个目录 fsync 一次"""
+        pending, self.pending = self.pending, []
+        self.pending_folder = None
+        for tmp_path, _, synced in pending:
+            if not synced:
+                _fsync_file(tmp_path)
+        folders = set()
+        for tmp_path, path, _ in pending:
+            os.replace(tmp_path, path)
+            folders.add(os.path.dirname(path))
+        for folder in folders:
+            _fsync_dir(folder)
+
+    def close(self):
+        self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 出错时也提交已经完整写完的文件
+        self.close()
+        return False
+
+
+def write_text_atomic(path, text, fsync_policy=DEFAULT_FSYNC):
+    """单独写一个文本文件（如 error_log.txt），写完立即提交"""
+    with AtomicFileWriter(fsync_policy) as files:
+        files.write_text(path, text)
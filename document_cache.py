@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+解析结果的持久缓存
+功能：把文档解析得到的 TableTextIndex（表格结构、单元格文本、表格 -> 图片部件的对应关系）
+以紧凑的二进制格式保存在本地缓存目录中，同一文档再次打开时直接读取，不再解析 word/document.xml。
+
+缓存键由文件大小、修改时间和内容指纹组成；内容指纹是 zip 中央目录中每个成员的
+（名称、CRC、大小）的哈希，只需读取中央目录，不读取任何部件内容。
+缓存目录的总大小超过上限时按最近使用时间（LRU）删除最旧的条目。
+"""
+
+import hashlib
+import os
+
+import docx_stream
+from atomic_files import AtomicFileWriter, FSYNC_OFF
+from table_text_index import TableTextIndex
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".msword_tools_cache")
+
+# 缓存目录的总大小上限
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+ENTRY_SUFFIX = ".idx"
+
+
+def document_key(doc_path, source=None):
+    """
+    缓存键：文件大小、修改时间和中央目录指纹
+    source 为已顺序读入的 SpooledDocument 时从它读取中央目录，不再访问原文件
+    """
+    stat = os.stat(doc_path)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with docx_stream.open_docx(source or doc_path) as zf:
+        for info in zf.infolist():
+            hasher.update(f"\n{info.filename}:{info.CRC:08x}:{info.file_size}".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class DocumentCache:
+    """磁盘上的 TableTextIndex 缓存，每个文档一个文件，文件的修改时间即最近使用时间"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """命中时返回 TableTextIndex 并更新最近使用时间，未命中或条目损坏时返回 None"""
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            index = TableTextIndex.from_bytes(data)
+        except Exception:
+            # 损坏或格式版本不同的条目删除后重新解析
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return index
+
+    def put(self, key, index):
+        """保存索引（先写临时文件再改名），然后按 LRU 清理超出上限的条目"""
+        data = index.to_bytes()
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with AtomicFileWriter(FSYNC_OFF) as files:
+            files.write_bytes(self.entry_path(key), data)
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """删除最久未使用的条目，直到总大小不超过上限；keep 为刚写入的条目，不删除"""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        keep_path = self.entry_path(keep) if keep else None
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_text_index(doc_path, source=None, cache=None):
+    """
+    读取文档的 TableTextIndex：先查缓存，未命中时解析文档并写入缓存
+    返回 (索引, 是否命中缓存)；缓存目录不可用时直接解析
+    """
+    cache = cache or DocumentCache()
+    try:
+        key = document_key(doc_path, source)
+    except OSError:
+        key = None
+    if key is not None:
+        index = cache.get(key)
+        if index is not None:
+            return index, True
+    index = TableTextIndex.build(source or doc_path)
+    if key is not None:
+        try:
+            cache.put(key, index)
+        except OSError as e:
+            print(f"无法写入解析缓存: {e}")
+    return index, False
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+照片集文档生成工具（提取的逆过程）
+功能：把输入目录下的 Fname/ 文件夹生成一个照片集 .docx，每个文件夹一个表格：
+第一行为“隐患点编号 | Fname”，之后每行两张照片。生成的文档可以直接用本仓库的提取工具按坐标 0,1 提取回来。
+
+与 python-docx 的 add_picture 逐张读取、解析图片并在内存中不断增大 XML 树不同：
+- 图片在进程池中读取、缩小（长边超过 MAX_IMAGE_PIXELS 时）并重新编码，主进程只负责写出
+- 内容相同的图片在 docx 中只保存一份，多个表格引用同一个部件
+- 图片直接写入 zip（JPEG/PNG 不再压缩），word/document.xml 按表格顺序流式写入临时文件，最后复制进 zip
+生成时间与照片数量成正比，内存只与同时处理中的图片数量有关。
+
+样式、主题、页面设置取自模板（默认为 python-docx 自带的空白模板），可以用 --template 指定自己的文档。
+
+示例：
+    python docx_builder.py D:\\照片 照片集.docx --workers 4
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+
+import docx
+from docx.shared import Inches
+from PIL import Image, ImageOps
+
+import docx_stream
+from atomic_files import AtomicFileWriter
+from output_writers import STORED_EXTENSIONS
+from table_splitter import TableSplitter, relationships_xml
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(docx.__file__), "templates", "default.docx")
+
+# 长边超过该像素数的照片缩小后重新编码；0 表示保留原图
+MAX_IMAGE_PIXELS = 1600
+JPEG_QUALITY = 85
+
+# 每行照片数和每张照片的显示宽度（默认模板正文宽 6 英寸）
+IMAGE_COLUMNS = 2
+IMAGE_WIDTH = Inches(2.8)
+COLUMN_WIDTH_TWIPS = 4320
+
+# 表格第一行左侧的标签
+LABEL_TEXT = "隐患点编号"
+
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "tif", "tiff", "webp"}
+IMAGE_CONTENT_TYPES = {"jpeg": "image/jpeg", "jpg": "image/jpeg", "png": "image/png"}
+# 原样保留的图片沿用源文件的扩展名（须与实际格式相符），否则用默认扩展名
+KEPT_EXTENSIONS = {"JPEG": ("jpg", "jpeg"), "PNG": ("png",)}
+
+IMAGE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+PIC_NS = "http://schemas.openxmlformats.org/drawingml/2006/picture"
+
+_EXIF_ORIENTATION = 0x0112
+
+
+# --- 1. 输入 ---
+
+def natural_key(name):
+    """按自然顺序排序：GJ-001_2 在 GJ-001_10 之前"""
+    return [int(part) if part.isdigit() else part.casefold() for part in re.split(r"(\d+)", name)]
+
+
+def collect_folders(input_dir):
+    """输入目录下每个子文件夹为一个表格，返回 [(Fname, [图片路径])]，均按自然顺序，忽略没有图片的文件夹"""
+    folders = []
+    for name in sorted(os.listdir(input_dir), key=natural_key):
+        folder = os.path.join(input_dir, name)
+        if not os.path.isdir(folder):
+            continue
+        images = [
+            os.path.join(folder, file_name)
+            for file_name in sorted(os.listdir(folder), key=natural_key)
+            if file_name.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS and not file_name.startswith(".")
+        ]
+        if images:
+            folders.append((name, images))
+    return folders
+
+
+# --- 2. 图片处理（工作进程） ---
+
+def prepare_image(path, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    读取一张照片，返回 (内容指纹, 图片字节, 扩展名, 宽, 高)，失败时返回 (None, 错误说明, ...)
+    已经足够小、没有旋转标记的 JPEG/PNG 原样保留（扩展名与源文件相同，如 .jpg 仍为 jpg）；
+    其余按 EXIF 方向摆正、缩小后重新编码为 JPEG（有透明通道时为 PNG）
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            fmt = image.format
+            orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+            fits = not max_pixels or max(width, height) <= max_pixels
+            if fits and fmt in ("JPEG", "PNG") and orientation == 1:
+                ext = os.path.splitext(path)[1][1:].lower()
+                if ext not in KEPT_EXTENSIONS[fmt]:
+                    ext = KEPT_EXTENSIONS[fmt][-1]
+                return digest, data, ext, width, height
+
+            image = ImageOps.exif_transpose(image)
+            if not fits:
+                image.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+            buffer = io.BytesIO()
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                image.save(buffer, "PNG", optimize=True)
+                ext = "png"
+            else:
+                image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+                ext = "jpeg"
+            return digest, buffer.getvalue(), ext, image.size[0], image.size[1]
+    except Exception as e:
+        return None, f"{path}: {e}", None, 0, 0
+
+
+def iter_prepared(paths, workers, max_pixels):
+    """
+    按输入顺序产出 prepare_image 的结果
+    多进程时最多有 workers * 4 张图片同时在处理或等待写出，内存不随照片总数增长
+    """
+    if workers <= 1:
+        for path in paths:
+            yield prepare_image(path, max_pixels)
+        return
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append(executor.submit(prepare_image, path, max_pixels))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- 3. XML 片段 ---
+
+def text_cell_xml(text):
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{COLUMN_WIDTH_TWIPS}" w:type="dxa"/></w:tcPr>'
+        f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p></w:tc>'
+    )
+
+
+def picture_cell_xml(picture):
+    """picture 为 (rId, 图片名称, 宽 EMU, 高 EMU, 绘图编号)，None 表示空单元格"""
+    if picture is None:
+        return f'<w:tc><w:tcPr><w:tcW w:w="{COLUMN_WIDTH_TWIPS}" w:type="dxa"/></w:tcPr><w:p/></w:tc>'
+    rel_id, name, cx, cy, drawing_id = picture
+    return (
+        f'<w:tc><w:tcPr><w:tcW w:w="{COLUMN_WIDTH_TWIPS}" w:type="dxa"/></w:tcPr>'
+        f'<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+        f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{drawing_id}" name={quoteattr(name)}/>'
+        f'<a:graphic xmlns:a="{A_NS}"><a:graphicData uri="{PIC_NS}">'
+        f'<pic:pic xmlns:pic="{PIC_NS}"><pic:nvPicPr><pic:cNvPr id="{drawing_id}" name={quoteattr(name)}/>'
+        f'<pic:cNvPicPr/></pic:nvPicPr><pic:blipFill><a:blip r:embed="{rel_id}"/>'
+        f'<a:stretch><a:fillRect/></a:stretch></pic:blipFill><pic:spPr><a:xfrm><a:off x="0" y="0"/>'
+        f'<a:ext cx="{cx}" cy="{cy}"/></a:xfrm><a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr>'
+        f'</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p></w:tc>'
+    )
+
+
+def table_xml(fname, pictures, columns=IMAGE_COLUMNS):
+    """一个 Fname 的表格：第一行为标签和 Fname，之后每行 columns 张照片；表格后加一个空段落，避免相邻表格合并"""
+    grid = "".join(f'<w:gridCol w:w="{COLUMN_WIDTH_TWIPS}"/>' for _ in range(columns))
+    parts = [
+        '<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="0" w:type="auto"/></w:tblPr>',
+        f"<w:tblGrid>{grid}</w:tblGrid>",
+        "<w:tr>", text_cell_xml(LABEL_TEXT), text_cell_xml(fname),
+    ]
+    parts.extend(text_cell_xml("") for _ in range(columns - 2))
+    parts.append("</w:tr>")
+    for start in range(0, len(pictures), columns):
+        row = pictures[start:start + columns]
+        row += [None] * (columns - len(row))
+        parts.append("<w:tr>" + "".join(picture_cell_xml(p) for p in row) + "</w:tr>")
+    parts.append("</w:tbl><w:p/>")
+    return "".join(parts).encode("utf-8")
+
+
+# --- 4. 生成文档 ---
+
+def build_document(input_dir, output_path, template=None, workers=1, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    生成照片集文档，返回 (表格数, 照片数, docx 中保存的不同图片数, 失败的图片 [说明])
+    文档先写临时文件，完整写完后才出现最终文件名
+    """
+    folders = collect_folders(input_dir)
+    with zipfile.ZipFile(template or DEFAULT_TEMPLATE) as template_zip:
+        skeleton = TableSplitter(template_zip)
+
+    paths = [path for _, images in folders for path in images]
+    results = iter_prepared(paths, workers, max_pixels)
+    media = {}  # 内容指纹 -> (rId, 部件名)
+    rels = list(skeleton.skeleton_rels)
+    used_ext = set()
+    failures = []
+    picture_count = 0
+
+    with AtomicFileWriter() as files, files.open(output_path, "w+b") as f:
+        # 在模板骨架（已压缩好的样式、主题等部件）之后追加图片和正文
+        f.write(skeleton.skeleton_zip)
+        with zipfile.ZipFile(f, "a", zipfile.ZIP_DEFLATED) as out, tempfile.TemporaryFile() as body:
+            body.write(skeleton.frame_head)
+            for fname, images in folders:
+                pictures = []
+                for _ in images:
+                    digest, data, ext, width, height = next(results)
+                    if digest is None:
+                        failures.append(data)
+                        print(f"[跳过] {data}")
+                        continue
+                    entry = media.get(digest)
+                    if entry is None:
+                        part_name = f"word/media/image{len(media) + 1}.{ext}"
+                        entry = (f"rIdImg{len(media) + 1}", part_name)
+                        media[digest] = entry
+                        info = zipfile.ZipInfo(part_name, date_time=time.localtime()[:6])
+                        info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                        out.writestr(info, data)
+                        rels.append((entry[0], IMAGE_REL_TYPE, part_name[len("word/"):], None))
+                        used_ext.add(ext)
+                    picture_count += 1
+                    cx = int(IMAGE_WIDTH)
+                    cy = int(IMAGE_WIDTH * height / width) if width else cx
+                    pictures.append((entry[0], f"{fname}_{len(pictures) + 1}", cx, cy, picture_count))
+                body.write(table_xml(fname, pictures))
+            body.write(skeleton.frame_tail)
+
+            size = body.seek(0, os.SEEK_END)
+            body.seek(0)
+            with out.open(skeleton.part_name, "w", force_zip64=size > zipfile.ZIP64_LIMIT) as dst:
+                shutil.copyfileobj(body, dst, docx_stream.COPY_CHUNK_SIZE)
+            out.writestr(docx_stream.rels_part_for(skeleton.part_name), relationships_xml(rels))
+            members = skeleton.skeleton_members + [name for _, name in media.values()] + [skeleton.part_name]
+            out.writestr(
+                "[Content_Types].xml",
+                skeleton.content_types_xml(members, [(ext, IMAGE_CONTENT_TYPES[ext]) for ext in sorted(used_ext)]),
+            )
+    return len(folders), picture_count, len(media), failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 Fname 文件夹中的照片生成一个照片集 .docx（每个文件夹一个表格）")
+    parser.add_argument("input", help="输入目录，每个子文件夹为一个 Fname")
+    parser.add_argument("output", help="生成的 Word 文档 (.docx)")
+    parser.add_argument("--template", help="提供样式和页面设置的模板文档，默认为空白模板")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                        help="处理图片的进程数，默认 CPU 核数 - 1")
+    parser.add_argument("--max-pixels", type=int, default=MAX_IMAGE_PIXELS,
+                        help=f"长边超过该像素数的照片缩小后写入，0 表示保留原图，默认 {MAX_IMAGE_PIXELS}")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        parser.error(f"输入目录不存在: {args.input}")
+    folder = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(folder, exist_ok=True)
+
+    tables, pictures, unique, failures = build_document(
+        args.input, args.output, args.template, args.workers, args.max_pixels
+    )
+    print(f"已生成 {args.output}：{tables} 个表格，{pictures} 张照片（不同图片 {unique} 张）")
+    if failures:
+        print(f"有 {len(failures)} 张图片无法读取，已跳过")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 后多进程需要
+    sys.exit(main())
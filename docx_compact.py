@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+文档瘦身：合并重复图片、按显示尺寸缩小过大的照片
+功能：源文档中同一张照片常被嵌入多次、并且是相机原始分辨率，文档动辄几百 MB，
+之后每次提取都要读这些数据。本工具在 zip 层重写 .docx：
+- 内容相同的图片部件只保留一份（先按中央目录的 (CRC, 大小) 分组，再用 SHA-1 确认），
+  指向重复部件的关系改为指向保留的部件，重复部件从 zip 中删除
+- 可选（--dpi）：照片像素超过它在文档中显示尺寸（wp:extent）按指定 DPI 所需的像素时，
+  在进程池中缩小后按原格式重新编码；可选（--quality）：JPEG 按指定质量重新编码。
+  结果没有变小时保留原图
+- 其余部件的内容原样保留，成员顺序不变；只有被修改的关系文件和 [Content_Types].xml 会重新生成
+
+输出默认为同目录下的 <原文件名>_compact.docx，先写临时文件，完整写完后才出现最终文件名。
+
+示例：
+    python docx_compact.py 照片集.docx
+    python docx_compact.py 照片集.docx 照片集_小.docx --dpi 150 --quality 85 --workers 4
+"""
+
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import posixpath
+import shutil
+import sys
+import zipfile
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+from PIL import Image
+
+import docx_stream
+from atomic_files import AtomicFileWriter
+from docx_stream import A_BLIP, PKG_REL_NS, R_NS, W_BODY, WP_ANCHOR, WP_EXTENT, WP_INLINE
+from table_splitter import CONTENT_TYPES_PART, CT_NS
+
+OUTPUT_SUFFIX = "_compact"
+
+# 显示尺寸按该 DPI 换算为所需像素；缩小时至少保留该像素数（长边）
+EMU_PER_INCH = 914400
+MIN_IMAGE_PIXELS = 64
+
+IMAGE_REL_SUFFIX = "/image"
+A_SRC_RECT = f"{{{docx_stream.A_NS}}}srcRect"
+
+# 只处理这两种格式，并按原格式重新编码（扩展名和内容类型都不变）
+RECODE_FORMATS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG"}
+
+_EXIF_ORIENTATION = 0x0112
+
+# 元素及其子孙的所有关系命名空间属性（r:embed、r:id、r:link 等）
+_REL_ATTRS = etree.XPath("descendant-or-self::*/@*[namespace-uri()=$ns]")
+
+
+# --- 1. 查找重复图片 ---
+
+def source_part_for(rels_name):
+    """关系文件对应的部件名：word/_rels/document.xml.rels -> word/document.xml，_rels/.rels -> ''"""
+    folder, name = posixpath.split(rels_name)
+    return posixpath.join(posixpath.dirname(folder), name[:-len(".rels")])
+
+
+def iter_image_relationships(zf):
+    """产出 (关系文件, 源部件, rId, 图片部件名)，只包括 zip 中存在的内部图片关系"""
+    for info in zf.infolist():
+        if not info.filename.endswith(".rels"):
+            continue
+        source = source_part_for(info.filename)
+        root = etree.fromstring(zf.read(info.filename))
+        for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+            if rel.get("TargetMode") == "External" or not rel.get("Type", "").endswith(IMAGE_REL_SUFFIX):
+                continue
+            target = docx_stream.resolve_part_name(source, rel.get("Target"))
+            if target in zf.NameToInfo:
+                yield info.filename, source, rel.get("Id"), target
+
+
+def member_digest(zf, member_name):
+    digest = hashlib.sha1()
+    with zf.open(member_name) as src:
+        for chunk in iter(lambda: src.read(docx_stream.COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def find_duplicates(zf, image_parts):
+    """
+    返回 {重复部件名: 保留的部件名}
+    (CRC, 大小) 相同的部件才计算 SHA-1，保留 zip 中排在最前的一个
+    """
+    groups = defaultdict(list)
+    for info in zf.infolist():
+        if info.filename in image_parts:
+            groups[(info.CRC, info.file_size)].append(info.filename)
+    replacements = {}
+    for names in groups.values():
+        if len(names) < 2:
+            continue
+        kept = {}
+        for name in names:
+            digest = member_digest(zf, name)
+            if digest in kept:
+                replacements[name] = kept[digest]
+            else:
+                kept[digest] = name
+    return replacements
+
+
+# --- 2. 显示尺寸 ---
+
+def displayed_sizes(zf, image_rels, dpi):
+    """
+    按引用汇总每个图片部件在文档中需要的像素 {部件名: (宽, 高)}（多处引用取最大值）
+    只要有一处引用无法确定显示尺寸（VML、没有 wp:extent、裁剪过的图片等），该部件就不缩小，值为 None
+    部件按顶层元素（正文的段落和表格、页眉页脚的段落等）增量解析，处理完即释放
+    """
+    by_source = defaultdict(dict)  # 源部件 -> {rId: 部件名}
+    for _, source, rel_id, target in image_rels:
+        by_source[source][rel_id] = target
+
+    needed = {}
+    unknown = set()
+
+    def scan(element, targets):
+        handled = set()
+        for container in element.iter(WP_INLINE, WP_ANCHOR):
+            extent = container.find(WP_EXTENT)
+            for blip in container.iter(A_BLIP):
+                handled.add(blip)
+                target = targets.get(blip.get(docx_stream.R_EMBED))
+                if target is None:
+                    continue
+                try:
+                    cx, cy = int(extent.get("cx")), int(extent.get("cy"))
+                except (AttributeError, TypeError, ValueError):
+                    unknown.add(target)
+                    continue
+                if blip.getparent().find(A_SRC_RECT) is not None:
+                    unknown.add(target)  # 裁剪过的图片只显示一部分，所需像素无法按显示尺寸计算
+                    continue
+                old = needed.get(target, (0, 0))
+                needed[target] = (max(old[0], cx * dpi // EMU_PER_INCH), max(old[1], cy * dpi // EMU_PER_INCH))
+        for value in _REL_ATTRS(element, ns=R_NS):
+            owner = value.getparent()
+            if owner not in handled and value in targets:
+                unknown.add(targets[value])
+
+    for source, targets in by_source.items():
+        if source not in zf.NameToInfo:
+            unknown.update(targets.values())
+            continue
+        with zf.open(source) as f:
+            for _, element in etree.iterparse(f, events=("end",), huge_tree=True):
+                parent = element.getparent()
+                if parent is None or not (parent.tag == W_BODY or parent.getparent() is None):
+                    continue
+                scan(element, targets)
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+
+    for name in unknown:
+        needed[name] = None
+    return needed
+
+
+def fold_duplicate_sizes(sizes, replacements):
+    """
+    重复部件合并后，它的引用都改为指向保留的部件：把重复部件所需的像素并入保留的部件
+    两者取最大值；任一方无法确定显示尺寸（None）时合并结果也为 None，保留的部件不缩小
+    """
+    for name, kept in replacements.items():
+        if name not in sizes:
+            continue
+        if kept not in sizes:
+            sizes[kept] = sizes[name]
+            continue
+        a, b = sizes[kept], sizes[name]
+        sizes[kept] = None if a is None or b is None else (max(a[0], b[0]), max(a[1], b[1]))
+    return sizes
+
+
+# --- 3. 重新编码（工作进程） ---
+
+def recode_image(data, ext, needed, quality):
+    """
+    按所需像素 needed=(宽, 高) 缩小（None 表示不缩小），按原格式重新编码
+    返回新的图片字节；没有变小或无法处理时返回 None
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            fmt = RECODE_FORMATS[ext]
+            if image.format != fmt:
+                return None
+            exif = image.info.get("exif")
+            width, height = image.size
+            resized = False
+            if needed is not None:
+                need_w, need_h = needed
+                if image.getexif().get(_EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                    need_w, need_h = need_h, need_w  # 显示时旋转 90 度
+                scale = max(need_w / width, need_h / height, MIN_IMAGE_PIXELS / max(width, height))
+                if scale < 1:
+                    image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+                    resized = True
+            if not resized and not (quality and fmt == "JPEG"):
+                return None
+
+            buffer = io.BytesIO()
+            if fmt == "JPEG":
+                options = {"quality": quality or 85, "optimize": True}
+                if exif:
+                    options["exif"] = exif
+                if image.mode not in ("RGB", "L", "CMYK"):
+                    image = image.convert("RGB")
+                image.save(buffer, "JPEG", **options)
+            else:
+                image.save(buffer, "PNG", optimize=True)
+            result = buffer.getvalue()
+            return result if len(result) < len(data) else None
+    except Exception:
+        return None
+
+
+def recode_images(zf, jobs, workers, quality):
+    """
+    jobs 为 [(部件名, 所需像素)]，返回 {部件名: 新的图片字节}
+    多进程时最多有 workers * 4 张图片同时在处理，内存不随图片总数增长
+    """
+    results = {}
+
+    def collect(name, data):
+        if data is not None:
+            results[name] = data
+
+    if workers <= 1:
+        for name, needed in jobs:
+            collect(name, recode_image(zf.read(name), name.rsplit(".", 1)[-1].lower(), needed, quality))
+        return results
+
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for name, needed in jobs:
+            ext = name.rsplit(".", 1)[-1].lower()
+            pending.append((name, executor.submit(recode_image, zf.read(name), ext, needed, quality)))
+            if len(pending) >= window:
+                done_name, future = pending.popleft()
+                collect(done_name, future.result())
+        while pending:
+            done_name, future = pending.popleft()
+            collect(done_name, future.result())
+    return results
+
+
+# --- 4. 改写关系文件和内容类型 ---
+
+def rewrite_relationships(zf, rels_name, replacements):
+    """把指向重复部件的关系改为指向保留的部件，返回新的关系文件字节；没有改动时返回 None"""
+    source = source_part_for(rels_name)
+    root = etree.fromstring(zf.read(rels_name))
+    changed = False
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target")
+        kept = replacements.get(docx_stream.resolve_part_name(source, target))
+        if kept is None:
+            continue
+        if target.startswith("/"):
+            rel.set("Target", "/" + kept)
+        else:
+            rel.set("Target", posixpath.relpath(kept, posixpath.dirname(source) or "."))
+        changed = True
+    if not changed:
+        return None
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+def rewrite_content_types(zf, removed):
+    """删除已删除部件的 Override 条目；没有改动时返回 None"""
+    root = etree.fromstring(zf.read(CONTENT_TYPES_PART))
+    stale = [
+        override for override in root.iter(f"{{{CT_NS}}}Override")
+        if override.get("PartName", "").lstrip("/") in removed
+    ]
+    if not stale:
+        return None
+    for override in stale:
+        root.remove(override)
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+
+
+# --- 5. 写出 ---
+
+def compact_document(doc_path, output_path, dpi=0, quality=0, workers=1):
+    """
+    瘦身一个文档，返回统计 {"before", "after", "duplicates", "recoded"}
+    没有任何可以节省的内容时也会写出（内容与源文档相同）
+    """
+    before = os.path.getsize(doc_path)
+    # 最终文件名在源文档关闭之后才出现，因此输出可以就是源文档本身（--in-place）
+    with AtomicFileWriter() as files:
+        with zipfile.ZipFile(doc_path) as zf:
+            image_rels = list(iter_image_relationships(zf))
+            image_parts = {target for _, _, _, target in image_rels}
+            replacements = find_duplicates(zf, image_parts)
+
+            new_data = {}
+            for rels_name in sorted({rels_name for rels_name, _, _, _ in image_rels}):
+                data = rewrite_relationships(zf, rels_name, replacements)
+                if data is not None:
+                    new_data[rels_name] = data
+            content_types = rewrite_content_types(zf, replacements)
+            if content_types is not None:
+                new_data[CONTENT_TYPES_PART] = content_types
+
+            recoded = {}
+            if dpi or quality:
+                sizes = fold_duplicate_sizes(displayed_sizes(zf, image_rels, dpi), replacements) if dpi else {}
+                jobs = []
+                for name in sorted(image_parts - replacements.keys()):
+                    if name.rsplit(".", 1)[-1].lower() not in RECODE_FORMATS:
+                        continue
+                    needed = sizes.get(name)
+                    if needed is None and not quality:
+                        continue
+                    jobs.append((name, needed))
+                recoded = recode_images(zf, jobs, workers, quality)
+            new_data.update(recoded)
+
+            with files.open(output_path, "wb") as f, zipfile.ZipFile(f, "w") as out:
+                for info in zf.infolist():
+                    if info.filename in replacements:
+                        continue
+                    out_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    out_info.compress_type = info.compress_type
+                    out_info.external_attr = info.external_attr
+                    data = new_data.get(info.filename)
+                    if data is not None:
+                        out.writestr(out_info, data)
+                        continue
+                    force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+                    with zf.open(info) as src, out.open(out_info, "w", force_zip64=force_zip64) as dst:
+                        shutil.copyfileobj(src, dst, docx_stream.COPY_CHUNK_SIZE)
+
+    return {
+        "before": before,
+        "after": os.path.getsize(output_path),
+        "duplicates": len(replacements),
+        "recoded": len(recoded),
+    }
+
+
+def default_output_path(doc_path):
+    stem, ext = os.path.splitext(doc_path)
+    return f"{stem}{OUTPUT_SUFFIX}{ext or '.docx'}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="合并文档中重复的图片，并可按显示尺寸缩小过大的照片")
+    parser.add_argument("input", help="Word 文档 (.docx)")
+    parser.add_argument("output", nargs="?", help=f"输出文档，默认为 <原文件名>{OUTPUT_SUFFIX}.docx")
+    parser.add_argument("--in-place", action="store_true", help="直接替换源文档（写完后才替换）")
+    parser.add_argument("--dpi", type=int, default=0,
+                        help="照片像素超过显示尺寸按该 DPI 所需的像素时缩小（如 150），默认 0 不缩小")
+    parser.add_argument("--quality", type=int, default=0, help="JPEG 按该质量（1-95）重新编码，默认 0 不重新编码")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                        help="处理图片的进程数，默认 CPU 核数 - 1")
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.input):
+        parser.error(f"文档不存在: {args.input}")
+    if args.in_place and args.output:
+        parser.error("--in-place 不能与输出文档同时使用")
+    if args.dpi < 0 or not 0 <= args.quality <= 95:
+        parser.error("--dpi 不能为负数，--quality 应在 1-95 之间")
+    output_path = args.input if args.in_place else (args.output or default_output_path(args.input))
+
+    stats = compact_document(args.input, output_path, args.dpi, args.quality, args.workers)
+    saved = stats["before"] - stats["after"]
+    print(f"已写出 {output_path}：合并重复图片 {stats['duplicates']} 张，重新编码 {stats['recoded']} 张，"
+          f"{stats['before'] / 1048576:.1f} MB -> {stats['after'] / 1048576:.1f} MB（节省 {saved / 1048576:.1f} MB）")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 后多进程需要
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+文档比较模式：只提取两个版本之间新增或变化的图片
+功能：同一批照片集的修订版反复发来时，不必每次重新提取全部图片。
+比较旧版和新版 .docx：表格按 Fname 对应（Fname 对不上时按位置对应），
+每张图片按 zip 中央目录记录的 (CRC, 大小) 比较，相同的图片不读取也不解码；
+只把新增或变化的图片按与完整提取相同的名称（Fname/Fname_N.ext）写入输出目录，
+删除的图片和表格只在报告中列出，不删除输出目录中已有的文件。
+
+示例：
+    python docx_diff.py 旧版.docx 新版.docx 输出目录 --cell 0,1
+    python docx_diff.py 旧版.docx 新版.docx 输出目录 --cell 0,1 --report-only
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import docx_stream
+from atomic_files import write_text_atomic
+from output_writers import FolderImageWriter, prepare_folders
+from path_planner import dedupe_names, sanitize_filename
+
+REPORT_FILE_NAME = "diff_report.txt"
+
+# 表格的比较结果
+TABLE_ADDED = "新增表格"
+TABLE_REMOVED = "删除的表格"
+TABLE_RENAMED = "按位置对应（Fname 已改变）"
+TABLE_UNNAMED_BEFORE = "按位置对应（旧版目标单元格不存在）"
+
+
+# --- 1. 读取文档结构 ---
+
+def read_document_tables(doc_path, target_cell):
+    """
+    流式解析文档，返回 (每个表格的 Fname, 每个表格的图片 [(部件名, CRC, 大小)])
+    Fname 按全部表格去重（重名依次加 (2)、(3)…），目标单元格不存在的表格为 None；
+    图片与完整提取一致：每个 run 只取第一张，找不到部件的引用不计入序号。只读取中央目录，不读取图片。
+    """
+    row_idx, col_idx = target_cell
+    names = []
+    images = []
+    with docx_stream.open_docx(doc_path) as zf:
+        rels = docx_stream.read_part_rels(zf)
+        for table in docx_stream.iter_tables(zf):
+            try:
+                names.append(sanitize_filename(table.cell_text(row_idx, col_idx)))
+            except IndexError:
+                names.append(None)
+            items = []
+            for _, _, rId, k, _ in table.blips:
+                if k > 0:
+                    continue
+                member_name = rels.get(rId)
+                info = zf.NameToInfo.get(member_name) if member_name else None
+                if info is not None:
+                    items.append((member_name, info.CRC, info.file_size))
+            images.append(items)
+    return dedupe_names(names), images
+
+
+# --- 2. 比较 ---
+
+def match_tables(old_names, new_names):
+    """
+    新版每个表格对应的旧版表格序号（没有对应时为 None），以及没有被对应的旧版表格序号
+    先按 Fname（不区分大小写）对应；剩下的表格如果旧版同一位置的表格也没有被对应，则按位置对应
+    """
+    old_by_name = {name.casefold(): i for i, name in enumerate(old_names) if name is not None}
+    matches = [None] * len(new_names)
+    used = set()
+    for j, name in enumerate(new_names):
+        if name is None:
+            continue
+        i = old_by_name.get(name.casefold())
+        if i is not None:
+            matches[j] = i
+            used.add(i)
+    for j in range(len(new_names)):
+        if matches[j] is None and j < len(old_names) and j not in used:
+            matches[j] = j
+            used.add(j)
+    unmatched_old = [i for i in range(len(old_names)) if i not in used]
+    return matches, unmatched_old
+
+
+def diff_images(old_images, new_images):
+    """
+    比较一个表格前后两版的图片，只看 (CRC, 大小)
+    返回 (新增 [序号], 变化 [序号], 删除 [旧版序号])，序号从 0 开始。
+    图片的文件名由它在表格中的序号决定（Fname_N），所以按位置比较：
+    同一位置内容相同为未变化；内容不同（包括前面插入图片后整体后移）为变化；
+    新版多出的位置为新增，旧版多出的位置为删除
+    """
+    added = []
+    changed = []
+    for n, (member_name, crc, size) in enumerate(new_images):
+        if n >= len(old_images):
+            added.append(n)
+            continue
+        old_name, old_crc, old_size = old_images[n]
+        if (crc, size) != (old_crc, old_size) or old_name.rsplit(".", 1)[-1] != member_name.rsplit(".", 1)[-1]:
+            changed.append(n)
+    removed = list(range(len(new_images), len(old_images)))
+    return added, changed, removed
+
+
+def image_file_name(fname, n, member_name):
+    return f"{fname}_{n + 1}.{member_name.rsplit('.', 1)[-1]}"
+
+
+def compare_documents(old_path, new_path, target_cell):
+    """
+    比较两个版本，返回 (需要提取的 [(新版表格序号, Fname, 图片序号, 部件名)], 报告行, 汇总)
+    """
+    old_names, old_images = read_document_tables(old_path, target_cell)
+    new_names, new_images = read_document_tables(new_path, target_cell)
+    matches, unmatched_old = match_tables(old_names, new_names)
+
+    to_extract = []
+    lines = []
+    totals = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    for j, fname in enumerate(new_names):
+        images = new_images[j]
+        if fname is None:
+            if images:
+                lines.append(f"新版表格 {j + 1}: 目标单元格不存在，跳过（{len(images)} 张图片）")
+            continue
+        i = matches[j]
+        if i is None or old_names[i] is None or old_names[i].casefold() != fname.casefold():
+            # 新表格，或 Fname 改变（图片将写入新的文件夹），全部图片都需要提取
+            if i is None:
+                status = TABLE_ADDED
+            elif old_names[i] is None:
+                status = TABLE_UNNAMED_BEFORE
+            else:
+                status = f"{TABLE_RENAMED}，旧版为 '{old_names[i]}'"
+            to_extract.extend((j, fname, n, member_name) for n, (member_name, _, _) in enumerate(images))
+            totals["added"] += len(images)
+            lines.append(f"{fname}（新版表格 {j + 1}）: {status}，提取全部 {len(images)} 张图片")
+            if i is not None:
+                totals["removed"] += len(old_images[i])
+            continue
+
+        added, changed, removed = diff_images(old_images[i], images)
+        totals["added"] += len(added)
+        totals["changed"] += len(changed)
+        totals["removed"] += len(removed)
+        totals["unchanged"] += len(images) - len(added) - len(changed)
+        if not (added or changed or removed):
+            continue
+        for n in sorted(added + changed):
+            to_extract.append((j, fname, n, images[n][0]))
+        parts = []
+        if added:
+            parts.append("新增 " + ", ".join(image_file_name(fname, n, images[n][0]) for n in added))
+        if changed:
+            parts.append("变化 " + ", ".join(image_file_name(fname, n, images[n][0]) for n in changed))
+        if removed:
+            parts.append("删除 " + ", ".join(
+                image_file_name(old_names[i], n, old_images[i][n][0]) for n in removed
+            ))
+        lines.append(f"{fname}（新版表格 {j + 1}）: " + "；".join(parts))
+
+    for i in unmatched_old:
+        if old_names[i] is None:
+            continue
+        totals["removed"] += len(old_images[i])
+        lines.append(f"{old_names[i]}（旧版表格 {i + 1}）: {TABLE_REMOVED}，{len(old_images[i])} 张图片")
+
+    summary = (
+        f"旧版 {len(old_names)} 个表格，新版 {len(new_names)} 个表格；"
+        f"新增图片 {totals['added']} 张，变化 {totals['changed']} 张，删除 {totals['removed']} 张，"
+        f"未变化 {totals['unchanged']} 张"
+    )
+    return to_extract, lines, summary
+
+
+# --- 3. 提取 ---
+
+def extract_changed(new_path, output_dir, to_extract):
+    """只从新版中读取并写出需要提取的图片，返回写出的图片数"""
+    os.makedirs(output_dir, exist_ok=True)
+    writer = FolderImageWriter(output_dir)
+    count = 0
+    try:
+        folders, failed = prepare_folders(writer, [fname for _, fname, _, _ in to_extract])
+        with docx_stream.open_docx(new_path) as zf:
+            for j, fname, n, member_name in to_extract:
+                folder = folders.get(fname)
+                if folder is None:
+                    print(f"表格 {j + 1}: 创建文件夹失败 ({fname}): {failed.get(fname)}")
+                    continue
+                try:
+                    docx_stream.stream_member_to(
+                        writer, folder, image_file_name(fname, n, member_name), zf, member_name
+                    )
+                    count += 1
+                except Exception as e:
+                    print(f"表格 {j + 1}, Fname '{fname}': 提取或保存图片时出错: {e}")
+    finally:
+        writer.close()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较同一文档的两个版本，只提取新增或变化的图片")
+    parser.add_argument("old", help="旧版 Word 文档 (.docx)")
+    parser.add_argument("new", help="新版 Word 文档 (.docx)")
+    parser.add_argument("output", help="输出目录（通常就是旧版完整提取时的输出目录）")
+    parser.add_argument("--cell", default="0,0", help="Fname 单元格坐标 (row_index,col_index)，默认 0,0")
+    parser.add_argument("--report-only", action="store_true", help="只输出比较报告，不提取图片")
+    args = parser.parse_args(argv)
+
+    try:
+        target_cell = tuple(int(x) for x in args.cell.replace("，", ",").split(","))
+        if len(target_cell) != 2 or min(target_cell) < 0:
+            raise ValueError
+    except ValueError:
+        parser.error("--cell 格式错误，应为 行,列 例如 0,1")
+
+    to_extract, lines, summary = compare_documents(args.old, args.new, target_cell)
+    for line in lines:
+        print(line)
+    print(summary)
+
+    if not args.report_only and to_extract:
+        count = extract_changed(args.new, args.output, to_extract)
+        print(f"已提取 {count} 张新增或变化的图片到 {args.output}")
+
+    if not args.report_only:
+        report = [
+            f"--- 文档比较报告 ---\n",
+            f"比较时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            f"旧版: {args.old}\n新版: {args.new}\n\n",
+            "\n".join(lines) + ("\n" if lines else "两个版本的图片没有差别。\n"),
+            f"\n{summary}\n",
+        ]
+        os.makedirs(args.output, exist_ok=True)
+        report_path = os.path.join(args.output, REPORT_FILE_NAME)
+        write_text_atomic(report_path, "".join(report))
+        print(f"比较报告已保存到: {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
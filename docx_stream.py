@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+流式读取 .docx（不经过 python-docx 的 Document 对象）
+功能：直接从 zip 中增量解析 word/document.xml，逐个产出正文中的段落和表格，
+处理完的 XML 元素立即释放；图片数据按块从 zip 复制，不整体读入内存。
+
+python-docx 打开文档时会把所有部件（包括全部图片）读入内存，
+大型照片文档在 32 位 Office 机器上因此容易 MemoryError。
+本模块的峰值内存约为“单个表格的 XML + 一个复制缓冲区”，与图片数量和大小无关。
+"""
+
+import posixpath
+import zipfile
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+WP_NS = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+
+DOCUMENT_PART = "word/document.xml"
+
+W_BODY = f"{{{W_NS}}}body"
+W_TBL = f"{{{W_NS}}}tbl"
+W_TR = f"{{{W_NS}}}tr"
+W_TC = f"{{{W_NS}}}tc"
+W_P = f"{{{W_NS}}}p"
+W_R = f"{{{W_NS}}}r"
+W_HYPERLINK = f"{{{W_NS}}}hyperlink"
+W_TCPR = f"{{{W_NS}}}tcPr"
+W_TRPR = f"{{{W_NS}}}trPr"
+W_GRIDBEFORE = f"{{{W_NS}}}gridBefore"
+W_GRIDSPAN = f"{{{W_NS}}}gridSpan"
+W_VMERGE = f"{{{W_NS}}}vMerge"
+W_VAL = f"{{{W_NS}}}val"
+W_TYPE = f"{{{W_NS}}}type"
+A_BLIP = f"{{{A_NS}}}blip"
+R_EMBED = f"{{{R_NS}}}embed"
+WP_INLINE = f"{{{WP_NS}}}inline"
+WP_ANCHOR = f"{{{WP_NS}}}anchor"
+WP_EXTENT = f"{{{WP_NS}}}extent"
+
+# wp:extent 的单位 EMU，96 DPI 下每像素 9525 EMU
+EMU_PER_PIXEL = 9525
+
+# 与 python-docx 的 Run.text 一致：这些子元素转换为对应的文本
+_RUN_TEXT_TAGS = {
+    f"{{{W_NS}}}t": None,
+    f"{{{W_NS}}}tab": "\t",
+    f"{{{W_NS}}}ptab": "\t",
+    f"{{{W_NS}}}cr": "\n",
+    f"{{{W_NS}}}noBreakHyphen": "-",
+}
+_W_BR = f"{{{W_NS}}}br"
+
+# 从 zip 复制图片时的缓冲区大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class TableRecord:
+    """
+    正文中的一个表格
+    rows:  按 python-docx row.cells 的规则展开的单元格文本（横向合并重复、纵向合并取上方单元格）
+    blips: [(行, 列, rId, 在 run 中的序号, 显示尺寸)]，按文档顺序；只取每个 run 第一张图片时筛选序号为 0 的项
+           显示尺寸为 wp:extent 换算的 (宽, 高) 像素，没有 wp:extent 时为 None
+    element: 表格的 XML 元素，仅在迭代到该表格时有效，继续迭代后会被清空
+    """
+
+    __slots__ = ("index", "position", "rows", "blips", "element")
+
+    def __init__(self, index, position, rows, blips, element):
+        self.index = index
+        self.position = position
+        self.rows = rows
+        self.blips = blips
+        self.element = element
+
+    def cell_text(self, row_idx, col_idx):
+        """与 table.cell(r, c).text 对应，坐标不存在时抛出 IndexError"""
+        return self.rows[row_idx][col_idx]
+
+
+# --- 1. 包结构 ---
+
+def open_docx(doc_path):
+    """doc_path 为文档路径，或已顺序读入的 SpooledDocument（见 spooled_input）"""
+    if hasattr(doc_path, "open_zip"):
+        return doc_path.open_zip()
+    return zipfile.ZipFile(doc_path)
+
+
+def member_view(zf, member_name):
+    """在 SpooledDocument 上打开时，未压缩成员直接返回 memoryview（不复制），否则返回 None"""
+    get_view = getattr(zf, "member_view", None)
+    return get_view(member_name) if get_view is not None else None
+
+
+def resolve_part_name(source_part, target):
+    """把关系中的相对 Target 解析为 zip 内的成员名"""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+def rels_part_for(part_name):
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, "_rels", name + ".rels")
+
+
+def read_part_rels(zf, part_name=DOCUMENT_PART):
+    """读取部件的关系，返回 {rId: zip 内成员名}（忽略外部链接）"""
+    rels = {}
+    try:
+        data = zf.read(rels_part_for(part_name))
+    except KeyError:
+        return rels
+    root = etree.fromstring(data)
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        rels[rel.get("Id")] = resolve_part_name(part_name, rel.get("Target"))
+    return rels
+
+
+def copy_member(zf, member_name, dst, chunk_size=COPY_CHUNK_SIZE):
+    """按块把 zip 成员复制到可写文件对象，返回字节数"""
+    view = member_view(zf, member_name)
+    if view is not None:
+        dst.write(view)
+        return len(view)
+    copied = 0
+    with zf.open(member_name) as src:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            dst.write(chunk)
+            copied += len(chunk)
+    return copied
+
+
+# --- 2. 文本 ---
+
+def run_text(r):
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag in _RUN_TEXT_TAGS:
+            replacement = _RUN_TEXT_TAGS[tag]
+            parts.append((child.text or "") if replacement is None else replacement)
+        elif tag == _W_BR and child.get(W_TYPE, "textWrapping") == "textWrapping":
+            parts.append("\n")
+    return "".join(parts)
+
+
+def iter_paragraph_runs(p):
+    """段落中的 run（包括超链接内的 run），与 python-docx 的 Paragraph.text 取值范围一致"""
+    for child in p:
+        if child.tag == W_R:
+            yield child
+        elif child.tag == W_HYPERLINK:
+            for r in child.iterchildren(W_R):
+                yield r
+
+
+def paragraph_text(p):
+    return "".join(run_text(r) for r in iter_paragraph_runs(p))
+
+
+def blip_extent(blip):
+    """图片在文档中的显示尺寸：所在 wp:inline / wp:anchor 的 wp:extent 按 96 DPI 换算为 (宽, 高) 像素"""
+    for container in blip.iterancestors(WP_INLINE, WP_ANCHOR):
+        extent = container.find(WP_EXTENT)
+        if extent is None:
+            return None
+        try:
+            return int(extent.get("cx")) // EMU_PER_PIXEL, int(extent.get("cy")) // EMU_PER_PIXEL
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def parse_table(tbl):
+    """
+    把 w:tbl 元素解析为 (rows, blips)，不依赖 python-docx
+    单元格的展开方式与 python-docx 的 row.cells 相同：横向合并（gridSpan）的单元格按所跨的列数重复，
+    纵向合并的后续单元格（vMerge continue）取最上面的单元格；文本和图片都按展开后的列号记录，
+    因此合并单元格中的图片在流式和普通处理中的出现次数、顺序都一致
+    """
+    rows = []
+    blips = []
+    above = {}  # 网格列 -> 上一行该列的 (文本, 图片)，用于纵向合并
+    for r_idx, tr in enumerate(tbl.iterchildren(W_TR)):
+        row = []
+        grid_col = 0
+        tr_pr = tr.find(W_TRPR)
+        if tr_pr is not None:
+            grid_before = tr_pr.find(W_GRIDBEFORE)
+            if grid_before is not None:
+                grid_col = max(0, int(grid_before.get(W_VAL, "0")))
+        for tc in tr.iterchildren(W_TC):
+            span = 1
+            vmerge = None
+            tc_pr = tc.find(W_TCPR)
+            if tc_pr is not None:
+                grid_span = tc_pr.find(W_GRIDSPAN)
+                if grid_span is not None:
+                    span = max(1, int(grid_span.get(W_VAL, "1")))
+                v_merge = tc_pr.find(W_VMERGE)
+                if v_merge is not None:
+                    vmerge = v_merge.get(W_VAL, "continue")
+            if vmerge == "continue" and grid_col in above:
+                text, cell_blips = above[grid_col]
+            else:
+                paragraphs = []
+                cell_blips = []  # (rId, run 内序号, 显示尺寸)
+                for p in tc.iterchildren(W_P):
+                    paragraphs.append(paragraph_text(p))
+                    for r in p.iterchildren(W_R):
+                        k = 0
+                        for blip in r.iter(A_BLIP):
+                            if blip.get(R_EMBED):
+                                cell_blips.append((blip.get(R_EMBED), k, blip_extent(blip)))
+                                k += 1
+                text = "\n".join(paragraphs)
+            for k in range(span):
+                c_idx = len(row)
+                blips.extend((r_idx, c_idx, rId, n, extent) for rId, n, extent in cell_blips)
+                row.append(text)
+                above[grid_col + k] = (text, cell_blips)
+            grid_col += span
+        rows.append(row)
+    return rows, blips
+
+
+# --- 3. 正文迭代 ---
+
+def iter_body_elements(zf, part_name=DOCUMENT_PART):
+    """
+    增量解析正文，按顺序产出正文的直接子元素（w:p 或 w:tbl）
+    调用方处理完一个元素、继续迭代时，该元素及之前的兄弟元素即从树中删除
+    """
+    with zf.open(part_name) as f:
+        for _, elem in etree.iterparse(f, events=("end",), tag=(W_P, W_TBL), huge_tree=True):
+            parent = elem.getparent()
+            if parent is None or parent.tag != W_BODY:
+                continue  # 表格内部的段落、嵌套表格，由外层表格一起处理
+            yield elem
+            # 释放已处理的元素，以及之前已经处理过的兄弟元素
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+def iter_body_items(zf, part_name=DOCUMENT_PART):
+    """
+    按顺序产出 ("p", 位置, 段落文本) 或 ("tbl", 位置, TableRecord)
+    内存中最多只保留当前这一个正文元素
+    """
+    table_index = 0
+    for position, elem in enumerate(iter_body_elements(zf, part_name)):
+        if elem.tag == W_TBL:
+            rows, blips = parse_table(elem)
+            yield "tbl", position, TableRecord(table_index, position, rows, blips, elem)
+            table_index += 1
+        else:
+            yield "p", position, paragraph_text(elem)
+
+
+def iter_tables(zf, part_name=DOCUMENT_PART, start=0, stop=None):
+    """
+    按顺序产出序号在 [start, stop) 范围内的表格（TableRecord）
+    范围之前的表格只跳过不解析，到达 stop 后立即停止读取
+    """
+    table_index = 0
+    for position, elem in enumerate(iter_body_elements(zf, part_name)):
+        if elem.tag != W_TBL:
+            continue
+        if stop is not None and table_index >= stop:
+            break
+        if table_index >= start:
+            rows, blips = parse_table(elem)
+            yield TableRecord(table_index, position, rows, blips, elem)
+        table_index += 1
+
+
+def stream_member_to(writer, folder, image_name, zf, member_name, on_written=None):
+    """
+    把 zip 中的图片按块写给写出器；写出器支持 write_image_stream 时不把整张图片读入内存
+    on_written 为写出成功后的回调：延迟写出的写出器（deferred 为 True）在真正写出之后才调用
+    """
+    info = zf.getinfo(member_name)
+    deferred = on_written is not None and getattr(writer, "deferred", False)
+    extra = {"on_written": on_written} if deferred else {}
+    view = member_view(zf, member_name)
+    if view is not None:
+        writer.write_image(folder, image_name, view, **extra)
+    elif hasattr(writer, "write_image_stream"):
+        with zf.open(info) as src:
+            writer.write_image_stream(folder, image_name, src, info.file_size, **extra)
+    else:
+        writer.write_image(folder, image_name, zf.read(info), **extra)
+    if on_written is not None and not deferred:
+        on_written()
+    return info.file_size
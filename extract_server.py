@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Word表格图片提取本地服务
+功能：提供一个只监听本机的 HTTP 接口，上传 .docx 并指定 Fname 单元格坐标，
+在进程池中执行提取，并以流式 zip（Fname/Fname_N.ext）边提取边返回。
+
+接口：
+    POST /extract?cell=0,0   请求体为 .docx 文件内容，返回 application/zip（分块传输）
+    GET  /health             服务状态（JSON）
+    GET  /metrics            运行计数（JSON）
+
+示例：
+    python extract_server.py --port 8765 --max-jobs 2
+    curl -o 结果.zip --data-binary @古交隐患点照片集.docx "http://127.0.0.1:8765/extract?cell=0,1"
+"""
+
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import queue
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import advanced_word_processor as awp
+from output_writers import STORED_EXTENSIONS
+
+# 读取上传内容时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 工作进程与请求线程之间的队列长度，客户端读取慢时工作进程会在此阻塞
+STREAM_QUEUE_SIZE = 16
+# 等待队列时每隔这么多秒检查一次工作进程是否已经结束（例如因内存不足被系统结束）
+QUEUE_POLL_SECONDS = 2.0
+
+
+# --- 1. 工作进程 ---
+
+class QueueImageWriter:
+    """在工作进程中把每张图片作为 (zip 内路径, 数据) 放入队列，由请求线程写入响应"""
+
+    def __init__(self, out_queue):
+        self.out_queue = out_queue
+
+    def make_folder(self, fname):
+        return fname
+
+    def write_image(self, folder, image_name, data):
+        self.out_queue.put((f"{folder}/{image_name}", data))
+
+    def close(self):
+        pass
+
+
+def extract_to_queue(doc_path, target_cell, out_queue):
+    """
+    工作进程入口：提取文档中的图片并逐张放入队列，
+    最后放入错误日志和结束标记 None
+    """
+    awp.reset_statistics()
+    try:
+        awp.process_document(doc_path, "", target_cell, writer=QueueImageWriter(out_queue))
+    except Exception as e:
+        awp.log_error(f"处理文档时发生致命错误: {e}")
+    finally:
+        log_text = "\n".join(awp.ERROR_LOGS) or "未记录到任何错误或警告。"
+        out_queue.put(("error_log.txt", log_text.encode("utf-8")))
+        out_queue.put(None)
+    return awp.TOTAL_IMAGES
+
+
+def _init_worker():
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# --- 2. HTTP 服务 ---
+
+class ChunkedWriter:
+    """把 zipfile 的输出按 HTTP/1.1 分块传输编码写给客户端（不可 seek，zipfile 会使用数据描述符）"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.bytes_sent = 0
+        self.aborted = False
+
+    def write(self, data):
+        if data and not self.aborted:
+            self.wfile.write(b"%X\r\n" % len(data))
+            self.wfile.write(data)
+            self.wfile.write(b"\r\n")
+            self.bytes_sent += len(data)
+        return len(data)
+
+    def flush(self):
+        if not self.aborted:
+            self.wfile.flush()
+
+    def abort(self):
+        """放弃响应：之后的写入（包括 zipfile 关闭时的中央目录）全部丢弃，也不写结束块"""
+        self.aborted = True
+
+    def finish(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class ExtractService:
+    """服务状态：进程池、并发任务上限和运行计数"""
+
+    def __init__(self, max_jobs=2, max_upload_mb=2048):
+        self.max_jobs = max_jobs
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
+        self.executor = self._new_executor()
+        self.manager = multiprocessing.Manager()
+        self.job_slots = threading.BoundedSemaphore(max_jobs)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.metrics = {
+            "active_jobs": 0,
+            "completed_jobs": 0,
+            "failed_jobs": 0,
+            "rejected_jobs": 0,
+            "images_streamed": 0,
+            "bytes_streamed": 0,
+        }
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.max_jobs, initializer=_init_worker)
+
+    def submit(self, fn, *args):
+        """
+        提交提取任务；工作进程被意外结束后进程池会损坏（BrokenProcessPool），
+        此时换一个新的进程池，之后的请求不受影响
+        """
+        with self.lock:
+            executor = self.executor
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = self._new_executor()
+                    executor.shutdown(wait=False)
+                executor = self.executor
+            return executor.submit(fn, *args)
+
+    def count(self, key, delta=1):
+        with self.lock:
+            self.metrics[key] += delta
+
+    def snapshot(self):
+        with self.lock:
+            data = dict(self.metrics)
+        data["max_jobs"] = self.max_jobs
+        data["uptime_seconds"] = round(time.time() - self.started, 1)
+        return data
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        self.manager.shutdown()
+
+
+class ExtractRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "WordImageExtractor/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {"status": "ok", **self.service.snapshot()})
+        elif path == "/metrics":
+            self._send_json(200, self.service.snapshot())
+        else:
+            self._send_json(404, {"error": "未知路径"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/extract":
+            self._send_json(404, {"error": "未知路径"})
+            return
+        params = parse_qs(url.query)
+        target_cell = awp.parse_cell_index(params.get("cell", [self.headers.get("X-Fname-Cell", "0,0")])[0])
+        if target_cell is None:
+            self._send_json(400, {"error": "cell 参数格式错误，应为 行,列 例如 0,1"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self._send_json(411, {"error": "需要 Content-Length"})
+            return
+        if length <= 0 or length > self.service.max_upload_bytes:
+            self._send_json(413, {"error": "上传内容为空或超过大小上限"})
+            return
+
+        # 并发任务已满时立即拒绝，由客户端稍后重试
+        if not self.service.job_slots.acquire(blocking=False):
+            self.service.count("rejected_jobs")
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        doc_path = None
+        try:
+            doc_path, received = self._spool_upload(length)
+            if received < length:
+                # 连接提前断开或内容不足，不处理被截断的文档
+                self.close_connection = True
+                self._send_json(400, {"error": f"上传内容不完整：收到 {received} 字节，Content-Length 为 {length}"})
+                return
+            self._stream_extraction(doc_path, target_cell)
+        finally:
+            if doc_path:
+                try:
+                    os.remove(doc_path)
+                except OSError:
+                    pass
+            self.service.job_slots.release()
+
+    def _spool_upload(self, length):
+        """
+        上传内容分块写入临时文件，工作进程从文件读取，避免整个文档留在请求线程内存里
+        返回 (临时文件路径, 实际收到的字节数)
+        """
+        fd, doc_path = tempfile.mkstemp(suffix=".docx")
+        with os.fdopen(fd, "wb") as f:
+            remaining = length
+            while remaining > 0:
+                chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return doc_path, length - remaining
+
+    def _next_item(self, out_queue, future):
+        """
+        从队列取下一项；工作进程没有放入结束标记就结束了（被系统结束、进程池损坏等）时抛出 RuntimeError，
+        不会无限等待
+        """
+        while True:
+            try:
+                return out_queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                if not future.done():
+                    continue
+            # 工作进程放入队列的内容在它结束前都已送达，这里再确认一次队列为空
+            try:
+                return out_queue.get_nowait()
+            except queue.Empty:
+                pass
+            error = future.exception()
+            raise RuntimeError(f"工作进程意外结束: {error or '没有返回结束标记'}")
+
+    def _stream_extraction(self, doc_path, target_cell):
+        service = self.service
+        out_queue = service.manager.Queue(maxsize=STREAM_QUEUE_SIZE)
+        service.count("active_jobs")
+        try:
+            future = service.submit(extract_to_queue, doc_path, target_cell, out_queue)
+        except Exception as e:
+            service.count("active_jobs", -1)
+            service.count("failed_jobs")
+            self._send_json(500, {"error": f"无法启动提取任务: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", 'attachment; filename="images.zip"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        stream = ChunkedWriter(self.wfile)
+        # 不使用 with：工作进程失败时放弃响应，不写中央目录和结束块，直接断开连接，客户端能发现响应不完整
+        zf = zipfile.ZipFile(stream, "w")
+        client_gone = False
+        try:
+            while True:
+                item = self._next_item(out_queue, future)
+                if item is None:
+                    break
+                if client_gone:
+                    continue  # 继续取出队列内容，让工作进程正常结束
+                arcname, data = item
+                ext = arcname.rsplit(".", 1)[-1].lower()
+                compress = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                try:
+                    zf.writestr(arcname, data, compress_type=compress)
+                    stream.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    client_gone = True
+                    continue
+                if arcname != "error_log.txt":
+                    service.count("images_streamed")
+            # 关闭 zipfile 时写出中央目录
+            zf.close()
+            if not client_gone:
+                stream.finish()
+            future.result()
+            service.count("completed_jobs")
+        except (BrokenPipeError, ConnectionResetError):
+            service.count("failed_jobs")
+            self.close_connection = True
+        except Exception as e:
+            service.count("failed_jobs")
+            self.close_connection = True
+            self.log_error("提取失败: %s", e)
+        finally:
+            if zf.fp is not None:
+                stream.abort()
+                zf.close()
+            service.count("bytes_streamed", stream.bytes_sent)
+            service.count("active_jobs", -1)
+
+
+# --- 3. 主程序入口 ---
+
+def make_server(host="127.0.0.1", port=8765, max_jobs=2, max_upload_mb=2048):
+    server = ThreadingHTTPServer((host, port), ExtractRequestHandler)
+    server.daemon_threads = True
+    server.service = ExtractService(max_jobs=max_jobs, max_upload_mb=max_upload_mb)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word表格图片提取本地 HTTP 服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只监听本机")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--max-jobs", type=int, default=2, help="同时进行的提取任务上限（同时也是进程池大小）")
+    parser.add_argument("--max-upload-mb", type=int, default=2048, help="单个上传文档的大小上限（MB）")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, max(1, args.max_jobs), args.max_upload_mb)
+    print(f"服务已启动: http://{args.host}:{server.server_address[1]}  (Ctrl+C 停止)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止服务...")
+    finally:
+        server.server_close()
+        server.service.shutdown()
+    return 0
+
+
+# ---------------------------------
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 后多进程需要
+    sys.exit(main())
+# ---------------------------------
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Fname 单元格坐标建议
+功能：对 TableTextIndex 中所有表格做一次统计，为每个候选坐标 (行, 列) 计算
+    填写率：坐标存在且内容非空的表格所占比例
+    唯一率：非空内容中互不相同的比例（适合做文件夹名的是编号、名称，而不是“编号”这样的表头标签）
+    安全率：非空内容可以直接作为文件名的比例（无非法字符、无换行、长度适中）
+按 填写率 × 唯一率 × 安全率 排序，给出最可能的 Fname 坐标。
+
+统计直接在索引的字符串编号上进行：判断是否非空/可作文件名只对去重后的字符串各做一次，
+每个坐标的计数由 itemgetter、set 等批量操作完成，不逐个单元格调用 Python 代码处理文本。
+各表格第 r 行的起点等距时（同一模板生成的文档），第 c 列的编号直接对 cell_ids 跨步切片；
+否则按该行的单元格数从多到少排好起点，第 c 列存在的行恰为前 k 个，由 map 和 itemgetter 批量取出。
+"""
+
+import re
+from collections import namedtuple
+from itertools import compress
+from operator import itemgetter, sub
+
+# 参与统计的前几行、前几列（Fname 通常位于表格顶部）
+SUGGEST_MAX_ROWS = 12
+SUGGEST_MAX_COLS = 10
+
+# 可作文件名的最大长度
+MAX_NAME_LENGTH = 80
+
+_UNSAFE = re.compile(r'[\\/*?:"<>|\r\n\t]')
+
+FnameCandidate = namedtuple("FnameCandidate", "row col score filled unique safe sample")
+
+
+def _string_flags(strings):
+    """对去重后的字符串各判断一次：(是否非空, 是否可直接作文件名)，以 bytearray 保存"""
+    filled = bytearray(len(strings))
+    safe = bytearray(len(strings))
+    for i, text in enumerate(strings):
+        value = text.strip()
+        if value:
+            filled[i] = 1
+            if len(value) <= MAX_NAME_LENGTH and not _UNSAFE.search(value):
+                safe[i] = 1
+    return filled, safe
+
+
+def _gather(flags, ids):
+    """按编号批量取标志，总是返回元组"""
+    if len(ids) == 1:
+        return (flags[ids[0]],)
+    return itemgetter(*ids)(flags)
+
+
+def _stride(starts):
+    """起点等距递增时返回间距（只有一个起点时为 1），否则返回 None"""
+    if len(starts) == 1:
+        return 1
+    step = starts[1] - starts[0]
+    if step > 0 and tuple(range(starts[0], starts[-1] + 1, step)) == starts:
+        return step
+    return None
+
+
+def suggest_fname_cells(text_index, top=5, max_rows=SUGGEST_MAX_ROWS, max_cols=SUGGEST_MAX_COLS):
+    """
+    按得分从高到低返回最多 top 个 FnameCandidate
+    sample 为该坐标在第一个非空表格中的内容，供界面展示
+    """
+    total = text_index.table_count
+    if total == 0:
+        return []
+    filled_flags, safe_flags = _string_flags(text_index.strings)
+    cell_ids = text_index.cell_ids
+    row_offsets = text_index.row_offsets
+    table_rows = text_index.table_row_offsets
+
+    # 所有表格行数相同时，第 r 行在 row_offsets 中的位置也是等距的
+    row_stride = _stride(tuple(table_rows))
+    candidates = []
+    for r in range(max_rows):
+        # 每个含第 r 行的表格（按正文顺序），该行在 cell_ids 中的起点和单元格数
+        if row_stride is not None and total > 1:
+            heads = range(table_rows[0] + r, table_rows[-1], row_stride) if r < row_stride else ()
+        else:
+            heads = [table_rows[t] + r for t in range(total) if table_rows[t + 1] - table_rows[t] > r]
+        if not heads:
+            break
+        starts = _gather(row_offsets, heads)
+        lengths = tuple(map(sub, _gather(row_offsets, tuple(map((1).__add__, heads))), starts))
+        stride = _stride(starts)
+        # 按单元格数从多到少稳定排序：含第 c 列的行恰为前 k 个
+        if min(lengths) == max(lengths):
+            order, sorted_starts = range(len(starts)), starts
+        else:
+            order = sorted(range(len(starts)), key=lengths.__getitem__, reverse=True)
+            sorted_starts = _gather(starts, order)
+        k = len(order)
+        for c in range(max_cols):
+            while k and lengths[order[k - 1]] <= c:
+                k -= 1
+            if not k:
+                break
+            if stride is not None and k == len(starts):
+                # 所有行都有第 c 列且起点等距：跨步切片，顺序即正文顺序
+                ids = cell_ids[starts[0] + c:starts[-1] + c + 1:stride]
+                positions = range(k)
+            else:
+                ids = _gather(cell_ids, tuple(map(c.__add__, sorted_starts[:k])))
+                positions = order[:k]
+            filled_mask = _gather(filled_flags, ids)
+            filled = sum(filled_mask)
+            if not filled:
+                continue
+            filled_ids = list(compress(ids, filled_mask))
+            unique = len(set(filled_ids)) / filled
+            safe = sum(_gather(safe_flags, filled_ids)) / filled
+            filled_rate = filled / total
+            # 示例取正文中第一个非空的表格
+            if isinstance(positions, range):
+                first = positions[filled_mask.index(1)]
+            else:
+                first = min(compress(positions, filled_mask))
+            candidates.append(FnameCandidate(
+                r, c, filled_rate * unique * safe, filled_rate, unique, safe,
+                text_index.strings[cell_ids[starts[first] + c]].strip(),
+            ))
+
+    # 得分相同时靠前的坐标优先
+    candidates.sort(key=lambda x: (-x.score, x.row, x.col))
+    return candidates[:top]
+
+
+def describe_candidate(candidate):
+    """一行说明，例如：(0,1) 示例 'GJ-001' 填写 100% 唯一 100% 可作文件名 100%"""
+    return (
+        f"({candidate.row},{candidate.col}) 示例 '{candidate.sample[:30]}' "
+        f"填写 {candidate.filled:.0%} 唯一 {candidate.unique:.0%} 可作文件名 {candidate.safe:.0%}"
+    )
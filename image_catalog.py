@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+提取结果目录（SQLite）
+功能：把每一次图片引用记录为一行（来源文档、表格序号、单元格坐标、Fname、输出路径、
+docx 内部件名、哈希、字节数、像素尺寸），按哈希和 Fname 建立索引，
+处理结束后可以直接用 SQL 查询“这张照片来自哪个表格”，不必再翻控制台输出。
+
+写入方式：记录先放在内存缓冲区，攒满一批后在一个事务中用 executemany 批量插入。
+
+查询示例：
+    sqlite3 catalog.db "SELECT document, table_index, row, col FROM images WHERE fname = 'GJ-001'"
+    sqlite3 catalog.db "SELECT hash, COUNT(*) FROM images GROUP BY hash HAVING COUNT(*) > 1"
+"""
+
+import io
+import os
+import sqlite3
+from datetime import datetime
+
+from PIL import Image
+
+from image_probe import probe_dimensions
+
+# 每批插入的记录数
+CATALOG_BATCH_SIZE = 1000
+
+COLUMNS = (
+    "document", "table_index", "row", "col", "fname", "output_path",
+    "part_name", "hash", "byte_size", "width", "height", "recorded_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id          INTEGER PRIMARY KEY,
+    document    TEXT NOT NULL,
+    table_index INTEGER NOT NULL,
+    row         INTEGER,
+    col         INTEGER,
+    fname       TEXT,
+    output_path TEXT,
+    part_name   TEXT,
+    hash        TEXT,
+    byte_size   INTEGER,
+    width       INTEGER,
+    height      INTEGER,
+    recorded_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_images_hash ON images (hash);
+CREATE INDEX IF NOT EXISTS idx_images_fname ON images (fname);
+CREATE INDEX IF NOT EXISTS idx_images_document ON images (document, table_index);
+"""
+
+_INSERT = f"INSERT INTO images ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def image_dimensions(src):
+    """
+    图片的像素尺寸 (宽, 高)；src 为字节串或可 seek 的文件对象
+    PNG/JPEG/GIF/BMP 只解析文件头；其他格式交给 PIL 的 Image.open（同样只读取文件头，不解码像素）；
+    无法识别时返回 (None, None)
+    """
+    if isinstance(src, (bytes, bytearray)):
+        src = io.BytesIO(src)
+    dimensions = probe_dimensions(src)
+    if dimensions:
+        return dimensions
+    try:
+        src.seek(0)
+        with Image.open(src) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def catalog_row(document, table_index, row, col, fname, output_path, part_name, digest, byte_size, width, height):
+    """按 COLUMNS 的顺序组成一条记录"""
+    return (
+        document, table_index, row, col, fname, output_path, part_name, digest, byte_size,
+        width, height, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+
+class ImageCatalog:
+    """
+    SQLite 目录：add 的记录攒满 batch_size 条后在一个事务中批量插入，close 时写入剩余记录
+    数据库为 WAL 模式，多进程分片时每个工作进程各自打开同一个数据库，直接插入自己的记录
+    """
+
+    def __init__(self, db_path, batch_size=CATALOG_BATCH_SIZE):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.pending = []
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def forget_document(self, document, start=0, stop=None):
+        """
+        重新处理同一文档前删除它的旧记录
+        只处理部分表格（--tables/--shard）时只删除 [start, stop) 范围内表格的记录，不影响其他分片
+        """
+        self.flush()
+        with self.conn:
+            if start == 0 and stop is None:
+                self.conn.execute("DELETE FROM images WHERE document = ?", (document,))
+            else:
+                self.conn.execute(
+                    "DELETE FROM images WHERE document = ? AND table_index >= ? AND table_index < ?",
+                    (document, start, stop if stop is not None else 2 ** 62),
+                )
+
+    def add(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:  # 一个事务
+            self.conn.executemany(_INSERT, self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
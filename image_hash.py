@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+图片去重用的哈希
+功能：按图片部件（docx 内的成员名，如 /word/media/image3.png）缓存哈希值，
+同一张图片被多个单元格、多个表格引用时只计算一次，去重开销与不同图片的数量成正比，与引用次数无关。
+
+哈希算法可选：
+    "blake2b"  默认，比 MD5 快，摘要长度可配置（digest_size 字节）
+    "sha1"     与其他工具的结果保持兼容时使用
+    "md5"      与旧版本相同
+较大的图片可以交给线程池并行计算（hashlib 计算大块数据时会释放 GIL）。
+"""
+
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_ALGORITHMS = ("blake2b", "sha1", "md5")
+DEFAULT_ALGORITHM = "blake2b"
+DEFAULT_DIGEST_SIZE = 16
+
+# 只有不小于该大小的图片才交给线程池，小图片直接计算更快
+PARALLEL_MIN_BYTES = 1024 * 1024
+
+# 流式计算哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_hasher(algorithm=DEFAULT_ALGORITHM, digest_size=DEFAULT_DIGEST_SIZE):
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=digest_size)
+    if algorithm in HASH_ALGORITHMS:
+        return hashlib.new(algorithm)
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+class PartHashCache:
+    """
+    图片部件名 -> 哈希值 的缓存，在一个文档处理期间有效
+    workers 大于 0 时，prefetch 提交的较大图片在线程池中计算
+    """
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM, digest_size=DEFAULT_DIGEST_SIZE, workers=0,
+                 min_parallel_bytes=PARALLEL_MIN_BYTES):
+        new_hasher(algorithm, digest_size)  # 尽早发现算法配置错误
+        self.algorithm = algorithm
+        self.digest_size = digest_size
+        self.min_parallel_bytes = min_parallel_bytes
+        self.executor = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        self.digests = {}  # 部件名 -> 哈希值，或线程池中尚未完成的 Future
+        self.hits = 0
+        self.misses = 0
+
+    def hash_bytes(self, data):
+        hasher = new_hasher(self.algorithm, self.digest_size)
+        hasher.update(data)
+        return hasher.hexdigest()
+
+    def hash_stream(self, src, chunk_size=HASH_CHUNK_SIZE):
+        hasher = new_hasher(self.algorithm, self.digest_size)
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def prefetch(self, parts):
+        """parts 为 [(部件名, 图片数据)]：尚未计算过的较大图片提交到线程池，之后 digest 直接取结果"""
+        if self.executor is None:
+            return
+        for part_name, data in parts:
+            if part_name not in self.digests and len(data) >= self.min_parallel_bytes:
+                self.digests[part_name] = self.executor.submit(self.hash_bytes, data)
+
+    def _cached(self, part_name):
+        value = self.digests.get(part_name)
+        if value is None:
+            return None
+        self.hits += 1
+        if not isinstance(value, str):
+            value = self.digests[part_name] = value.result()
+        return value
+
+    def digest(self, part_name, data):
+        """图片数据已在内存中时使用"""
+        value = self._cached(part_name)
+        if value is None:
+            self.misses += 1
+            value = self.digests[part_name] = self.hash_bytes(data)
+        return value
+
+    def digest_member(self, zf, member_name):
+        """从 zip 按块读取图片计算哈希（低内存模式），不把整张图片读入内存"""
+        value = self._cached(member_name)
+        if value is None:
+            self.misses += 1
+            with zf.open(member_name) as src:
+                value = self.digests[member_name] = self.hash_stream(src)
+        return value
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+图片尺寸探测与过滤
+功能：只读取图片文件头得到像素尺寸（PNG 的 IHDR、JPEG 的 SOF 段、GIF/BMP 文件头），
+不解码图片；无法识别的格式（EMF/WMF 等）可以退而使用 XML 中 wp:extent 的显示尺寸。
+配合 ImageFilter 在写出之前跳过徽标、图标、签章等过小的装饰性图片。
+"""
+
+import io
+import struct
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# JPEG 中带有图像尺寸的 SOF 段（C4/C8/CC 不是 SOF）
+_JPEG_SOF_MARKERS = {m for m in range(0xC0, 0xD0)} - {0xC4, 0xC8, 0xCC}
+
+
+class _HeaderReader:
+    """先读已取出的文件头，再从文件对象继续读取"""
+
+    def __init__(self, src, buffered):
+        self.src = src
+        self.buffered = buffered
+
+    def read(self, n):
+        data = self.buffered[:n]
+        self.buffered = self.buffered[n:]
+        if len(data) < n:
+            data += self.src.read(n - len(data))
+        return data
+
+    def skip(self, n):
+        while n > 0:
+            chunk = self.read(min(n, 65536))
+            if not chunk:
+                return
+            n -= len(chunk)
+
+
+def _probe_jpeg(reader):
+    while True:
+        byte = reader.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = reader.read(1)
+        while marker == b"\xff":  # 填充字节
+            marker = reader.read(1)
+        if not marker:
+            return None
+        m = marker[0]
+        if m == 0x01 or m == 0xD8 or 0xD0 <= m <= 0xD7:
+            continue  # 没有长度字段的标记
+        if m in (0xD9, 0xDA):
+            return None  # 在 SOF 之前就到了图像数据或结尾
+        length_bytes = reader.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if m in _JPEG_SOF_MARKERS:
+            data = reader.read(5)
+            if len(data) < 5:
+                return None
+            _, height, width = struct.unpack(">BHH", data)
+            return width, height
+        reader.skip(length - 2)
+
+
+def probe_dimensions(src):
+    """
+    从文件头读取图片的 (宽, 高) 像素尺寸，无法识别时返回 None
+    src 为字节串或文件对象（从当前位置开始读，只读取到尺寸所在位置为止）
+    """
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        src = io.BytesIO(src)
+    head = src.read(26)
+    if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+        return struct.unpack(">II", head[16:24])
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", head[6:10])
+    if head[:2] == b"BM" and len(head) >= 26:
+        width, height = struct.unpack("<ii", head[18:26])
+        return width, abs(height)
+    if head[:2] == b"\xff\xd8":
+        return _probe_jpeg(_HeaderReader(src, head[2:]))
+    return None
+
+
+def probe_member(zf, member_name):
+    """读取 zip 中图片的文件头得到尺寸，不读取整张图片"""
+    with zf.open(member_name) as src:
+        return probe_dimensions(src)
+
+
+def parse_min_size(text):
+    """解析 "宽x高"（如 120x80）或单个数字（宽高相同）"""
+    value = str(text).lower().replace("×", "x").replace("*", "x")
+    if "x" in value:
+        width, height = value.split("x", 1)
+        return int(width), int(height)
+    return int(value), int(value)
+
+
+class ImageFilter:
+    """
+    按字节数和像素尺寸过滤图片；所有条件为 0 时不过滤
+    尺寸无法确定的图片不会因为尺寸被跳过
+    """
+
+    def __init__(self, min_bytes=0, min_width=0, min_height=0):
+        self.min_bytes = min_bytes
+        self.min_width = min_width
+        self.min_height = min_height
+
+    @property
+    def active(self):
+        return bool(self.min_bytes or self.min_width or self.min_height)
+
+    def check(self, byte_size, get_dimensions):
+        """
+        返回跳过的原因，保留时返回 None
+        get_dimensions 仅在需要按尺寸过滤时才调用（读取文件头或 wp:extent）
+        """
+        if self.min_bytes and byte_size is not None and byte_size < self.min_bytes:
+            return f"{byte_size} 字节，小于 {self.min_bytes} 字节"
+        if self.min_width or self.min_height:
+            dimensions = get_dimensions()
+            if dimensions:
+                width, height = dimensions
+                if width < self.min_width or height < self.min_height:
+                    return f"尺寸 {width}x{height}，小于 {self.min_width}x{self.min_height}"
+        return None
@@ -1,9 +1,21 @@
 import os
 import re
+import queue
+import argparse
+import threading
 import tkinter as tk
 from tkinter import filedialog
 from docx import Document
 
+from table_text_index import TableTextIndex
+from atomic_files import AtomicFileWriter
+from path_planner import dedupe_names
+from docx_stream import blip_extent
+from image_probe import ImageFilter, parse_min_size, probe_dimensions
+
+# 跳过过小的装饰性图片（由 --min-bytes / --min-size 设置，默认不过滤）
+IMAGE_FILTER = ImageFilter()
+
 # --- 1. 辅助函数 ---
 
 def sanitize_filename(name):
@@ -21,44 +33,201 @@ def sanitize_filename(name):
         return "Untitled"
     return name
 
-def get_table_text_for_display(table):
+def get_table_text_for_display(text_index, table_idx):
     """
     (需求 2) 提取表格所有文本内容，格式化后用于在控制台显示。
+    文本来自 TableTextIndex，不再逐个单元格读取 python-docx 的 cell.text
     """
-    text_output = []
     try:
-        for r_idx, row in enumerate(table.rows):
-            row_text = []
-            for c_idx, cell in enumerate(row.cells):
-                # 格式化输出，例如: [行0,列0]: 单元格内容
-                cell_content = cell.text.strip().replace("\n", " ") # 将单元格内换行替换为空格
-                row_text.append(f"[{r_idx},{c_idx}]: {cell_content}")
-            
-            # 用 " | " 分隔同一行的单元格
-            text_output.append(" | ".join(row_text))
-        
-        # 用换行符分隔每一行
-        return "\n".join(text_output)
-    
+        return format_rows_for_display(text_index.rows(table_idx))
     except Exception as e:
         return f"读取表格内容时出错: {e}"
 
-# --- 2. 核心处理函数 ---
+def format_rows_for_display(rows):
+    """把按行排列的单元格文本格式化为 [行,列]: 内容 | ... 的形式"""
+    text_output = []
+    for r_idx, row in enumerate(rows):
+        row_text = []
+        for c_idx, text in enumerate(row):
+            # 格式化输出，例如: [行0,列0]: 单元格内容
+            cell_content = text.strip().replace("\n", " ") # 将单元格内换行替换为空格
+            row_text.append(f"[{r_idx},{c_idx}]: {cell_content}")
+        
+        # 用 " | " 分隔同一行的单元格
+        text_output.append(" | ".join(row_text))
+    
+    # 用换行符分隔每一行
+    return "\n".join(text_output)
+
+# --- 2. 命名规则 ---
+#
+# 每条规则从表格文本中推导出 Fname，多条规则按顺序尝试，第一条得到非空结果的规则生效：
+#   right:隐患点编号          文本为“隐患点编号”的单元格右侧的单元格
+#   below:隐患点编号          文本为“隐患点编号”的单元格下方的单元格
+#   cell:0,1                  固定坐标 (行,列)
+#   regex:GJ-\d+              在所有单元格中查找，有分组时取第 1 个分组
+#   template:{right:编号}_{right:地点}   模板，花括号中为上面任意一种规则，全部命中才生效
+# 匹配标签时忽略首尾空白和末尾的冒号。
+
+def _normalize_label(text):
+    return text.strip().rstrip(":：").strip()
+
+class FnameRule:
+    """一条已编译的命名规则"""
+
+    _TEMPLATE_FIELD = re.compile(r"\{([^{}]+)\}")
+
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        kind, sep, arg = self.spec.partition(":")
+        self.kind = kind.strip().lower()
+        if not sep or self.kind not in ("right", "below", "cell", "regex", "template"):
+            raise ValueError(f"无法识别的命名规则: {spec}")
+        if self.kind in ("right", "below"):
+            self.label = _normalize_label(arg)
+        elif self.kind == "cell":
+            self.coord = parse_cell_coord(arg)
+            if self.coord is None:
+                raise ValueError(f"坐标格式错误: {spec}")
+        elif self.kind == "regex":
+            self.pattern = re.compile(arg)
+        else:
+            self.template = arg
+            self.fields = [FnameRule(field) for field in self._TEMPLATE_FIELD.findall(arg)]
+            if not self.fields:
+                raise ValueError(f"模板中没有 {{规则}} 占位符: {spec}")
+
+    def evaluate(self, rows):
+        """对一个表格（按行排列的单元格文本）求值，未命中时返回 None"""
+        if self.kind == "cell":
+            r, c = self.coord
+            if r < len(rows) and c < len(rows[r]):
+                return rows[r][c].strip() or None
+            return None
+        if self.kind == "regex":
+            for row in rows:
+                for text in row:
+                    match = self.pattern.search(text)
+                    if match:
+                        return (match.group(1) if match.groups() else match.group(0)).strip() or None
+            return None
+        if self.kind == "template":
+            values = [field.evaluate(rows) for field in self.fields]
+            if not all(values):
+                return None
+            values = iter(values)
+            return self._TEMPLATE_FIELD.sub(lambda m: next(values), self.template).strip() or None
+        for r, row in enumerate(rows):
+            for c, text in enumerate(row):
+                if _normalize_label(text) != self.label:
+                    continue
+                if self.kind == "right":
+                    # 横向合并的单元格会重复出现，跳过与标签相同的单元格
+                    for value in row[c + 1:]:
+                        if value != text:
+                            return value.strip() or None
+                elif r + 1 < len(rows) and c < len(rows[r + 1]):
+                    return rows[r + 1][c].strip() or None
+        return None
+
+def parse_cell_coord(text):
+    try:
+        r, c = (int(part) for part in text.split(","))
+    except ValueError:
+        return None
+    return (r, c) if r >= 0 and c >= 0 else None
+
+def compile_rules(specs):
+    """编译规则列表（忽略空行和 # 开头的注释行）"""
+    return [FnameRule(spec) for spec in specs if spec.strip() and not spec.strip().startswith("#")]
 
-def process_document_interactive(doc_path, output_dir):
+def load_rules_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+def apply_rules(rules, rows):
+    for rule in rules:
+        value = rule.evaluate(rows)
+        if value:
+            return value
+    return None
+
+# --- 3. 核心处理函数 ---
+
+def extract_table_images(document, table, output_dir, Fname, ns_map):
+    """
+    (需求 3 & 4) 创建 Fname 文件夹，提取该表格内的所有图片并以 Fname_序号 命名
+    返回提取的图片数量
+    """
+    # 创建文件夹
+    target_folder_path = os.path.join(output_dir, Fname)
+    os.makedirs(target_folder_path, exist_ok=True)
+
+    image_counter = 0
+    # 图片先写临时文件，整个表格写完后统一 fsync 并改名
+    with AtomicFileWriter() as files:
+        # 遍历表格的 -> 行 -> 单元格 -> 段落 -> 运行(run)
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    for run in para.runs:
+                        # 查找run中的 'blip' (Bitmap Location and Identification) 元素
+                        try:
+                            # 使用 findall，兼容新版 python-docx（其 xpath() 不接受 namespaces 参数）
+                            blip_list = run.element.findall(f'.//{{{ns_map["a"]}}}blip')
+                            if blip_list:
+                                # 获取图片的 rId (relationship Id)
+                                rId = blip_list[0].get(f'{{{ns_map["r"]}}}embed')
+                                if rId:
+                                    # 通过rId从文档中获取图片部件
+                                    image_part = document.part.related_parts[rId]
+                                    image_blob = image_part.blob
+                                    # 获取图片扩展名
+                                    image_ext = image_part.partname.ext
+
+                                    reason = IMAGE_FILTER.check(
+                                        len(image_blob),
+                                        lambda: probe_dimensions(image_blob) or blip_extent(blip_list[0]),
+                                    )
+                                    if reason:
+                                        print(f"  跳过图片 {image_part.partname}（{reason}）")
+                                        continue
+
+                                    # (需求 5) 定义图片文件名
+                                    image_counter += 1
+                                    image_name = f"{Fname}_{image_counter}.{image_ext}"
+                                    image_save_path = os.path.join(target_folder_path, image_name)
+                                
+                                    # 保存图片
+                                    files.write_bytes(image_save_path, image_blob)
+                        except Exception as e:
+                            print(f"  提取图片时出错: {e}")
+    return target_folder_path, image_counter
+
+# 定义XML命名空间，用于查找图片
+NS_MAP = {
+    'a': "http://schemas.openxmlformats.org/drawingml/2006/main",
+    'r': "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+}
+
+def process_document_interactive(doc_path, output_dir, rules=None):
     """
     主处理逻辑：
     1. (需求 1) 遍历所有表格 (item)
     2. (需求 2) 显示item内容，等待用户输入Fname
     3. (需求 3) 创建Fname同名文件夹
     4. (需求 4) 提取该表格内的所有图片，并以Fname_序号命名
+    提供命名规则 rules 时改用 process_document_with_rules
     """
+    if rules:
+        return process_document_with_rules(doc_path, output_dir, rules)
     
     print(f"--- 开始处理文件: {doc_path} ---")
     
     try:
         document = Document(doc_path)
         tables = document.tables
+        text_index = TableTextIndex.build(doc_path)
         total_tables = len(tables)
         total_images_processed = 0
         
@@ -68,12 +237,6 @@ def process_document_interactive(doc_path, output_dir):
 
         print(f"文档中总计 {total_tables} 个表格 (item)。")
 
-        # 定义XML命名空间，用于查找图片
-        ns_map = {
-            'a': "http://schemas.openxmlformats.org/drawingml/2006/main",
-            'r': "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
-        }
-
         # (需求 1) 遍历所有表格 (item)
         for i, table in enumerate(tables):
             print("\n" + "="*50)
@@ -82,7 +245,7 @@ def process_document_interactive(doc_path, output_dir):
             
             # (需求 2) 输出单个item的内容
             print("\n[表格内容预览]:")
-            item_content = get_table_text_for_display(table)
+            item_content = get_table_text_for_display(text_index, i)
             print(item_content)
             print("-"*50)
 
@@ -98,42 +261,9 @@ def process_document_interactive(doc_path, output_dir):
             else:
                 print(f"  已获取 Fname: '{Fname}'")
 
-            # 创建文件夹
-            target_folder_path = os.path.join(output_dir, Fname)
-            os.makedirs(target_folder_path, exist_ok=True)
+            target_folder_path, image_counter = extract_table_images(document, table, output_dir, Fname, NS_MAP)
             print(f"  已创建/确认文件夹: {target_folder_path}")
-
-            # (需求 4) 提取图片并重命名
-            image_counter = 0
-            # 遍历表格的 -> 行 -> 单元格 -> 段落 -> 运行(run)
-            for row in table.rows:
-                for cell in row.cells:
-                    for para in cell.paragraphs:
-                        for run in para.runs:
-                            # 查找run中的 'blip' (Bitmap Location and Identification) 元素
-                            try:
-                                blip_list = run.element.xpath('.//a:blip', namespaces=ns_map)
-                                if blip_list:
-                                    # 获取图片的 rId (relationship Id)
-                                    rId = blip_list[0].get(f'{{{ns_map["r"]}}}embed')
-                                    if rId:
-                                        # 通过rId从文档中获取图片部件
-                                        image_part = document.part.related_parts[rId]
-                                        image_blob = image_part.blob
-                                        # 获取图片扩展名
-                                        image_ext = image_part.default_part_name.split('.')[-1]
-
-                                        # (需求 5) 定义图片文件名
-                                        image_counter += 1
-                                        total_images_processed += 1
-                                        image_name = f"{Fname}_{image_counter}.{image_ext}"
-                                        image_save_path = os.path.join(target_folder_path, image_name)
-                                        
-                                        # 保存图片
-                                        with open(image_save_path, 'wb') as f:
-                                            f.write(image_blob)
-                            except Exception as e:
-                                print(f"  提取图片时出错: {e}")
+            total_images_processed += image_counter
 
             if image_counter == 0:
                 print(f"  在 Fname: '{Fname}' 的表格中未找到图片。")
@@ -154,8 +284,153 @@ def process_document_interactive(doc_path, output_dir):
         print("请确保文件未被打开，且具有读取权限。")
         return 0
 
-# --- 3. 主程序入口 ---
-def main():
+def _parse_table_numbers(text, total_tables):
+    """解析形如 "3,7,10-12" 的表格序号（从 1 开始），返回从 0 开始的索引集合"""
+    indexes = set()
+    for part in text.replace("，", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        try:
+            first, last = int(start), int(end or start)
+        except ValueError:
+            continue
+        indexes.update(i - 1 for i in range(first, last + 1) if 1 <= i <= total_tables)
+    return indexes
+
+def process_document_with_rules(doc_path, output_dir, rules):
+    """
+    按命名规则自动确定 Fname：
+    1. 一次性提取所有表格的文本，用编译好的规则为每个表格推导名称
+    2. 批量预览推导结果，操作员可以指定需要改为手动输入的表格；预览期间后台线程已开始加载文档
+    3. 已确定名称的表格立即在后台线程中提取图片，同时只对规则未能确定的表格逐个询问
+    规则推导和手动输入的名称都按 dedupe_names 去重（重名依次加 (2)、(3)…），不同表格不会写进同一个文件夹
+    """
+    print(f"--- 开始处理文件（命名规则模式）: {doc_path} ---")
+
+    try:
+        text_index = TableTextIndex.build(doc_path)
+        total_tables = text_index.table_count
+        if total_tables == 0:
+            print("警告: 在此文档中未找到任何表格。程序退出。")
+            return 0
+
+        proposals = [apply_rules(rules, text_index.rows(i)) for i in range(total_tables)]
+        names = dedupe_names([sanitize_filename(value) if value else None for value in proposals])
+
+        # --- 后台线程：先加载文档（操作员查看预览时即在进行），再按队列顺序提取 ---
+        work_queue = queue.Queue()
+        results = {}
+
+        def worker():
+            try:
+                document = Document(doc_path)
+                tables = document.tables
+            except Exception as e:
+                print(f"  加载文档失败，无法提取图片: {e}")
+                document = None
+            while True:
+                item = work_queue.get()
+                if item is None:
+                    break
+                if document is None:
+                    continue
+                i, Fname = item
+                try:
+                    results[i] = extract_table_images(document, tables[i], output_dir, Fname, NS_MAP)
+                except Exception as e:
+                    print(f"  表格 {i + 1} 提取失败: {e}")
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+
+        # --- 批量预览 ---
+        print("\n" + "="*50)
+        print(f"--- 命名规则推导结果（共 {total_tables} 个表格）---")
+        for i, name in enumerate(names):
+            print(f"  表格 {i + 1}: {name if name else '[未匹配，需手动输入]'}")
+        resolved = sum(1 for name in names if name)
+        print(f"规则已确定 {resolved} 个，需手动输入 {total_tables - resolved} 个。")
+        print("="*50)
+        override = input("直接按 Enter 接受以上结果；或输入要改为手动输入的表格序号 (如 3,7,10-12): ")
+        for i in _parse_table_numbers(override, total_tables):
+            names[i] = None
+        resolved = sum(1 for name in names if name)
+
+        # 规则已确定的表格立即开始提取
+        for i, Fname in enumerate(names):
+            if Fname:
+                work_queue.put((i, Fname))
+
+        # --- 只对未确定的表格逐个询问 ---
+        for i, Fname in enumerate(names):
+            if Fname:
+                continue
+            print("\n" + "="*50)
+            print(f"--- 表格 {i + 1}/{total_tables} 需要手动输入名称 ---")
+            print("="*50)
+            print(get_table_text_for_display(text_index, i))
+            print("-"*50)
+            fname_raw = input("请粘贴或输入用作文件夹/图片名称的文本，并按 Enter 键: ")
+            # 与已确定的全部名称一起去重，与其他表格重名时加 (2)、(3)…
+            Fname = dedupe_names([name for name in names if name] + [sanitize_filename(fname_raw)])[-1]
+            if Fname.casefold() != sanitize_filename(fname_raw).casefold():
+                print(f"  名称已被其他表格使用，改为: '{Fname}'")
+            names[i] = Fname
+            work_queue.put((i, Fname))
+
+        work_queue.put(None)
+        if thread.is_alive():
+            print("\n所有名称已确定，等待后台提取完成...")
+        thread.join()
+
+        total_images_processed = 0
+        for i in sorted(results):
+            target_folder_path, image_counter = results[i]
+            total_images_processed += image_counter
+            print(f"  表格 {i + 1}: '{names[i]}' 提取 {image_counter} 张图片 -> {target_folder_path}")
+
+        print("\n" + "="*50)
+        print("--- 所有任务处理完毕 ---")
+        print(f"总计 {total_tables} 个表格 (item) 已处理完毕，其中 {resolved} 个由规则自动命名。")
+        print(f"总计提取 {total_images_processed} 张图片。")
+        print("="*50)
+        return total_tables
+
+    except Exception as e:
+        print(f"\n--- 发生严重错误 ---")
+        print(f"处理文件失败: {e}")
+        print("请确保文件未被打开，且具有读取权限。")
+        return 0
+
+# --- 4. 主程序入口 ---
+def ask_rules():
+    """交互式输入命名规则，直接回车表示不使用规则、每个表格手动输入"""
+    print("\n可以输入命名规则自动确定每个表格的名称（每行一条，空行结束），例如:")
+    print("  right:隐患点编号      regex:GJ-\\d+      cell:0,1      template:{right:编号}_{right:地点}")
+    specs = []
+    while True:
+        line = input("规则 (直接回车结束): " if specs else "规则 (直接回车则逐个手动输入): ")
+        if not line.strip():
+            return specs
+        try:
+            FnameRule(line)
+            specs.append(line)
+        except (ValueError, re.error) as e:
+            print(f"  规则无效: {e}")
+
+def main(argv=None):
+    global IMAGE_FILTER
+    parser = argparse.ArgumentParser(description="逐个表格确定名称并提取图片，可用命名规则自动命名")
+    parser.add_argument("--rules", help="命名规则文件，每行一条规则")
+    parser.add_argument("--rule", action="append", default=[], help="命名规则，可重复指定")
+    parser.add_argument("--min-bytes", type=int, default=0, help="跳过小于该字节数的图片")
+    parser.add_argument("--min-size", type=parse_min_size, default=(0, 0), metavar="宽x高",
+                        help="跳过宽或高小于该像素数的图片，如 120x80（只读取图片文件头）")
+    args = parser.parse_args(argv)
+    IMAGE_FILTER = ImageFilter(args.min_bytes, *args.min_size)
+
     # (需求 6) 最好能让用户选择输入的word文档、输出的文件夹目录
     # 弹出GUI窗口让用户选择
     root = tk.Tk()
@@ -178,8 +453,20 @@ def main():
         print("用户取消了选择。程序退出。")
         return
 
+    # 命名规则：命令行未提供时询问
+    specs = list(args.rule)
+    if args.rules:
+        specs.extend(load_rules_file(args.rules))
+    if not specs:
+        specs = ask_rules()
+    try:
+        rules = compile_rules(specs)
+    except (ValueError, re.error) as e:
+        print(f"命名规则有误: {e}")
+        return
+
     # 调用核心处理函数
-    process_document_interactive(doc_path, output_dir)
+    process_document_interactive(doc_path, output_dir, rules)
     
     # 防止exe窗口闪退
     print("\n按 Enter 键退出...")
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+图片输出层
+功能：把“Fname 文件夹 + Fname_序号.扩展名”的输出布局与具体的存储方式分开，
+处理逻辑只调用 make_folder / write_image，由不同的写出器决定写到哪里。
+"""
+
+import io
+import os
+import time
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from path_planner import create_folders
+from atomic_files import AtomicFileWriter, DEFAULT_FSYNC
+
+# 流式复制图片时的缓冲区大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def prepare_folders(writer, names):
+    """
+    为规划好的全部 Fname 一次性准备文件夹，返回 ({名称: 文件夹标识}, {名称: 异常})
+    写出器没有批量接口时逐个调用 make_folder
+    """
+    if hasattr(writer, "prepare_folders"):
+        return writer.prepare_folders(names)
+    folders = {}
+    failed = {}
+    for name in names:
+        if name is None or name in folders or name in failed:
+            continue
+        try:
+            folders[name] = writer.make_folder(name)
+        except Exception as e:
+            failed[name] = e
+    return folders, failed
+
+
+class FolderImageWriter:
+    """
+    默认写出器：每个 Fname 一个文件夹，每张图片一个文件
+    图片先写临时文件再原子改名，按 fsync_policy 组提交（见 atomic_files）
+    """
+
+    def __init__(self, output_dir, fsync_policy=DEFAULT_FSYNC):
+        self.output_dir = output_dir
+        self.files = AtomicFileWriter(fsync_policy)
+
+    def make_folder(self, fname):
+        """创建（或确认）Fname 文件夹，返回之后 write_image 使用的文件夹标识"""
+        folder = os.path.join(self.output_dir, fname)
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def prepare_folders(self, names):
+        """批量创建规划好的文件夹，之后写图片时不再检查或创建目录"""
+        return create_folders(self.output_dir, names)
+
+    def write_image(self, folder, image_name, data):
+        self.files.write_bytes(os.path.join(folder, image_name), data)
+
+    def write_image_stream(self, folder, image_name, src, size):
+        """从文件对象按块复制，不把整张图片读入内存"""
+        with self.files.open(os.path.join(folder, image_name)) as f:
+            shutil.copyfileobj(src, f, COPY_CHUNK_SIZE)
+
+    def close(self):
+        self.files.close()
+
+
+def image_output_path(writer, folder, image_name):
+    """
+    图片的输出位置（绝对路径），记入提取结果目录
+    归档输出时为“归档文件的绝对路径/Fname/图片名”
+    """
+    writer = getattr(writer, "writer", writer)  # WriteScheduler 包装的写出器
+    archive_path = getattr(writer, "archive_path", None)
+    if archive_path is not None:
+        return os.path.join(os.path.abspath(archive_path), str(folder), image_name)
+    return os.path.abspath(os.path.join(str(folder), image_name))
+
+
+def write_image_then(writer, folder, image_name, data, on_written):
+    """
+    写出一张图片，写出成功后调用 on_written()
+    延迟写出的写出器（deferred 为 True，如 WriteScheduler）在真正写出之后才调用，写出失败时不调用
+    """
+    if getattr(writer, "deferred", False):
+        writer.write_image(folder, image_name, data, on_written=on_written)
+    else:
+        writer.write_image(folder, image_name, data)
+        on_written()
+
+
+# --- 写出调度（合并批次、限速） ---
+
+# 默认每批最多累积的字节数和文件数
+WRITE_BATCH_BYTES = 8 * 1024 * 1024
+WRITE_BATCH_FILES = 256
+
+
+class TokenBucket:
+    """
+    令牌桶：每秒补充 rate 个令牌，最多积累 rate 个（即空闲后最多允许 1 秒的突发）
+    开始时没有令牌，多进程分片时每个分片新建的写出调度不会各自先突发一次；
+    一次取用超过现有令牌时先透支，再等待到令牌补回 0，大文件不会被永远卡住
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.tokens = 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def consume(self, amount):
+        """取用 amount 个令牌，返回等待的秒数"""
+        now = self.clock()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        self.sleep(wait)
+        return wait
+
+
+class WriteScheduler:
+    """
+    包装另一个写出器（通常是 FolderImageWriter），多份程序写同一台文件服务器时避免零散的突发小写入：
+    - 图片先按目标文件夹排队，累积到 batch_bytes 字节或 batch_files 个文件时，
+      按文件夹依次成批写出（同一文件夹的文件连续写，组提交也按文件夹进行）
+    - max_mbps（MB/s）和 max_files（个/秒）为令牌桶限速，0 表示不限
+    - 流式图片和指向输入文档缓冲区的 memoryview 不读入内存，按块复制到本批次的临时文件中排队；
+      超过 batch_bytes 的流式图片不排队，先写出队列再按块直接复制
+    写出在排队之后才发生：写出成功后才调用该图片的 on_written()，
+    写出失败时调用 on_error(路径, 异常)（默认只计入 metrics 的 errors）；
+    结束时必须调用 close()，写出队列中剩余的图片后再关闭被包装的写出器
+    """
+
+    # 见 write_image_then
+    deferred = True
+
+    def __init__(self, writer, max_mbps=0, max_files=0, batch_bytes=WRITE_BATCH_BYTES,
+                 batch_files=WRITE_BATCH_FILES, on_error=None):
+        self.writer = writer
+        self.byte_bucket = TokenBucket(max_mbps * 1024 * 1024) if max_mbps else None
+        self.file_bucket = TokenBucket(max_files) if max_files else None
+        self.batch_bytes = batch_bytes
+        self.batch_files = batch_files
+        self.on_error = on_error
+        self.queue = {}  # 文件夹 -> [(图片名, 数据, 字节数, on_written)]，按文件夹第一次出现的顺序
+        self.spool = None  # 本批次的临时文件；数据为 int 时表示图片在其中的偏移
+        self.queued_bytes = 0
+        self.queued_files = 0
+        self.max_queue_bytes = 0
+        self.max_queue_files = 0
+        self.throttle_seconds = 0.0
+        self.batches = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+    def make_folder(self, fname):
+        return self.writer.make_folder(fname)
+
+    def prepare_folders(self, names):
+        return prepare_folders(self.writer, names)
+
+    def write_image(self, folder, image_name, data, on_written=None):
+        if isinstance(data, memoryview):
+            # memoryview 可能指向输入文档的缓冲区（见 spooled_input），不复制到内存，写入临时文件排队
+            offset = self._spool_file().seek(0, os.SEEK_END)
+            self.spool.write(data)
+            self._enqueue(folder, image_name, offset, len(data), on_written)
+        else:
+            self._enqueue(folder, image_name, data, len(data), on_written)
+
+    def write_image_stream(self, folder, image_name, src, size, on_written=None):
+        if size < self.batch_bytes:
+            offset = self._spool_file().seek(0, os.SEEK_END)
+            shutil.copyfileobj(src, self.spool, COPY_CHUNK_SIZE)
+            self._enqueue(folder, image_name, offset, size, on_written)
+            return
+        self.flush()
+        self._throttle(size)
+        if not self._write(folder, image_name, lambda: self._stream_to_writer(folder, image_name, src, size)):
+            return
+        self.batches += 1
+        self.files_written += 1
+        self.bytes_written += size
+        if on_written is not None:
+            on_written()
+
+    def _spool_file(self):
+        if self.spool is None:
+            self.spool = tempfile.TemporaryFile()
+        return self.spool
+
+    def _enqueue(self, folder, image_name, data, size, on_written):
+        self.queue.setdefault(folder, []).append((image_name, data, size, on_written))
+        self.queued_bytes += size
+        self.queued_files += 1
+        self.max_queue_bytes = max(self.max_queue_bytes, self.queued_bytes)
+        self.max_queue_files = max(self.max_queue_files, self.queued_files)
+        if self.queued_bytes >= self.batch_bytes or self.queued_files >= self.batch_files:
+            self.flush()
+
+    def _stream_to_writer(self, folder, image_name, src, size):
+        if hasattr(self.writer, "write_image_stream"):
+            self.writer.write_image_stream(folder, image_name, src, size)
+        else:
+            self.writer.write_image(folder, image_name, src.read())
+
+    def _throttle(self, size):
+        if self.byte_bucket is not None:
+            self.throttle_seconds += self.byte_bucket.consume(size)
+        if self.file_bucket is not None:
+            self.throttle_seconds += self.file_bucket.consume(1)
+
+    def _write(self, folder, image_name, write):
+        try:
+            write()
+            return True
+        except Exception as e:
+            self.errors += 1
+            if self.on_error is not None:
+                self.on_error(os.path.join(str(folder), image_name), e)
+            return False
+
+    def flush(self):
+        """按文件夹依次写出队列中的全部图片（一批）"""
+        if not self.queued_files:
+            return
+        queue, self.queue = self.queue, {}
+        self.queued_bytes = self.queued_files = 0
+        self.batches += 1
+        for folder, items in queue.items():
+            for image_name, data, size, on_written in items:
+                self._throttle(size)
+                if isinstance(data, int):
+                    write = lambda: self._stream_to_writer(folder, image_name, SpoolSlice(self.spool, data, size), size)
+                else:
+                    write = lambda: self.writer.write_image(folder, image_name, data)
+                if self._write(folder, image_name, write):
+                    self.files_written += 1
+                    self.bytes_written += size
+                    if on_written is not None:
+                        on_written()
+        if self.spool is not None:
+            self.spool.seek(0)
+            self.spool.truncate()
+
+    def metrics(self):
+        """当前队列深度、历史最大队列深度、限速等待时间和写出统计"""
+        return {
+            "queued_files": self.queued_files,
+            "queued_bytes": self.queued_bytes,
+            "max_queue_files": self.max_queue_files,
+            "max_queue_bytes": self.max_queue_bytes,
+            "throttle_seconds": round(self.throttle_seconds, 3),
+            "batches": self.batches,
+            "files_written": self.files_written,
+            "bytes_written": self.bytes_written,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.spool is not None:
+                self.spool.close()
+                self.spool = None
+            self.writer.close()
+
+
+class SpoolSlice:
+    """临时文件中从 offset 开始、长 size 字节的一段，作为只读文件对象按块读取"""
+
+    def __init__(self, f, offset, size):
+        f.seek(offset)
+        self.f = f
+        self.remaining = size
+
+    def read(self, n=-1):
+        if n is None or n < 0 or n > self.remaining:
+            n = self.remaining
+        data = self.f.read(n)
+        self.remaining -= len(data)
+        return data
+
+
+# --- 归档输出 ---
+
+# 可选的归档格式
+ARCHIVE_FORMATS = ("zip", "tar")
+
+# 本身已经是压缩格式的图片，写入 zip 时直接存储，避免重复压缩
+STORED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "tif", "tiff", "webp"}
+
+
+def archive_path_for(doc_path, output_dir, archive_format):
+    """归档文件放在输出目录下，与文档同名"""
+    stem = os.path.splitext(os.path.basename(doc_path))[0]
+    return os.path.join(output_dir, f"{stem}.{archive_format}")
+
+
+def open_archive_writer(archive_path, archive_format):
+    if archive_format == "zip":
+        return ZipImageWriter(archive_path)
+    if archive_format == "tar":
+        return TarImageWriter(archive_path)
+    raise ValueError(f"不支持的归档格式: {archive_format}")
+
+
+class ZipImageWriter:
+    """
+    把 Fname/Fname_N.ext 直接顺序写入一个 zip 文件：
+    没有目录创建，也没有逐个文件的打开/关闭，JPEG/PNG 等按原样存储不再压缩
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.zf = zipfile.ZipFile(archive_path, 'w', allowZip64=True)
+
+    def make_folder(self, fname):
+        return fname
+
+    def write_image(self, folder, image_name, data):
+        ext = image_name.rsplit('.', 1)[-1].lower()
+        compress = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        info = zipfile.ZipInfo(f"{folder}/{image_name}", date_time=time.localtime()[:6])
+        info.compress_type = compress
+        with self.zf.open(info, 'w', force_zip64=len(data) > zipfile.ZIP64_LIMIT) as f:
+            f.write(data)
+
+    def write_image_stream(self, folder, image_name, src, size):
+        ext = image_name.rsplit('.', 1)[-1].lower()
+        info = zipfile.ZipInfo(f"{folder}/{image_name}", date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        with self.zf.open(info, 'w', force_zip64=size > zipfile.ZIP64_LIMIT) as f:
+            shutil.copyfileobj(src, f, COPY_CHUNK_SIZE)
+
+    def close(self):
+        self.zf.close()
+
+
+class TarImageWriter:
+    """把 Fname/Fname_N.ext 直接顺序写入一个不压缩的 tar 文件"""
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.tf = tarfile.open(archive_path, 'w', format=tarfile.PAX_FORMAT)
+        self.mtime = time.time()
+
+    def make_folder(self, fname):
+        return fname
+
+    def write_image(self, folder, image_name, data):
+        info = tarfile.TarInfo(f"{folder}/{image_name}")
+        info.size = len(data)
+        info.mtime = self.mtime
+        self.tf.addfile(info, io.BytesIO(data))
+
+    def write_image_stream(self, folder, image_name, src, size):
+        info = tarfile.TarInfo(f"{folder}/{image_name}")
+        info.size = size
+        info.mtime = self.mtime
+        self.tf.addfile(info, src)
+
+    def close(self):
+        self.tf.close()
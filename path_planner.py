@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+输出路径规划
+功能：提取前先确定每个表格最终使用的 Fname，重名的表格按出现顺序依次命名为
+“Fname”、“Fname (2)”、“Fname (3)”……，避免两个表格共用一个文件夹时序号都从 1 开始、
+后面表格的图片覆盖前面的图片。规划结果确定后，文件夹可以一次性批量创建。
+"""
+
+import os
+import re
+
+
+def sanitize_filename(name):
+    """清理文件名，去除Windows文件名中的非法字符"""
+    if not name:
+        return "Untitled"
+    name = re.sub(r'[\\/*?:"<>|]', '-', name)
+    name = name.strip()
+    return name if name else "Untitled"
+
+
+def dedupe_names(names):
+    """
+    按顺序为重名项加上 “ (2)”、“ (3)” 后缀，结果只取决于输入顺序
+    名称比较不区分大小写（Windows 文件系统不区分大小写）；None 表示跳过的表格，原样保留
+    """
+    used = set()
+    next_suffix = {}  # 原名称 -> 下一个尝试的后缀序号，避免大量重名时反复从 2 开始尝试
+    result = []
+    for name in names:
+        if name is None:
+            result.append(None)
+            continue
+        key = name.casefold()
+        candidate = name
+        if key in used:
+            n = next_suffix.get(key, 2)
+            candidate = f"{name} ({n})"
+            while candidate.casefold() in used:
+                n += 1
+                candidate = f"{name} ({n})"
+            next_suffix[key] = n + 1
+        used.add(candidate.casefold())
+        result.append(candidate)
+    return result
+
+
+def create_folders(output_dir, names):
+    """
+    批量创建规划好的文件夹：输出目录只确认一次，之后每个文件夹一次 mkdir
+    返回 ({名称: 文件夹路径}, {名称: 创建失败的异常})
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    folders = {}
+    failed = {}
+    for name in names:
+        if name is None or name in folders or name in failed:
+            continue
+        folder = os.path.join(output_dir, name)
+        try:
+            os.mkdir(folder)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            # 名称中含路径分隔符时需要先创建上级目录
+            try:
+                os.makedirs(folder, exist_ok=True)
+            except OSError as e:
+                failed[name] = e
+                continue
+        except OSError as e:
+            failed[name] = e
+            continue
+        folders[name] = folder
+    return folders, failed
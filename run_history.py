@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+处理速度记录
+功能：每次实际提取结束后记录本次写出的字节数、图片数和耗时（按处理方式分别记录），
+预演（--dry-run）时用最近几次记录的平均速度估算运行时间。
+记录保存在用户目录下的一个 JSON 文件中，只保留最近 HISTORY_LIMIT 条。
+"""
+
+import json
+import os
+from datetime import datetime
+
+from atomic_files import write_text_atomic
+
+HISTORY_FILE = os.path.join(os.path.expanduser("~"), ".msword_tools_throughput.json")
+
+# 文件中最多保留的记录数
+HISTORY_LIMIT = 200
+
+# 估算时使用同一处理方式最近的记录数
+ESTIMATE_WINDOW = 10
+
+# 耗时过短的运行误差太大，不记录（秒）
+MIN_RECORD_SECONDS = 0.5
+
+
+def load_history(path=HISTORY_FILE):
+    """读取全部记录，文件不存在或损坏时返回空列表"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return records if isinstance(records, list) else []
+
+
+def record_run(mode, byte_count, image_count, seconds, path=HISTORY_FILE):
+    """记录一次实际提取；没有写出图片或耗时过短时不记录，返回是否已记录"""
+    if image_count <= 0 or seconds < MIN_RECORD_SECONDS:
+        return False
+    records = load_history(path)
+    records.append({
+        "mode": mode,
+        "bytes": byte_count,
+        "images": image_count,
+        "seconds": round(seconds, 3),
+        "recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    write_text_atomic(path, json.dumps(records[-HISTORY_LIMIT:], ensure_ascii=False, indent=1))
+    return True
+
+
+def recorded_throughput(mode, path=HISTORY_FILE):
+    """
+    最近 ESTIMATE_WINDOW 次同一处理方式的平均速度 (字节/秒, 图片/秒, 记录数)
+    该方式没有记录时使用其他方式的记录；完全没有记录时返回 None
+    """
+    records = load_history(path)
+    matching = [r for r in records if r.get("mode") == mode] or records
+    recent = matching[-ESTIMATE_WINDOW:]
+    seconds = sum(r.get("seconds", 0) for r in recent)
+    if not recent or seconds <= 0:
+        return None
+    return (
+        sum(r.get("bytes", 0) for r in recent) / seconds,
+        sum(r.get("images", 0) for r in recent) / seconds,
+        len(recent),
+    )
+
+
+def estimate_seconds(mode, byte_count, image_count, path=HISTORY_FILE):
+    """
+    按记录的速度估算耗时：字节速度和图片速度分别估算后取较大者
+    （大图片受磁盘带宽限制，大量小图片受每个文件的开销限制）；没有记录时返回 None
+    """
+    throughput = recorded_throughput(mode, path)
+    if throughput is None:
+        return None
+    bytes_per_second, images_per_second, _ = throughput
+    estimates = [0.0]
+    if bytes_per_second > 0:
+        estimates.append(byte_count / bytes_per_second)
+    if images_per_second > 0:
+        estimates.append(image_count / images_per_second)
+    return max(estimates)
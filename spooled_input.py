@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+顺序读入的输入文档（适用于网络共享上的文档）
+功能：python-docx 和 zipfile 读取 .docx 时先读中央目录，再逐个部件 seek 读取，
+文档在 SMB 等网络共享上时每次 seek 都是一次高延迟的往返。
+SpooledDocument 先按大块顺序把整个文档读入内存（较小的文档）或本地临时文件（用 mmap 映射），
+之后所有读取都在本地完成，网络延迟每个文档只影响一次。
+
+未压缩（stored）的图片成员可以直接从内存/映射中切片得到 memoryview，不再经过 zipfile 复制。
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import zipfile
+import zlib
+
+# 每次从源文件顺序读取的块大小
+SPOOL_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 不超过该大小的文档读入内存，更大的文档写入本地临时文件再用 mmap 映射
+SPOOL_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# 临时文件所在目录，None 表示系统临时目录
+SPOOL_DIR = None
+
+_LOCAL_HEADER = struct.Struct("<4s22xHH")  # zip 本地文件头：签名 ... 文件名长度、扩展字段长度
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+class _BufferReader:
+    """内存/映射上的只读文件对象，每个读取者有自己的位置，不复制底层数据"""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer)
+        self.pos = 0
+
+    def read(self, n=-1):
+        end = len(self.view) if n is None or n < 0 else min(self.pos + n, len(self.view))
+        data = self.view[self.pos:end].tobytes()
+        self.pos = max(self.pos, end)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def close(self):
+        try:
+            self.view.release()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SpooledZipFile(zipfile.ZipFile):
+    """在 SpooledDocument 上打开的 ZipFile，额外支持 member_view"""
+
+    def __init__(self, spool):
+        self.spool = spool
+        super().__init__(spool.stream())
+
+    def member_view(self, member_name):
+        """
+        未压缩、未加密的成员直接返回内存/映射中的 memoryview（不复制），并校验 CRC；
+        压缩的成员返回 None，调用方按普通方式读取
+        """
+        info = self.getinfo(member_name)
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+        view = self.spool.view
+        offset = info.header_offset
+        signature, name_length, extra_length = _LOCAL_HEADER.unpack_from(view, offset)
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            return None
+        start = offset + _LOCAL_HEADER.size + name_length + extra_length
+        data = view[start:start + info.file_size]
+        if len(data) != info.file_size or zlib.crc32(data) != info.CRC:
+            return None  # 交给 zipfile 读取并报告错误
+        return data
+
+
+class SpooledDocument:
+    """
+    顺序读入后的文档
+    path:       原文档路径
+    local_path: 本地临时文件路径（读入内存时为 None），可交给其他进程重新打开
+    stream():   返回新的只读文件对象（供 python-docx 的 Document 使用）
+    open_zip(): 返回 SpooledZipFile
+    使用完毕后调用 close()（或作为 with 语句使用）释放内存/映射并删除临时文件
+    """
+
+    def __init__(self, doc_path, memory_limit=SPOOL_MEMORY_LIMIT, spool_dir=SPOOL_DIR,
+                 block_size=SPOOL_BLOCK_SIZE):
+        self.path = doc_path
+        self.local_path = None
+        self._mmap = None
+        self.size = os.path.getsize(doc_path)
+        with open(doc_path, "rb", buffering=0) as src:
+            if self.size <= memory_limit:
+                self.buffer = self._read_into_memory(src, block_size)
+            else:
+                self.buffer = self._spool_to_file(src, spool_dir, block_size)
+        self.view = memoryview(self.buffer)
+
+    def _read_into_memory(self, src, block_size):
+        buffer = bytearray(self.size)
+        view = memoryview(buffer)
+        pos = 0
+        while pos < self.size:
+            n = src.readinto(view[pos:pos + block_size])
+            if not n:
+                break
+            pos += n
+        view.release()
+        if pos != self.size:
+            raise IOError(f"读取文档不完整: {self.path}（{pos}/{self.size} 字节）")
+        return buffer
+
+    def _spool_to_file(self, src, spool_dir, block_size):
+        fd, self.local_path = tempfile.mkstemp(suffix=".docx", dir=spool_dir)
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                while True:
+                    chunk = src.read(block_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            with open(self.local_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._remove_local()
+            raise
+        return self._mmap
+
+    def stream(self):
+        return _BufferReader(self.view)
+
+    def open_zip(self):
+        return SpooledZipFile(self)
+
+    def _remove_local(self):
+        if self.local_path:
+            try:
+                os.remove(self.local_path)
+            except OSError:
+                pass
+            self.local_path = None
+
+    def close(self):
+        # 仍有成员切片未释放时无法立即释放，交给垃圾回收
+        if self.view is not None:
+            try:
+                self.view.release()
+            except BufferError:
+                pass
+            self.view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        self.buffer = None
+        self._remove_local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
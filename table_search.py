@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+表格全文索引（SQLite 倒排索引）
+功能：把一个目录（档案）下所有 .docx 的表格单元格文本分词后写入磁盘上的倒排索引，
+之后可以在毫秒级查出“哪个文档的哪个表格提到了某个地点/编号”，不必逐个打开文档翻看。
+
+分词：
+    中文（CJK 汉字）按单字和相邻两字（bigram）建立索引
+    字母和数字按连续的词建立索引（全角转半角、不区分大小写）
+查询时先用倒排索引找出候选单元格，再确认查询词确实是单元格文本的子串，所以不会有误报；
+多个查询词之间是“并且”的关系。
+
+索引按文档增量更新：文件大小和修改时间都没有变化的文档直接跳过，修改过的文档先删除旧记录再重建，
+已经不存在的文档从索引中删除。每个文档在一个事务中写入，中断后重新运行即可继续。
+
+示例：
+    python table_search.py index D:\\档案 --db 表格索引.db --cell 0,1
+    python table_search.py query 古交 GJ-001 --db 表格索引.db
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from datetime import datetime
+
+from fname_suggest import suggest_fname_cells
+from table_text_index import TableTextIndex
+
+DEFAULT_DB = "表格索引.db"
+
+# 查询默认返回的结果数
+QUERY_LIMIT = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE,
+    size        INTEGER,
+    mtime_ns    INTEGER,
+    table_count INTEGER,
+    indexed_at  TEXT
+);
+CREATE TABLE IF NOT EXISTS tables (
+    document_id INTEGER NOT NULL,
+    table_index INTEGER NOT NULL,
+    fname       TEXT,
+    PRIMARY KEY (document_id, table_index)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cells (
+    id          INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL,
+    table_index INTEGER NOT NULL,
+    row         INTEGER NOT NULL,
+    col         INTEGER NOT NULL,
+    text        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cells_document ON cells (document_id);
+CREATE TABLE IF NOT EXISTS terms (
+    id   INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    cell_id INTEGER NOT NULL,
+    PRIMARY KEY (term_id, cell_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_cell ON postings (cell_id);
+"""
+
+# 连续的字母数字，或连续的 CJK 汉字（基本区、扩展 A、兼容区）
+_TOKEN = re.compile(r"([0-9a-z]+)|([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)")
+
+
+# --- 1. 分词 ---
+
+def normalize(text):
+    """全角转半角、统一大小写，索引和查询都先经过这一步"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def tokenize(text):
+    """文本（已 normalize）的词项集合：字母数字按词，汉字按单字和相邻两字"""
+    terms = set()
+    for match in _TOKEN.finditer(text):
+        word, han = match.groups()
+        if word:
+            terms.add(word)
+        else:
+            terms.update(han)
+            terms.update(han[i:i + 2] for i in range(len(han) - 1))
+    return terms
+
+
+# --- 2. 建立索引 ---
+
+def iter_documents(root):
+    """目录下（含子目录）所有 .docx 的绝对路径，忽略 Word 的 ~$ 临时文件"""
+    for dir_path, _, file_names in os.walk(root):
+        for name in sorted(file_names):
+            if name.lower().endswith(".docx") and not name.startswith("~$"):
+                yield os.path.abspath(os.path.join(dir_path, name))
+
+
+def table_fnames(text_index, target_cell):
+    """每个表格的 Fname：target_cell 为 None 时使用该文档得分最高的建议坐标；没有内容时为 None"""
+    if target_cell is None:
+        candidates = suggest_fname_cells(text_index, top=1)
+        if not candidates or candidates[0].score <= 0:
+            return [None] * text_index.table_count
+        target_cell = (candidates[0].row, candidates[0].col)
+    fnames = []
+    for text in text_index.column(*target_cell):
+        text = (text or "").strip()
+        fnames.append(text or None)
+    return fnames
+
+
+def table_cells(text_index, table_idx):
+    """
+    表格中需要索引的单元格 [(行, 列, 文本编号)]
+    同一表格中相同的文本只取第一次出现的位置（合并单元格在展开后会重复出现）
+    """
+    strings = text_index.strings
+    cell_ids = text_index.cell_ids
+    row_offsets = text_index.row_offsets
+    first_row = text_index.table_row_offsets[table_idx]
+    seen = set()
+    cells = []
+    for r in range(text_index.row_count(table_idx)):
+        start = row_offsets[first_row + r]
+        end = row_offsets[first_row + r + 1]
+        for c, string_id in enumerate(cell_ids[start:end]):
+            if string_id in seen:
+                continue
+            seen.add(string_id)
+            if strings[string_id].strip():
+                cells.append((r, c, string_id))
+    return cells
+
+
+class TableSearchIndex:
+    """磁盘上的倒排索引：index_directory / index_document 增量写入，search 查询"""
+
+    def __init__(self, db_path=DEFAULT_DB):
+        folder = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(folder, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._term_ids = None  # 建立索引时才加载全部词项
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # --- 写入 ---
+
+    def _term_id_map(self):
+        if self._term_ids is None:
+            self._term_ids = dict(self.conn.execute("SELECT term, id FROM terms"))
+        return self._term_ids
+
+    def _forget(self, document_id):
+        self.conn.execute(
+            "DELETE FROM postings WHERE cell_id IN (SELECT id FROM cells WHERE document_id = ?)", (document_id,)
+        )
+        self.conn.execute("DELETE FROM cells WHERE document_id = ?", (document_id,))
+        self.conn.execute("DELETE FROM tables WHERE document_id = ?", (document_id,))
+
+    def index_document(self, doc_path, target_cell=None, stat=None):
+        """
+        解析并索引一个文档（替换它原有的记录），返回索引的单元格数
+        target_cell 为 Fname 坐标，None 表示使用建议坐标
+        """
+        doc_path = os.path.abspath(doc_path)
+        stat = stat or os.stat(doc_path)
+        text_index = TableTextIndex.build(doc_path)
+        fnames = table_fnames(text_index, target_cell)
+        term_ids = self._term_id_map()
+
+        with self.conn:  # 一个事务
+            row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (doc_path,)).fetchone()
+            values = (stat.st_size, stat.st_mtime_ns, text_index.table_count,
+                      datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            if row is None:
+                document_id = self.conn.execute(
+                    "INSERT INTO documents (path, size, mtime_ns, table_count, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (doc_path,) + values,
+                ).lastrowid
+            else:
+                document_id = row[0]
+                self._forget(document_id)
+                self.conn.execute(
+                    "UPDATE documents SET size = ?, mtime_ns = ?, table_count = ?, indexed_at = ? WHERE id = ?",
+                    values + (document_id,),
+                )
+            self.conn.executemany(
+                "INSERT INTO tables (document_id, table_index, fname) VALUES (?, ?, ?)",
+                [(document_id, t, fname) for t, fname in enumerate(fnames)],
+            )
+
+            # 单元格编号在本事务内连续分配；每个不同的文本只分词一次
+            next_cell = (self.conn.execute("SELECT MAX(id) FROM cells").fetchone()[0] or 0) + 1
+            cells = []
+            postings = []
+            new_terms = []
+            string_terms = {}
+            strings = text_index.strings
+            for t in range(text_index.table_count):
+                for r, c, string_id in table_cells(text_index, t):
+                    ids = string_terms.get(string_id)
+                    if ids is None:
+                        ids = []
+                        for term in tokenize(normalize(strings[string_id])):
+                            term_id = term_ids.get(term)
+                            if term_id is None:
+                                term_id = len(term_ids) + 1
+                                term_ids[term] = term_id
+                                new_terms.append((term_id, term))
+                            ids.append(term_id)
+                        string_terms[string_id] = ids
+                    cells.append((next_cell, document_id, t, r, c, strings[string_id]))
+                    postings.extend((term_id, next_cell) for term_id in ids)
+                    next_cell += 1
+            try:
+                self.conn.executemany("INSERT INTO terms (id, term) VALUES (?, ?)", new_terms)
+                self.conn.executemany(
+                    "INSERT INTO cells (id, document_id, table_index, row, col, text) VALUES (?, ?, ?, ?, ?, ?)", cells
+                )
+                self.conn.executemany("INSERT INTO postings (term_id, cell_id) VALUES (?, ?)", postings)
+            except BaseException:
+                self._term_ids = None  # 事务回滚后内存中的词项编号失效，下次重新加载
+                raise
+        return len(cells)
+
+    def index_directory(self, root, target_cell=None):
+        """
+        增量索引目录下的所有文档，返回 (新索引或重建的文档数, 未变化跳过的文档数, 删除的文档数)
+        """
+        root = os.path.abspath(root)
+        known = {
+            path: (doc_id, size, mtime_ns)
+            for doc_id, path, size, mtime_ns in self.conn.execute("SELECT id, path, size, mtime_ns FROM documents")
+        }
+        indexed = skipped = 0
+        present = set()
+        for doc_path in iter_documents(root):
+            present.add(doc_path)
+            try:
+                stat = os.stat(doc_path)
+            except OSError:
+                continue
+            entry = known.get(doc_path)
+            if entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+                skipped += 1
+                continue
+            try:
+                count = self.index_document(doc_path, target_cell, stat)
+            except Exception as e:
+                print(f"索引失败: {doc_path}: {e}")
+                continue
+            indexed += 1
+            print(f"已索引 {doc_path}（{count} 个单元格）")
+
+        # 该目录下已经不存在的文档
+        prefix = os.path.join(root, "")
+        removed = [
+            doc_id for path, (doc_id, _, _) in known.items()
+            if path.startswith(prefix) and path not in present
+        ]
+        for doc_id in removed:
+            with self.conn:
+                self._forget(doc_id)
+                self.conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return indexed, skipped, len(removed)
+
+    # --- 查询 ---
+
+    def _term_subquery(self, term):
+        """
+        返回 (选出候选词项 id 的子查询, 参数)：汉字词项精确匹配；字母数字词项按前缀匹配（查询 GJ-00 也能找到 GJ-001）
+        候选词项留在 SQL 中，不把 id 逐个绑定为参数，短前缀匹配到大量词项时也不会超出 SQLite 的参数个数上限
+        """
+        if term.isascii():
+            return "SELECT id FROM terms WHERE term >= ? AND term < ?", (term, term + "\uffff")
+        return "SELECT id FROM terms WHERE term = ?", (term,)
+
+    def search(self, query, limit=QUERY_LIMIT):
+        """
+        返回 [(文档路径, 表格序号, 行, 列, Fname, 单元格文本)]，按文档、表格顺序排列
+        query 中用空格分隔的每个词都必须出现在同一个单元格中
+        """
+        phrases = [normalize(p) for p in query.split()]
+        terms = set()
+        for phrase in phrases:
+            terms.update(tokenize(phrase))
+        if not terms:
+            return []
+
+        # 只用候选最少的一个词项从倒排索引取单元格，其余条件由子串确认
+        best = None
+        for term in terms:
+            subquery, params = self._term_subquery(term)
+            count = self.conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM postings WHERE term_id IN ({subquery}) LIMIT 100000)",
+                params,
+            ).fetchone()[0]
+            if count == 0:
+                return []
+            if best is None or count < best[0]:
+                best = (count, subquery, params)
+
+        _, subquery, params = best
+        rows = self.conn.execute(
+            f"""
+            SELECT d.path, c.table_index, c.row, c.col, t.fname, c.text
+            FROM cells c
+            JOIN documents d ON d.id = c.document_id
+            LEFT JOIN tables t ON t.document_id = c.document_id AND t.table_index = c.table_index
+            WHERE c.id IN (SELECT cell_id FROM postings WHERE term_id IN ({subquery}))
+            ORDER BY c.id
+            """,
+            params,
+        )
+        hits = []
+        for row in rows:
+            text = normalize(row[5])
+            if all(phrase in text for phrase in phrases):
+                hits.append(row)
+                if len(hits) >= limit:
+                    break
+        return hits
+
+
+# --- 3. 命令行 ---
+
+def parse_cell(text):
+    try:
+        row_idx, col_idx = (int(x) for x in text.replace("，", ",").split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError("格式应为 行,列，例如 0,1")
+    return row_idx, col_idx
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="表格全文索引：建立索引并查询哪个文档的哪个表格提到了某个词")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = sub.add_parser("index", help="增量索引目录下的所有 .docx")
+    index_parser.add_argument("root", help="文档目录（含子目录）")
+    index_parser.add_argument("--db", default=DEFAULT_DB, help=f"索引数据库，默认 {DEFAULT_DB}")
+    index_parser.add_argument("--cell", type=parse_cell,
+                              help="Fname 单元格坐标 行,列；不指定时按每个文档的建议坐标")
+
+    query_parser = sub.add_parser("query", help="查询关键词")
+    query_parser.add_argument("words", nargs="+", help="关键词，多个词须同时出现在一个单元格中")
+    query_parser.add_argument("--db", default=DEFAULT_DB, help=f"索引数据库，默认 {DEFAULT_DB}")
+    query_parser.add_argument("--limit", type=int, default=QUERY_LIMIT, help=f"最多显示的结果数，默认 {QUERY_LIMIT}")
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        if not os.path.isdir(args.root):
+            parser.error(f"目录不存在: {args.root}")
+        start = time.perf_counter()
+        with TableSearchIndex(args.db) as index:
+            indexed, skipped, removed = index.index_directory(args.root, args.cell)
+        print(f"索引完成：新索引 {indexed} 个文档，未变化跳过 {skipped} 个，删除 {removed} 个，"
+              f"用时 {time.perf_counter() - start:.1f} 秒")
+        return 0
+
+    if not os.path.exists(args.db):
+        parser.error(f"索引数据库不存在: {args.db}，请先运行 index")
+    start = time.perf_counter()
+    with TableSearchIndex(args.db) as index:
+        hits = index.search(" ".join(args.words), args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for path, table_index, row, col, fname, text in hits:
+        snippet = " ".join(text.split())[:60]
+        print(f"{path} | 表格 {table_index + 1} | 单元格 ({row},{col}) | Fname: {fname or '-'} | {snippet}")
+    print(f"共 {len(hits)} 条结果（用时 {elapsed:.1f} 毫秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
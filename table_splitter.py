@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+按表格拆分文档
+功能：把文档中的每个表格拆分为一个单独的 .docx（以 Fname 命名），保留原表格的 XML
+（图片、格式、合并单元格都不变），并且只带上该表格引用的图片等部件。
+
+拆分在 zip 层完成，不经过 python-docx 对象：
+- 公共骨架只准备一次：样式、编号、主题、页眉页脚、文档属性等部件的原始字节，
+  以及正文外框（根元素的命名空间声明、正文最后的节属性 w:sectPr）
+- 每个表格：原表格 XML 直接序列化后放入外框，关系文件只保留骨架关系和该表格引用的关系，
+  被引用的图片等部件按原样从源 zip 复制（已压缩的图片不再压缩）
+
+命令行：
+    python table_splitter.py 文档.docx 输出目录 --cell 0,1
+"""
+
+import argparse
+import io
+import os
+import re
+import sys
+import zipfile
+from copy import deepcopy
+from xml.sax.saxutils import quoteattr
+
+from lxml import etree
+
+import docx_stream
+from docx_stream import DOCUMENT_PART, R_NS, W_BODY, W_P, W_TBL, W_NS
+from output_writers import STORED_EXTENSIONS
+from path_planner import dedupe_names
+from table_text_index import TableTextIndex
+
+CONTENT_TYPES_PART = "[Content_Types].xml"
+PACKAGE_RELS_PART = "_rels/.rels"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+W_SECTPR = f"{{{W_NS}}}sectPr"
+
+# 正文部件的这些关系属于公共骨架，每个拆分出的文档都保留（按关系类型的最后一段判断）
+SKELETON_REL_TYPES = {
+    "styles", "stylesWithEffects", "settings", "webSettings", "fontTable", "theme", "numbering",
+    "footnotes", "endnotes", "header", "footer", "customXml", "glossaryDocument", "people",
+}
+
+# 表格 XML 中所有关系命名空间的属性值（r:embed、r:id、r:link 等）
+_REL_ATTRS = etree.XPath("descendant-or-self::*/@*[namespace-uri()=$ns]")
+
+_BODY_MARKER = b"<!--TABLE-->"
+_ILLEGAL = re.compile(r'[\\/*?:"<>|\r\n\t]')
+
+
+def read_relationships(zf, part_name):
+    """读取部件的全部关系，返回 [(Id, Type, Target, TargetMode)]，部件没有关系时为空列表"""
+    try:
+        data = zf.read(docx_stream.rels_part_for(part_name))
+    except KeyError:
+        return []
+    root = etree.fromstring(data)
+    return [
+        (rel.get("Id"), rel.get("Type"), rel.get("Target"), rel.get("TargetMode"))
+        for rel in root.iter(f"{{{docx_stream.PKG_REL_NS}}}Relationship")
+    ]
+
+
+def relationships_xml(rels):
+    lines = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+             f'<Relationships xmlns="{docx_stream.PKG_REL_NS}">']
+    for rel_id, rel_type, target, mode in rels:
+        mode_attr = f" TargetMode={quoteattr(mode)}" if mode else ""
+        lines.append(f"<Relationship Id={quoteattr(rel_id)} Type={quoteattr(rel_type)} "
+                     f"Target={quoteattr(target)}{mode_attr}/>")
+    lines.append("</Relationships>")
+    return "".join(lines).encode("utf-8")
+
+
+def part_closure(zf, part_name, found):
+    """把部件、它的关系文件以及关系指向的内部部件（递归）加入 found"""
+    if part_name in found or part_name not in zf.NameToInfo:
+        return
+    found.add(part_name)
+    rels_part = docx_stream.rels_part_for(part_name)
+    if rels_part in zf.NameToInfo:
+        found.add(rels_part)
+    for _, _, target, mode in read_relationships(zf, part_name):
+        if mode != "External":
+            part_closure(zf, docx_stream.resolve_part_name(part_name, target), found)
+
+
+def read_document_frame(zf, part_name=DOCUMENT_PART):
+    """
+    扫描一遍正文，得到拆分文档共用的外框：
+    (XML 开头到表格位置的字节, 表格位置之后到结尾的字节)
+    外框保留原根元素的命名空间声明和属性，以及正文最后的节属性（页面大小、页眉页脚等）
+    """
+    sect_pr = None
+    with zf.open(part_name) as f:
+        context = etree.iterparse(f, events=("end",), tag=(W_P, W_TBL, W_SECTPR), huge_tree=True)
+        for _, elem in context:
+            parent = elem.getparent()
+            if parent is None or parent.tag != W_BODY:
+                continue
+            if elem.tag == W_SECTPR:
+                sect_pr = deepcopy(elem)
+            else:
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del parent[0]
+        source_root = context.root
+
+    root = etree.Element(source_root.tag, attrib=dict(source_root.attrib), nsmap=source_root.nsmap)
+    body = etree.SubElement(root, W_BODY)
+    body.append(etree.Comment("TABLE"))
+    body.append(etree.Element(W_P))  # 正文以段落结尾，Word 才不会提示修复
+    if sect_pr is not None:
+        body.append(sect_pr)
+    data = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+    head, tail = data.split(_BODY_MARKER, 1)
+    return head, tail
+
+
+class TableSplitter:
+    """
+    在一个已打开的源 zip 上准备公共骨架，之后每次 write_table 写出一个只含该表格的 .docx
+    表格元素可以来自 docx_stream 的流式解析（TableRecord.element），也可以是 python-docx 的 table._element
+    """
+
+    def __init__(self, zf, part_name=DOCUMENT_PART):
+        self.zf = zf
+        self.part_name = part_name
+        self.frame_head, self.frame_tail = read_document_frame(zf, part_name)
+
+        # 正文的关系：骨架关系每个文档都保留，其余的只在表格引用时保留
+        self.document_rels = {}
+        self.skeleton_rels = []
+        skeleton = set()
+        for rel in read_relationships(zf, part_name):
+            rel_id, rel_type, target, mode = rel
+            self.document_rels[rel_id] = rel
+            if rel_type.rsplit("/", 1)[-1] in SKELETON_REL_TYPES:
+                self.skeleton_rels.append(rel)
+                if mode != "External":
+                    part_closure(zf, docx_stream.resolve_part_name(part_name, target), skeleton)
+        # 包级关系指向的文档属性等（正文部件本身除外）
+        for _, _, target, mode in read_relationships(zf, ""):
+            member = docx_stream.resolve_part_name("", target)
+            if mode != "External" and member != part_name:
+                part_closure(zf, member, skeleton)
+        skeleton.add(PACKAGE_RELS_PART)
+        skeleton.discard(part_name)
+        skeleton.discard(docx_stream.rels_part_for(part_name))
+        # 骨架部件只读取、压缩一次，打包成一个只含骨架的 zip，每个表格在它的副本上追加成员
+        self.skeleton_members = sorted(skeleton)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as out:
+            for name in self.skeleton_members:
+                info = zipfile.ZipInfo(name, date_time=zf.getinfo(name).date_time)
+                out.writestr(info, zf.read(name), zipfile.ZIP_DEFLATED)
+        self.skeleton_zip = buffer.getvalue()
+
+        root = etree.fromstring(zf.read(CONTENT_TYPES_PART))
+        self.content_defaults = [
+            (d.get("Extension"), d.get("ContentType")) for d in root.iter(f"{{{CT_NS}}}Default")
+        ]
+        self.content_overrides = {
+            o.get("PartName").lstrip("/"): o.get("ContentType") for o in root.iter(f"{{{CT_NS}}}Override")
+        }
+
+    def content_types_xml(self, members, extra_defaults=()):
+        """[Content_Types].xml：源文档的全部 Default，加上 extra_defaults 中源文档没有的扩展名；Override 只保留 members"""
+        defaults = list(self.content_defaults)
+        known = {ext.lower() for ext, _ in defaults}
+        defaults.extend((ext, content_type) for ext, content_type in extra_defaults if ext.lower() not in known)
+        lines = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>', f'<Types xmlns="{CT_NS}">']
+        for ext, content_type in defaults:
+            lines.append(f"<Default Extension={quoteattr(ext)} ContentType={quoteattr(content_type)}/>")
+        for member in members:
+            content_type = self.content_overrides.get(member)
+            if content_type:
+                lines.append(f"<Override PartName={quoteattr('/' + member)} ContentType={quoteattr(content_type)}/>")
+        lines.append("</Types>")
+        return "".join(lines).encode("utf-8")
+
+    def write_table(self, tbl, dst):
+        """把表格元素写成一个完整的 .docx 到 dst（路径或可写的文件对象）"""
+        table_xml = etree.tostring(tbl, encoding="UTF-8")
+        rels = list(self.skeleton_rels)
+        skeleton_ids = {rel[0] for rel in rels}
+        extra = set()
+        for rel_id in dict.fromkeys(str(value) for value in _REL_ATTRS(tbl, ns=R_NS)):
+            rel = self.document_rels.get(rel_id)
+            if rel is None or rel_id in skeleton_ids:
+                continue
+            rels.append(rel)
+            if rel[3] != "External":
+                part_closure(self.zf, docx_stream.resolve_part_name(self.part_name, rel[2]), extra)
+
+        extra = sorted(extra)
+        buffer = io.BytesIO(self.skeleton_zip)
+        buffer.seek(0, io.SEEK_END)
+        with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as out:
+            out.writestr(self.part_name, self.frame_head + table_xml + self.frame_tail)
+            out.writestr(docx_stream.rels_part_for(self.part_name), relationships_xml(rels))
+            out.writestr(CONTENT_TYPES_PART, self.content_types_xml(self.skeleton_members + extra + [self.part_name]))
+            for name in extra:
+                source = self.zf.getinfo(name)
+                info = zipfile.ZipInfo(name, date_time=source.date_time)
+                ext = name.rsplit(".", 1)[-1].lower()
+                info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                with out.open(info, "w", force_zip64=source.file_size > zipfile.ZIP64_LIMIT) as f:
+                    docx_stream.copy_member(self.zf, name, f)
+
+        if hasattr(dst, "write"):
+            dst.write(buffer.getbuffer())
+        else:
+            with open(dst, "wb") as f:
+                f.write(buffer.getbuffer())
+
+
+def safe_name(text, idx):
+    """表格的输出文件名（不含扩展名）：Fname 去除非法字符，为空时使用“表格{idx}”"""
+    name = _ILLEGAL.sub("-", (text or "").strip()).strip()
+    return name or f"表格{idx}"
+
+
+def split_document(doc_path, output_dir, target_cell=None):
+    """
+    把文档的每个表格拆分为 output_dir 下的一个 .docx
+    target_cell 为 (行, 列) 时用该单元格的文本命名（重名依次加 (2)、(3)…），否则命名为“表格N”
+    返回写出的文件数量
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with docx_stream.open_docx(doc_path) as zf:
+        text_index = TableTextIndex.from_zip(zf)
+        names = []
+        for i in range(text_index.table_count):
+            text = None
+            if target_cell is not None:
+                try:
+                    text = text_index.cell(i, *target_cell)
+                except IndexError:
+                    pass
+            names.append(safe_name(text, i + 1))
+        names = dedupe_names(names)
+
+        splitter = TableSplitter(zf)
+        count = 0
+        table_idx = 0
+        # 只需要表格的 XML，不解析单元格文本和图片
+        for elem in docx_stream.iter_body_elements(zf):
+            if elem.tag != W_TBL:
+                continue
+            path = os.path.join(output_dir, names[table_idx] + ".docx")
+            try:
+                splitter.write_table(elem, path)
+                count += 1
+            except Exception as e:
+                print(f"表格 {table_idx + 1} 拆分失败: {e}")
+            table_idx += 1
+        return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把文档中的每个表格拆分为一个单独的 .docx（保留图片和格式）")
+    parser.add_argument("doc", help="Word 文档 (.docx)")
+    parser.add_argument("output", help="输出目录")
+    parser.add_argument("--cell", help="用于命名的单元格坐标 行,列（从 0 开始），不指定时命名为“表格N”")
+    args = parser.parse_args(argv)
+
+    target_cell = None
+    if args.cell:
+        try:
+            row_idx, col_idx = (int(x) for x in args.cell.replace("，", ",").split(","))
+            target_cell = (row_idx, col_idx)
+        except ValueError:
+            print("--cell 格式错误，应为 行,列")
+            return 1
+    count = split_document(args.doc, args.output, target_cell)
+    print(f"已拆分 {count} 个表格到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
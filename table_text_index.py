@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+表格文本索引
+功能：一次流式解析 word/document.xml，得到文档中所有表格（以及正文段落）的文本，
+供预览、Fname 解析、表格内容/上下文文件等所有需要单元格文本的地方读取，
+不再反复通过 python-docx 的 cell.text 重新计算。
+
+存储方式为列式：
+- strings:           去重（驻留）后的字符串仓库，相同文本只存一份（表头标签等在各表格中大量重复）
+- cell_ids:          所有单元格按表格、行、列顺序排列的字符串编号 array('I')
+- row_offsets:       每一行在 cell_ids 中的起始位置 array('I')（多一个结尾哨兵）
+- table_row_offsets: 每个表格在 row_offsets 中的起始行 array('I')（多一个结尾哨兵）
+- body_kinds / body_refs: 正文元素顺序（段落的字符串编号，或表格序号），用于上下文信息
+- image_ids / table_image_offsets: 每个表格引用的图片部件名（字符串编号），按文档顺序
+除字符串本身外没有逐单元格的 Python 对象，查询直接按偏移取值。
+
+to_bytes / from_bytes 把索引保存为紧凑的二进制格式（数组按原样写出，字符串以 \\0 分隔），
+供 document_cache 持久缓存使用。
+"""
+
+import struct
+import sys
+from array import array
+
+import docx_stream
+
+BODY_PARAGRAPH = 0
+BODY_TABLE = 1
+
+# 二进制格式：文件头（标识、版本、字节序）后依次是各个数组段，每段前为 8 字节长度
+FORMAT_MAGIC = b"MWTI"
+# 2：合并单元格的图片引用按 python-docx 的方式展开（见 docx_stream.parse_table），旧缓存重新解析
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sHB")
+_SECTION = struct.Struct("<Q")
+_ARRAY_FIELDS = (
+    "cell_ids", "row_offsets", "table_row_offsets", "table_positions", "body_refs",
+    "image_ids", "table_image_offsets",
+)
+
+
+class TableTextIndex:
+    """文档中所有表格的单元格文本，单元格文本与 python-docx 的 cell.text 一致（未去除首尾空白）"""
+
+    __slots__ = (
+        "strings", "cell_ids", "row_offsets", "table_row_offsets",
+        "table_positions", "body_kinds", "body_refs", "image_ids", "table_image_offsets", "_intern",
+    )
+
+    def __init__(self):
+        self.strings = [""]
+        self._intern = {"": 0}
+        self.cell_ids = array("I")
+        self.row_offsets = array("I", [0])
+        self.table_row_offsets = array("I", [0])
+        self.table_positions = array("I")  # 每个表格在正文元素中的位置
+        self.body_kinds = bytearray()
+        self.body_refs = array("I")
+        self.image_ids = array("I")
+        self.table_image_offsets = array("I", [0])
+
+    # --- 构建 ---
+
+    @classmethod
+    def build(cls, doc_path):
+        """打开文档并在一次解析中建立索引"""
+        with docx_stream.open_docx(doc_path) as zf:
+            return cls.from_zip(zf)
+
+    @classmethod
+    def from_zip(cls, zf):
+        index = cls()
+        rels = docx_stream.read_part_rels(zf)
+        for kind, _, item in docx_stream.iter_body_items(zf):
+            if kind == "tbl":
+                index.add_table(item.rows, [rels[blip[2]] for blip in item.blips if blip[2] in rels])
+            else:
+                index.add_paragraph(item)
+        index.finish()
+        return index
+
+    def intern(self, text):
+        string_id = self._intern.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self._intern[text] = string_id
+        return string_id
+
+    def add_paragraph(self, text):
+        self.body_kinds.append(BODY_PARAGRAPH)
+        self.body_refs.append(self.intern(text))
+
+    def add_table(self, rows, image_parts=()):
+        self.table_positions.append(len(self.body_kinds))
+        self.body_kinds.append(BODY_TABLE)
+        self.body_refs.append(self.table_count)
+        intern = self.intern
+        for row in rows:
+            self.cell_ids.extend(intern(text) for text in row)
+            self.row_offsets.append(len(self.cell_ids))
+        self.table_row_offsets.append(len(self.row_offsets) - 1)
+        self.image_ids.extend(intern(name) for name in image_parts)
+        self.table_image_offsets.append(len(self.image_ids))
+
+    def finish(self):
+        """构建结束后丢弃驻留用的字典，只保留紧凑的数组和字符串仓库"""
+        self._intern = None
+
+    # --- 保存与读取 ---
+
+    def to_bytes(self):
+        byteorder = 0 if sys.byteorder == "little" else 1
+        sections = [getattr(self, name).tobytes() for name in _ARRAY_FIELDS]
+        sections.append(bytes(self.body_kinds))
+        sections.append("\0".join(self.strings).encode("utf-8"))  # XML 文本中不会出现 \0
+        parts = [_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, byteorder)]
+        for data in sections:
+            parts.append(_SECTION.pack(len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """读取 to_bytes 的结果；格式、版本或字节序不符时抛出 ValueError"""
+        view = memoryview(data)
+        magic, version, byteorder = _HEADER.unpack_from(view, 0)
+        if magic != FORMAT_MAGIC or version != FORMAT_VERSION:
+            raise ValueError("不是可识别的表格文本索引")
+        if byteorder != (0 if sys.byteorder == "little" else 1) or array("I").itemsize != 4:
+            raise ValueError("索引的字节序或整数宽度与本机不同")
+        pos = _HEADER.size
+        sections = []
+        for _ in range(len(_ARRAY_FIELDS) + 2):
+            (length,) = _SECTION.unpack_from(view, pos)
+            pos += _SECTION.size
+            if pos + length > len(view):
+                raise ValueError("索引数据不完整")
+            sections.append(view[pos:pos + length])
+            pos += length
+
+        index = cls()
+        for name, section in zip(_ARRAY_FIELDS, sections):
+            values = array("I")
+            values.frombytes(section)
+            setattr(index, name, values)
+        index.body_kinds = bytearray(sections[-2])
+        index.strings = bytes(sections[-1]).decode("utf-8").split("\0")
+        index.finish()
+        return index
+
+    # --- 查询 ---
+
+    @property
+    def table_count(self):
+        return len(self.table_row_offsets) - 1
+
+    def __len__(self):
+        return self.table_count
+
+    def row_count(self, table_idx):
+        return self.table_row_offsets[table_idx + 1] - self.table_row_offsets[table_idx]
+
+    def _row_span(self, table_idx, row_idx):
+        if not 0 <= table_idx < self.table_count:
+            raise IndexError(f"表格序号超出范围: {table_idx}")
+        if not 0 <= row_idx < self.row_count(table_idx):
+            raise IndexError(f"行号超出范围: {row_idx}")
+        g = self.table_row_offsets[table_idx] + row_idx
+        return self.row_offsets[g], self.row_offsets[g + 1]
+
+    def cell(self, table_idx, row_idx, col_idx):
+        """与 table.cell(r, c).text 对应，坐标不存在时抛出 IndexError"""
+        start, end = self._row_span(table_idx, row_idx)
+        if not 0 <= col_idx < end - start:
+            raise IndexError(f"列号超出范围: {col_idx}")
+        return self.strings[self.cell_ids[start + col_idx]]
+
+    def row(self, table_idx, row_idx):
+        start, end = self._row_span(table_idx, row_idx)
+        strings = self.strings
+        return [strings[i] for i in self.cell_ids[start:end]]
+
+    def rows(self, table_idx, start=0, stop=None):
+        """第 table_idx 个表格中 [start, stop) 行的文本，按行排列"""
+        count = self.row_count(table_idx)
+        stop = count if stop is None else min(stop, count)
+        return [self.row(table_idx, r) for r in range(start, stop)]
+
+    def column(self, row_idx, col_idx):
+        """每个表格在 (row_idx, col_idx) 处的文本，坐标不存在的表格为 None"""
+        values = []
+        for t in range(self.table_count):
+            try:
+                values.append(self.cell(t, row_idx, col_idx))
+            except IndexError:
+                values.append(None)
+        return values
+
+    def image_parts(self, table_idx):
+        """第 table_idx 个表格引用的图片部件名（zip 内成员名），按文档顺序，可能重复"""
+        start, end = self.table_image_offsets[table_idx], self.table_image_offsets[table_idx + 1]
+        strings = self.strings
+        return [strings[i] for i in self.image_ids[start:end]]
+
+    def iter_body(self, start=0, stop=None):
+        """按正文顺序产出 ("p", 段落文本) 或 ("tbl", 表格序号)"""
+        stop = len(self.body_kinds) if stop is None else min(stop, len(self.body_kinds))
+        for pos in range(max(0, start), stop):
+            if self.body_kinds[pos] == BODY_TABLE:
+                yield "tbl", self.body_refs[pos]
+            else:
+                yield "p", self.strings[self.body_refs[pos]]
+
+    def context(self, table_idx, count):
+        """表格前、后各 count 个正文元素，返回 (前内容, 后内容)"""
+        pos = self.table_positions[table_idx]
+        return (
+            list(self.iter_body(pos - count, pos)),
+            list(self.iter_body(pos + 1, pos + 1 + count)),
+        )
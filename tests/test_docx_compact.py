@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+docx_compact 的回归测试：重复图片合并后，保留的部件要满足所有引用（包括原先指向重复部件的引用）的显示尺寸
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Inches
+from lxml import etree
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docx_compact  # noqa: E402
+
+PHOTO_SIZE = (1500, 1000)
+
+
+def photo(seed):
+    buffer = io.BytesIO()
+    Image.effect_noise(PHOTO_SIZE, 30 + seed).convert("RGB").save(buffer, "JPEG", quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+def make_duplicate_document(path, crop_large=False):
+    """
+    同一张照片作为两个不同的部件嵌入：第一个显示为 0.5 英寸宽，第二个显示为 6 英寸宽
+    crop_large 为 True 时第二处引用带裁剪（a:srcRect），所需像素无法按显示尺寸计算
+    """
+    document = Document()
+    document.add_paragraph().add_run().add_picture(photo(1), width=Inches(0.5))
+    large = document.add_paragraph().add_run().add_picture(photo(2), width=Inches(6))
+    if crop_large:
+        blip = large._inline.xpath(".//a:blip")[0]
+        blip.addnext(etree.Element(qn("a:srcRect"), {"l": "1000"}))
+    staging = str(path) + ".tmp"
+    document.save(staging)
+
+    # python-docx 会合并相同的图片，这里把第二个部件的内容改为与第一个相同，得到两个重复的部件
+    with zipfile.ZipFile(staging) as src, zipfile.ZipFile(path, "w") as out:
+        first = src.read("word/media/image1.jpg")
+        for info in src.infolist():
+            data = first if info.filename == "word/media/image2.jpg" else src.read(info)
+            out.writestr(info.filename, data)
+    os.remove(staging)
+
+
+def compacted_sizes(tmp_path, crop_large):
+    doc_path = tmp_path / "照片.docx"
+    output_path = tmp_path / "照片_compact.docx"
+    make_duplicate_document(doc_path, crop_large)
+    stats = docx_compact.compact_document(str(doc_path), str(output_path), dpi=150)
+    assert stats["duplicates"] == 1
+    with zipfile.ZipFile(output_path) as zf:
+        media = sorted(name for name in zf.namelist() if name.startswith("word/media/"))
+        return {name: Image.open(io.BytesIO(zf.read(name))).size for name in media}
+
+
+@pytest.mark.parametrize("crop_large", [False, True], ids=["extent", "cropped"])
+def test_kept_part_covers_merged_duplicate_size(tmp_path, crop_large):
+    sizes = compacted_sizes(tmp_path, crop_large)
+
+    # 重复部件已合并，6 英寸的引用改为指向保留的部件
+    assert list(sizes) == ["word/media/image1.jpg"]
+    if crop_large:
+        # 重复部件的引用无法确定尺寸：保留的部件不缩小
+        assert sizes["word/media/image1.jpg"] == PHOTO_SIZE
+    else:
+        # 按较大的 6 英寸 × 150 DPI 缩小，而不是 0.5 英寸的 75 像素
+        assert sizes["word/media/image1.jpg"] == (900, 600)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+低内存模式的内存回归测试
+用 N 张和 4N 张图片的文档分别运行 process_document(..., low_memory=True)，
+tracemalloc 记录的峰值都必须低于同一个固定上限：峰值不能随图片数量增长。
+经过写出调度（--write-batch）时同样如此：排队的图片写入临时文件，不读入内存。
+"""
+
+import io
+import os
+import sys
+import tracemalloc
+
+import pytest
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import advanced_word_processor as awp  # noqa: E402
+
+# 每张图片约 0.2 MB（噪声 PNG 几乎不可压缩），4N 张合计远大于上限
+IMAGE_COUNT = 25
+IMAGE_PIXELS = 260
+IMAGES_PER_TABLE = 2
+PEAK_BUDGET = 3 * 1024 * 1024
+
+
+def make_document(path, image_count):
+    """每个表格第一行为“编号 | Fname”，第二行放 IMAGES_PER_TABLE 张各不相同的图片"""
+    document = Document()
+    for t in range(0, image_count, IMAGES_PER_TABLE):
+        table = document.add_table(rows=2, cols=IMAGES_PER_TABLE)
+        table.cell(0, 0).text = "编号"
+        table.cell(0, 1).text = f"GJ-{t // IMAGES_PER_TABLE:04d}"
+        for c in range(min(IMAGES_PER_TABLE, image_count - t)):
+            buffer = io.BytesIO()
+            Image.effect_noise((IMAGE_PIXELS, IMAGE_PIXELS), 40 + t + c).convert("RGB").save(buffer, "PNG")
+            buffer.seek(0)
+            table.cell(1, c).paragraphs[0].add_run().add_picture(buffer, width=Inches(1))
+        document.add_paragraph()
+    document.save(path)
+
+
+def peak_low_memory(doc_path, output_dir, write_limits=None):
+    awp.reset_statistics()
+    awp.WRITE_LIMITS = write_limits
+    tracemalloc.start()
+    try:
+        awp.process_document(str(doc_path), str(output_dir), (0, 1), low_memory=True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        awp.WRITE_LIMITS = None
+    return peak
+
+
+@pytest.mark.parametrize("write_limits", [None, (0, 0, 8)], ids=["direct", "scheduled"])
+@pytest.mark.parametrize("image_count", [IMAGE_COUNT, IMAGE_COUNT * 4])
+def test_low_memory_peak_is_bounded(tmp_path, image_count, write_limits):
+    doc_path = tmp_path / "照片集.docx"
+    make_document(doc_path, image_count)
+    if image_count > IMAGE_COUNT:
+        # 图片数据合计超过上限：一旦把图片整体读入内存，测试必然失败
+        assert os.path.getsize(doc_path) > PEAK_BUDGET
+
+    peak = peak_low_memory(doc_path, tmp_path / "out", write_limits)
+
+    assert awp.TOTAL_IMAGES == image_count
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "out")) == image_count
+    assert not awp.ERROR_LOGS
+    assert peak < PEAK_BUDGET, f"{image_count} 张图片时峰值 {peak / 1048576:.1f} MB"
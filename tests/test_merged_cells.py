@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+合并单元格中的图片：各处理方式的输出必须相同
+python-docx 的 row.cells 把横向合并的单元格按所跨列数重复、纵向合并的后续单元格取最上面的单元格，
+流式解析（低内存模式、多进程分片）必须以同样的方式展开，输出的文件和序号才与普通模式一致。
+命令行的普通、--low-memory、--workers、--archive 以及 --tables/--shard 分段处理也都在这个文档上比较。
+"""
+
+import io
+import os
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import advanced_word_processor as awp  # noqa: E402
+
+
+def picture(seed):
+    buffer = io.BytesIO()
+    Image.effect_noise((40, 30), 20 + seed).convert("RGB").save(buffer, "PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def make_merged_document(path, table_count=3):
+    """
+    每个表格第一行为“编号 | Fname | 备注”；
+    第二行前两列横向合并后放一张图片，第三列与第三行纵向合并后放一张图片；第三行第一列再放一张
+    """
+    document = Document()
+    for t in range(table_count):
+        table = document.add_table(rows=3, cols=3)
+        table.cell(0, 0).text = "编号"
+        table.cell(0, 1).text = f"A{t}"
+        wide = table.cell(1, 0).merge(table.cell(1, 1))
+        wide.paragraphs[0].add_run().add_picture(picture(3 * t), width=Inches(0.5))
+        tall = table.cell(1, 2).merge(table.cell(2, 2))
+        tall.paragraphs[0].add_run().add_picture(picture(3 * t + 1), width=Inches(0.5))
+        table.cell(2, 0).paragraphs[0].add_run().add_picture(picture(3 * t + 2), width=Inches(0.5))
+        document.add_paragraph()
+    document.save(path)
+
+
+def output_files(output_dir):
+    """{相对路径: 文件内容}，不含错误日志等非图片文件"""
+    files = {}
+    for root, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files[os.path.relpath(path, output_dir)] = open(path, "rb").read()
+    return files
+
+
+def run_extraction(doc_path, output_dir, **kwargs):
+    awp.reset_statistics()
+    awp.process_document(str(doc_path), str(output_dir), (0, 1), **kwargs)
+    assert not awp.ERROR_LOGS
+    return output_files(output_dir)
+
+
+def test_low_memory_matches_normal_on_merged_cells(tmp_path):
+    doc_path = tmp_path / "合并单元格.docx"
+    make_merged_document(doc_path)
+
+    normal = run_extraction(doc_path, tmp_path / "normal")
+    streamed = run_extraction(doc_path, tmp_path / "low_memory", low_memory=True)
+
+    # 横向合并跨 2 列、纵向合并跨 2 行，各重复一次：每个表格 2 + 2 + 1 张
+    assert len(normal) == 3 * 5
+    assert sorted(normal) == sorted(streamed)
+    assert normal == streamed
+
+
+def test_sharded_matches_serial_on_merged_cells(tmp_path):
+    doc_path = tmp_path / "合并单元格.docx"
+    make_merged_document(doc_path, table_count=6)
+
+    serial = run_extraction(doc_path, tmp_path / "serial")
+    awp.reset_statistics()
+    awp.process_document_sharded(str(doc_path), str(tmp_path / "sharded"), (0, 1), workers=2)
+    assert not awp.ERROR_LOGS
+    sharded = output_files(tmp_path / "sharded")
+
+    assert len(serial) == 6 * 5
+    assert awp.TOTAL_IMAGES == len(serial)
+    assert serial == sharded
+
+
+def extracted_images(output_dir):
+    """输出目录中的全部图片 {Fname/图片名: 内容}：文件夹中的图片加上 zip/tar 归档中的图片，不含日志和分片报告"""
+    images = {}
+    for name, data in output_files(output_dir).items():
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(os.path.join(output_dir, name)) as zf:
+                images.update((member, zf.read(member)) for member in zf.namelist())
+        elif name.endswith(".tar"):
+            with tarfile.open(os.path.join(output_dir, name)) as tf:
+                images.update((m.name, tf.extractfile(m).read()) for m in tf.getmembers())
+        elif not name.endswith((".txt", ".json")):
+            images[name.replace(os.sep, "/")] = data
+    return images
+
+
+def run_cli(doc_path, output_dir, *options):
+    awp.reset_statistics()
+    awp.WRITE_LIMITS = None
+    awp.main(["--doc", str(doc_path), "--output", str(output_dir), "--cell", "0,1", *options])
+
+
+# 每种处理方式为一组命令行参数；多组参数依次输出到同一个目录（分段处理）
+ENTRY_POINTS = {
+    "low_memory": [["--low-memory"]],
+    "workers": [["--workers", "2"]],
+    "zip": [["--archive", "zip"]],
+    "tar_low_memory": [["--archive", "tar", "--low-memory"]],
+    "tables": [["--tables", "1-2"], ["--tables", "3-"]],
+    "shards": [["--shard", "1/3"], ["--shard", "2/3"], ["--shard", "3/3", "--low-memory"]],
+    "shards_zip": [["--shard", "1/2", "--archive", "zip"], ["--shard", "2/2", "--archive", "zip"]],
+}
+
+
+@pytest.mark.parametrize("mode", sorted(ENTRY_POINTS))
+def test_entry_points_match_normal_run_on_merged_cells(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(awp, "record_run", lambda *args, **kwargs: False)
+    # main 设置的模块级配置在测试结束后还原
+    for name in ("TABLE_RANGE", "SHARD", "WRITE_LIMITS", "FSYNC_POLICY", "IMAGE_FILTER"):
+        monkeypatch.setattr(awp, name, getattr(awp, name))
+    doc_path = tmp_path / "合并单元格.docx"
+    make_merged_document(doc_path, table_count=5)
+
+    run_cli(doc_path, tmp_path / "normal")
+    expected = extracted_images(tmp_path / "normal")
+    for options in ENTRY_POINTS[mode]:
+        run_cli(doc_path, tmp_path / mode, *options)
+        assert not awp.ERROR_LOGS
+
+    assert len(expected) == 5 * 5
+    assert extracted_images(tmp_path / mode) == expected
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Word文档收件目录监视工具
+功能：轮询监视收件目录，新的或修改过的 .docx 文档稳定后（大小在一段时间内不再变化），
+自动交给有界的工作进程池，按固定的单元格坐标提取表格图片，结果按文档分别输出。
+
+示例：
+    python watch_folder.py D:\\收件箱 D:\\输出 --cell 0,0 --workers 2
+按 Ctrl+C 停止监视，已排队的文档会全部处理完再退出。
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import zipfile
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import advanced_word_processor as awp
+from output_writers import ARCHIVE_FORMATS, archive_path_for, open_archive_writer
+
+STATE_FILE_NAME = "watch_state.json"
+
+
+# --- 1. 辅助函数 ---
+
+def snapshot_dir(inbox_dir, recursive=False):
+    """
+    对收件目录做一次 stat 快照，返回 {文档路径: (大小, 修改时间ns)}
+    忽略 Word 打开文档时生成的 ~$ 临时文件
+    """
+    snapshot = {}
+    if recursive:
+        walker = os.walk(inbox_dir)
+    else:
+        walker = [(inbox_dir, [], os.listdir(inbox_dir))]
+    for dir_path, _, file_names in walker:
+        for name in file_names:
+            if not name.lower().endswith(".docx") or name.startswith("~$"):
+                continue
+            path = os.path.join(dir_path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # 文件在快照过程中被移走
+            snapshot[path] = (st.st_size, st.st_mtime_ns)
+    return snapshot
+
+
+def output_dir_for(doc_path, inbox_dir, output_root):
+    """每个文档的结果输出到 output_root 下与收件目录相同的相对路径（去掉扩展名）"""
+    rel_path = os.path.relpath(doc_path, inbox_dir)
+    return os.path.join(output_root, os.path.splitext(rel_path)[0])
+
+
+def process_one_document(doc_path, output_dir, target_cell, archive_format=None):
+    """
+    工作进程入口：处理单个文档并保存该文档的错误日志，返回统计信息
+    （advanced_word_processor 使用模块级统计变量，每个任务开始前先重置）
+    """
+    awp.reset_statistics()
+    os.makedirs(output_dir, exist_ok=True)
+    if archive_format:
+        writer = open_archive_writer(archive_path_for(doc_path, output_dir, archive_format), archive_format)
+        try:
+            awp.process_document(doc_path, output_dir, target_cell, writer)
+        finally:
+            writer.close()
+    else:
+        awp.process_document(doc_path, output_dir, target_cell)
+    awp.save_error_log(output_dir)
+    return {
+        "tables": awp.TOTAL_TABLES,
+        "folders": awp.PROCESSED_FOLDERS,
+        "images": awp.TOTAL_IMAGES,
+        "errors": len(awp.ERROR_LOGS),
+    }
+
+
+def _ignore_sigint():
+    """工作进程忽略 Ctrl+C，由主进程统一负责优雅退出"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# --- 2. 监视器 ---
+
+class StabilityTracker:
+    """
+    记录每个文档最近一次的 (大小, 修改时间)，在连续 stable_seconds 秒内未变化时才认为已稳定。
+    已处理过的签名不会重复触发，文档被覆盖或修改后会再次触发。
+    """
+
+    def __init__(self, stable_seconds, done=None):
+        self.stable_seconds = stable_seconds
+        self.pending = {}  # 路径 -> (签名, 首次见到该签名的时间)
+        self.done = dict(done or {})  # 路径 -> 已处理的签名
+
+    def update(self, snapshot, now):
+        """根据新的快照返回本轮已稳定、需要处理的文档列表"""
+        ready = []
+        for path in list(self.pending):
+            if path not in snapshot:
+                del self.pending[path]  # 文档被删除或移走
+        for path, sig in snapshot.items():
+            if self.done.get(path) == sig:
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != sig:
+                self.pending[path] = (sig, now)
+            elif now - seen[1] >= self.stable_seconds:
+                ready.append(path)
+        return sorted(ready)
+
+    def mark_done(self, path, sig):
+        self.pending.pop(path, None)
+        self.done[path] = sig
+
+
+class FolderWatcher:
+    """轮询收件目录，把稳定的文档提交到有界工作进程池"""
+
+    def __init__(self, inbox_dir, output_root, target_cell, interval=2.0,
+                 stable_seconds=5.0, workers=2, max_pending=None, recursive=False,
+                 archive_format=None):
+        self.inbox_dir = inbox_dir
+        self.output_root = output_root
+        self.target_cell = target_cell
+        self.interval = interval
+        self.recursive = recursive
+        self.archive_format = archive_format
+        self.workers = workers
+        # 背压：排队+处理中的文档数达到上限时，轮询暂停，直到有工作进程空出来
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 2)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.state_path = os.path.join(output_root, STATE_FILE_NAME)
+        self.state = self._load_state()
+        done = {path: tuple(entry["sig"]) for path, entry in self.state.items()}
+        self.tracker = StabilityTracker(stable_seconds, done)
+        self.in_flight = set()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _is_complete_docx(self, path):
+        """复制尚未结束的文档通常不是完整的 zip，暂不处理"""
+        try:
+            return zipfile.is_zipfile(path)
+        except OSError:
+            return False
+
+    def _submit(self, executor, path, sig):
+        # 阻塞等待空闲名额，同时响应停止信号
+        while not self.slots.acquire(timeout=0.5):
+            if self.stop_event.is_set():
+                return False
+        output_dir = output_dir_for(path, self.inbox_dir, self.output_root)
+        print(f"[排队] {path} -> {output_dir}")
+        with self.lock:
+            self.in_flight.add(path)
+        future = executor.submit(process_one_document, path, output_dir, self.target_cell,
+                                 self.archive_format)
+        future.add_done_callback(lambda fut: self._on_done(fut, path, sig, output_dir))
+        return True
+
+    def _on_done(self, future, path, sig, output_dir):
+        try:
+            stats = future.result()
+            print(f"[完成] {path}: 表格 {stats['tables']} 个，图片 {stats['images']} 张，错误 {stats['errors']} 条")
+        except Exception as e:
+            stats = {"failed": str(e)}
+            print(f"[失败] {path}: {e}")
+        with self.lock:
+            self.in_flight.discard(path)
+            self.state[path] = {
+                "sig": list(sig),
+                "output": output_dir,
+                "finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "stats": stats,
+            }
+            try:
+                self._save_state()
+            except OSError as e:
+                print(f"[状态保存失败]: {e}")
+        self.slots.release()
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            print("\n收到停止信号，不再接收新文档，等待已排队的文档处理完成...")
+        self.stop_event.set()
+
+    def run(self):
+        os.makedirs(self.output_root, exist_ok=True)
+        print(f"开始监视: {self.inbox_dir}（每 {self.interval} 秒轮询一次，{self.workers} 个工作进程）")
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_sigint) as executor:
+            while not self.stop_event.is_set():
+                try:
+                    snapshot = snapshot_dir(self.inbox_dir, self.recursive)
+                except OSError as e:
+                    print(f"[轮询失败]: {e}")
+                    snapshot = {}
+                with self.lock:
+                    busy = set(self.in_flight)
+                for path in self.tracker.update(snapshot, time.monotonic()):
+                    if path in busy or not self._is_complete_docx(path):
+                        continue
+                    sig = snapshot[path]
+                    if not self._submit(executor, path, sig):
+                        break
+                    self.tracker.mark_done(path, sig)
+                self.stop_event.wait(self.interval)
+            # 退出 with 时 executor.shutdown(wait=True)，已排队的任务全部完成后才返回
+        print("所有已排队的文档处理完毕，监视结束。")
+
+
+# --- 3. 主程序入口 ---
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视收件目录，自动提取新文档中的表格图片")
+    parser.add_argument("inbox", help="收件目录")
+    parser.add_argument("output", help="输出根目录，每个文档一个子目录")
+    parser.add_argument("--cell", default="0,0", help="Fname 单元格坐标 (row_index,col_index)，默认 0,0")
+    parser.add_argument("--interval", type=float, default=2.0, help="轮询间隔（秒）")
+    parser.add_argument("--stable-seconds", type=float, default=5.0, help="文档大小保持不变多少秒后才处理")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--max-pending", type=int, default=None, help="排队+处理中的文档上限，默认工作进程数的 2 倍")
+    parser.add_argument("--recursive", action="store_true", help="同时监视子目录")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS, help="每个文档的图片写入一个 zip 或 tar 归档")
+    args = parser.parse_args(argv)
+
+    target_cell = awp.parse_cell_index(args.cell)
+    if target_cell is None:
+        parser.error("--cell 格式错误，应为 行,列 例如 0,0")
+    if not os.path.isdir(args.inbox):
+        parser.error(f"收件目录不存在: {args.inbox}")
+
+    watcher = FolderWatcher(
+        args.inbox, args.output, target_cell,
+        interval=args.interval,
+        stable_seconds=args.stable_seconds,
+        workers=max(1, args.workers),
+        max_pending=args.max_pending,
+        recursive=args.recursive,
+        archive_format=args.archive,
+    )
+    signal.signal(signal.SIGINT, watcher.stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run()
+    return 0
+
+
+# ---------------------------------
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 后多进程需要
+    sys.exit(main())
+# ---------------------------------
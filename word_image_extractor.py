@@ -15,6 +15,21 @@ import io
 import re
 from docx.shared import Inches
 
+from table_text_index import TableTextIndex
+from atomic_files import AtomicFileWriter
+from image_probe import ImageFilter, probe_dimensions
+from fname_suggest import suggest_fname_cells, describe_candidate
+
+# 表格预览每页显示的行数
+PREVIEW_PAGE_ROWS = 50
+
+# 跳过小于 MIN_IMAGE_BYTES 字节、或宽/高小于 MIN_IMAGE_WIDTH/MIN_IMAGE_HEIGHT 像素的图片（徽标、图标等）
+# 尺寸只读取图片文件头；均为 0 时不过滤
+MIN_IMAGE_BYTES = 0
+MIN_IMAGE_WIDTH = 0
+MIN_IMAGE_HEIGHT = 0
+IMAGE_FILTER = ImageFilter(MIN_IMAGE_BYTES, MIN_IMAGE_WIDTH, MIN_IMAGE_HEIGHT)
+
 
 def select_file(title="选择Word文档"):
     """让用户选择文件"""
@@ -51,70 +66,118 @@ def sanitize_filename(filename):
     return filename
 
 
-def show_table_content(table):
-    """显示表格内容，并让用户选择一个单元格作为Fname"""
-    # 使用更简单的方式，避免创建两个Tk窗口
-    print("正在准备表格预览...")
-    
-    # 预计算表格内容
-    content = []
-    try:
-        # 大幅减少处理的行数和列数，确保快速响应
-        max_rows = 10
-        max_cols = 5
-        rows_to_process = table.rows[:max_rows]
-        
-        for i, row in enumerate(rows_to_process):
-            if i > 0:  # 跳过表头行外的其他行
-                continue
-            
-            row_text = []
-            cells_to_process = row.cells[:max_cols]
-            
-            for j, cell in enumerate(cells_to_process):
-                cell_text = cell.text.strip()[:50]
-                row_text.append(f"[{i},{j}]: {cell_text}")
-            content.append(" | ".join(row_text))
-        
-        # 添加简化版提示
-        content.append("\n\n[仅显示第一行作为参考，请输入单元格坐标，如：0,0]")
-    except Exception as e:
-        content.append(f"解析表格时出错: {str(e)}")
-        print(f"表格解析错误: {str(e)}")
-    
-    print("表格预览内容准备完成")
-    
-    # 创建主窗口
+def build_table_text_cache(doc_path):
+    """一次流式解析得到文档中所有表格的单元格文本（TableTextIndex），预览和命名时只读取这份缓存"""
+    return TableTextIndex.build(doc_path)
+
+
+def show_table_content(tables_text, page_rows=PREVIEW_PAGE_ROWS):
+    """
+    分页预览表格内容，并让用户输入一个单元格坐标作为Fname
+    tables_text 为 build_table_text_cache 得到的文本缓存，翻页、切换表格都只读缓存，不再重新解析文档
+    返回用户确定的坐标字符串 "行,列"，关闭窗口时返回 None
+    """
+    total_tables = tables_text.table_count
+    state = {"table": 0, "start": 0}
+    result = [None]
+    # 根据所有表格的统计给出建议坐标，默认填入得分最高的坐标
+    suggestions = suggest_fname_cells(tables_text, top=3)
+
     root = tk.Tk()
     root.title("选择Fname单元格")
-    root.geometry("800x600")
-    
-    # 创建文本区域显示表格内容
-    text_area = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=90, height=30, font=("SimHei", 10))
-    text_area.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
-    
-    # 显示表格内容
-    text_area.insert(tk.END, "\n\n".join(content))
-    text_area.config(state=tk.DISABLED)
-    
-    # 存储用户选择的单元格坐标
-    selected_cell = [None, None]
-    selected_text = [""]
-    
-    def on_select():
+    root.geometry("900x650")
+
+    # 表格切换
+    nav = tk.Frame(root)
+    nav.pack(pady=5, padx=10, fill=tk.X)
+    tk.Label(nav, text="表格：").pack(side=tk.LEFT)
+    table_entry = tk.Entry(nav, width=6)
+    table_entry.pack(side=tk.LEFT)
+    table_label = tk.Label(nav, text=f"/ {total_tables}")
+    table_label.pack(side=tk.LEFT, padx=5)
+
+    # 文本区域显示当前页
+    text_area = scrolledtext.ScrolledText(root, wrap=tk.NONE, width=100, height=28, font=("SimHei", 10))
+    text_area.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
+    page_label = tk.Label(root, text="")
+    page_label.pack()
+
+    def render():
+        row_count = tables_text.row_count(state["table"])
+        start = state["start"]
+        end = min(row_count, start + page_rows)
+        lines = []
+        for i, row in enumerate(tables_text.rows(state["table"], start, end), start=start):
+            cells = [f"[{i},{j}]: {text.strip().replace(chr(10), ' ')[:50]}" for j, text in enumerate(row)]
+            lines.append(" | ".join(cells))
+        text_area.config(state=tk.NORMAL)
+        text_area.delete("1.0", tk.END)
+        text_area.insert(tk.END, "\n".join(lines) if lines else "[空表格]")
+        text_area.config(state=tk.DISABLED)
+        table_entry.delete(0, tk.END)
+        table_entry.insert(0, str(state["table"] + 1))
+        page_label.config(text=f"第 {state['table'] + 1} 个表格，显示第 {start} - {max(start, end - 1)} 行，共 {row_count} 行")
+
+    def go_table(index):
+        if 0 <= index < total_tables:
+            state["table"] = index
+            state["start"] = 0
+            render()
+
+    def go_page(delta):
+        new_start = state["start"] + delta * page_rows
+        if 0 <= new_start < max(1, tables_text.row_count(state["table"])):
+            state["start"] = new_start
+            render()
+
+    def jump_table():
+        try:
+            go_table(int(table_entry.get()) - 1)
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的表格序号！")
+
+    def read_coord():
         try:
-            row = int(row_entry.get())
-            col = int(col_entry.get())
-            if 0 <= row < len(table.rows) and 0 <= col < len(table.rows[row].cells):
-                selected_cell[0] = row
-                selected_cell[1] = col
-                selected_text[0] = table.rows[row].cells[col].text.strip()
-                root.destroy()
-            else:
-                messagebox.showerror("错误", "单元格坐标超出范围！")
+            return int(row_entry.get()), int(col_entry.get())
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字！")
-    
+            return None
+
+    def check_coord():
+        """在文本区域列出该坐标在每个表格中的内容，确认坐标在整个文档中都适用"""
+        coord = read_coord()
+        if coord is None:
+            return
+        row, col = coord
+        lines = [f"坐标 ({row},{col}) 在各表格中的内容："]
+        for k, text in enumerate(tables_text.column(row, col)):
+            value = text.strip().replace("\n", " ") if text is not None else "[坐标不存在]"
+            lines.append(f"表格 {k + 1}: {value or '[空]'}")
+        text_area.config(state=tk.NORMAL)
+        text_area.delete("1.0", tk.END)
+        text_area.insert(tk.END, "\n".join(lines))
+        text_area.config(state=tk.DISABLED)
+        page_label.config(text="点击“上一页/下一页”或切换表格可返回表格预览")
+
+    def on_select():
+        coord = read_coord()
+        if coord is None:
+            return
+        row, col = coord
+        try:
+            tables_text.cell(0, row, col)
+        except IndexError:
+            messagebox.showerror("错误", "单元格坐标在第一个表格中超出范围！")
+            return
+        result[0] = f"{row},{col}"
+        root.destroy()
+
+    tk.Button(nav, text="跳转", command=jump_table).pack(side=tk.LEFT, padx=5)
+    tk.Button(nav, text="上一个表格", command=lambda: go_table(state["table"] - 1)).pack(side=tk.LEFT, padx=5)
+    tk.Button(nav, text="下一个表格", command=lambda: go_table(state["table"] + 1)).pack(side=tk.LEFT, padx=5)
+    tk.Button(nav, text="上一页", command=lambda: go_page(-1)).pack(side=tk.LEFT, padx=5)
+    tk.Button(nav, text="下一页", command=lambda: go_page(1)).pack(side=tk.LEFT, padx=5)
+
     # 创建输入框和按钮
     frame = tk.Frame(root)
     frame.pack(pady=10, padx=10, fill=tk.X)
@@ -123,21 +186,35 @@ def show_table_content(table):
     tk.Label(frame, text="行：").pack(side=tk.LEFT, padx=5)
     row_entry = tk.Entry(frame, width=5)
     row_entry.pack(side=tk.LEFT, padx=5)
+    row_entry.insert(0, str(suggestions[0].row) if suggestions else "0")
     
     tk.Label(frame, text="列：").pack(side=tk.LEFT, padx=5)
     col_entry = tk.Entry(frame, width=5)
     col_entry.pack(side=tk.LEFT, padx=5)
+    col_entry.insert(0, str(suggestions[0].col) if suggestions else "0")
     
+    tk.Button(frame, text="检查所有表格", command=check_coord).pack(side=tk.LEFT, padx=10)
     tk.Button(frame, text="确定", command=on_select).pack(side=tk.LEFT, padx=10)
-    
+
+    if suggestions:
+        tk.Label(
+            root, justify=tk.LEFT,
+            text="建议坐标（已填入第一个）:\n" + "\n".join(describe_candidate(x) for x in suggestions),
+        ).pack(pady=5, padx=10, anchor=tk.W)
+
+    if total_tables:
+        render()
+    root.attributes('-topmost', True)
     root.mainloop()
     
-    return selected_text[0]
+    return result[0]
 
 
 def extract_images_from_item(item, output_dir, base_name, item_index):
     """从单个item中提取图片并保存"""
     image_count = 0
+    # 图片先写临时文件，item 处理完后统一 fsync 并改名
+    files = AtomicFileWriter()
     
     try:
         # 为每个item创建子文件夹
@@ -150,9 +227,13 @@ def extract_images_from_item(item, output_dir, base_name, item_index):
             for rel in item.part.rels.values():
                 if "image" in rel.target_ref:
                     try:
-                        image_count += 1
                         image_part = rel.target_part
                         image_bytes = image_part._blob
+                        reason = IMAGE_FILTER.check(len(image_bytes), lambda: probe_dimensions(image_bytes))
+                        if reason:
+                            print(f"跳过图片 {image_part.partname}（{reason}）")
+                            continue
+                        image_count += 1
                         
                         # 确定图片格式
                         content_type = image_part.content_type
@@ -167,8 +248,7 @@ def extract_images_from_item(item, output_dir, base_name, item_index):
                         
                         # 保存图片
                         image_path = os.path.join(item_folder, f"{base_name}_{image_count}.{ext}")
-                        with open(image_path, 'wb') as f:
-                            f.write(image_bytes)
+                        files.write_bytes(image_path, image_bytes)
                         
                         print(f"已保存图片: {image_path}")
                     except Exception as inner_e:
@@ -196,9 +276,14 @@ def extract_images_from_item(item, output_dir, base_name, item_index):
                                         
                                         # 获取图片
                                         if rId and rId in item.part.rels:
-                                            image_count += 1
                                             image_part = item.part.rels[rId].target_part
                                             image_bytes = image_part._blob
+                                            reason = IMAGE_FILTER.check(
+                                                len(image_bytes), lambda: probe_dimensions(image_bytes))
+                                            if reason:
+                                                print(f"跳过图片 {image_part.partname}（{reason}）")
+                                                continue
+                                            image_count += 1
                                             
                                             # 确定图片格式
                                             content_type = image_part.content_type
@@ -213,8 +298,7 @@ def extract_images_from_item(item, output_dir, base_name, item_index):
                                             
                                             # 保存图片
                                             image_path = os.path.join(item_folder, f"{base_name}_{image_count}.{ext}")
-                                            with open(image_path, 'wb') as f:
-                                                f.write(image_bytes)
+                                            files.write_bytes(image_path, image_bytes)
                                             
                                             print(f"已保存图片: {image_path}")
                                     except Exception as inner_e:
@@ -223,6 +307,8 @@ def extract_images_from_item(item, output_dir, base_name, item_index):
                 print(f"备用方法也失败: {e}")
     except Exception as e:
         print(f"处理item时发生错误: {e}")
+    finally:
+        files.close()
     
     return image_count
 
@@ -274,41 +360,13 @@ def main():
         
         print(f"在文档中找到 {total_items} 个表格（item）")
         
-        # 简化Fname选择过程，使用命令行输入
-        print("\n请输入要作为Fname的单元格坐标（如：0,0）:")
-        print("例如，0,0 表示第一行第一列的单元格")
-        
-        # 创建一个简单的输入窗口
-        root = tk.Tk()
-        root.title("输入单元格坐标")
-        root.geometry("400x200")
-        
-        label = tk.Label(root, text="请输入单元格坐标 (格式: 行号,列号，如0,0):")
-        label.pack(pady=10)
-        
-        entry = tk.Entry(root, width=20)
-        entry.pack(pady=10)
-        entry.insert(0, "0,0")  # 默认值
-        
-        # 用于存储用户输入的变量
-        result = [None]
+        # 预览表格并选择Fname坐标：文本只解析一次，之后翻页和切换表格都读取缓存
+        print("\n正在准备表格预览...")
+        tables_text = build_table_text_cache(doc_path)
+        print("请在弹出的窗口中翻页查看表格，输入要作为Fname的单元格坐标（如：0,0）")
         
-        def on_submit():
-            result[0] = entry.get()
-            root.destroy()
-        
-        submit_btn = tk.Button(root, text="确定", command=on_submit)
-        submit_btn.pack(pady=10)
-        
-        # 设置窗口关闭时的默认值
-        root.protocol("WM_DELETE_WINDOW", lambda: (result.__setitem__(0, "0,0"), root.destroy()))
-        
-        # 确保窗口在最前面
-        root.attributes('-topmost', True)
-        root.mainloop()
-        
-        # 获取用户输入
-        cell_coords = result[0]
+        # 获取用户输入（关闭窗口时使用默认值 0,0）
+        cell_coords = show_table_content(tables_text)
         if not cell_coords:
             cell_coords = "0,0"
         
@@ -316,12 +374,14 @@ def main():
             # 解析坐标
             row_idx, col_idx = map(int, cell_coords.split(","))
             # 验证坐标是否有效
-            if row_idx < 0 or col_idx < 0 or row_idx >= len(items[0].rows) or col_idx >= len(items[0].rows[row_idx].cells):
+            try:
+                tables_text.cell(0, row_idx, col_idx)
+            except IndexError:
                 print("坐标无效，使用默认值 (0,0)")
                 row_idx, col_idx = 0, 0
             
             # 获取Fname值
-            fname = items[0].rows[row_idx].cells[col_idx].text.strip()
+            fname = tables_text.cell(0, row_idx, col_idx).strip()
             print(f"已选择Fname: {fname}")
         except Exception as e:
             print(f"解析坐标失败: {str(e)}，使用默认名称")
@@ -348,15 +408,12 @@ def main():
                 # 提取Fname值
                 try:
                     # 使用之前获取的row_idx和col_idx
-                    if row_idx < len(item.rows) and col_idx < len(item.rows[row_idx].cells):
-                        item_fname = item.rows[row_idx].cells[col_idx].text.strip()
-                        # 清理文件名
-                        item_fname = sanitize_filename(item_fname)
-                        if not item_fname:  # 如果清理后为空，使用默认名称
-                            item_fname = f"item_{i+1}"
-                    else:
-                        print("坐标无效，使用默认名称")
+                    item_fname = sanitize_filename(tables_text.cell(i, row_idx, col_idx).strip())
+                    if not item_fname:  # 如果清理后为空，使用默认名称
                         item_fname = f"item_{i+1}"
+                except IndexError:
+                    print("坐标无效，使用默认名称")
+                    item_fname = f"item_{i+1}"
                 except Exception as e:
                     print(f"获取Fname失败: {e}")
                     item_fname = f"item_{i+1}"